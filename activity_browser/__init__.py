@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
 import sys
 
 from .logger import log, exception_hook, log_file_location
 from .mod import bw2data
-from .application import application
 from .signals import signals
 from .settings import ab_settings, project_settings
-from .controllers import *
 from .info import __version__ as version
-from .layouts.main import MainWindow
-from .plugin import Plugin
+
+# Calculation workers are spawned processes that only import the calculation
+# code, they must not start a QApplication or build the interface.
+if multiprocessing.parent_process() is None:
+    from .application import application
+    from .controllers import *
+    from .layouts.main import MainWindow
+    from .plugin import Plugin
+
 
 def load_settings() -> None:
     if ab_settings.settings:
@@ -1,6 +1,7 @@
 from typing import Any
 
 from activity_browser.actions.base import ABAction, exception_dialogs
+from activity_browser.bwutils.parameter_graph import recalculate_parameter
 from activity_browser.mod.bw2data import parameters
 from activity_browser.ui.icons import qicons
 
@@ -22,4 +23,8 @@ class ParameterModify(ABAction):
             setattr(parameter, field, value)
         parameter.save()
 
-        parameters.recalculate()
+        if field in ("amount", "formula"):
+            # Only recalculate what depends on the modified parameter.
+            recalculate_parameter(parameter)
+        else:
+            parameters.recalculate()
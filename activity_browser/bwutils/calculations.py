@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
+from typing import Callable, Optional
+
 from bw2calc.errors import BW2CalcError
-from PySide2.QtWidgets import QApplication
 
 from activity_browser import log
 
@@ -12,13 +13,20 @@ from ..bwutils import (
     SuperstructureMLCA,
 )
 from .errors import CriticalCalculationError, ScenarioExchangeNotFoundError
+from .result_cache import ResultCache
+
 
+def do_LCA_calculations(data: dict, progress: Optional[Callable] = None):
+    """Perform the MLCA calculation.
 
-def do_LCA_calculations(data: dict):
-    """Perform the MLCA calculation."""
+    This does not touch the user interface, so it can be run in a worker
+    thread. If given, `progress` is called with (step, total steps).
+    """
+    progress = progress or (lambda current, total: None)
     cs_name = data.get("cs_name", "new calculation")
     calculation_type = data.get("calculation_type", "simple")
 
+    progress(0, 3)
     if calculation_type == "simple":
         try:
             mlca = MLCA(cs_name)
@@ -32,32 +40,39 @@ def do_LCA_calculations(data: dict):
             contributions = SuperstructureContributions(mlca)
         except AssertionError as e:
             # This occurs if the superstructure itself detects something is wrong.
-            QApplication.restoreOverrideCursor()
             raise BW2CalcError("Scenario LCA failed.", str(e)).with_traceback(
                 e.__traceback__
             )
         except ValueError as e:
             # This occurs if the LCA matrix does not contain any of the
             # exchanges mentioned in the superstructure data.
-            QApplication.restoreOverrideCursor()
             raise BW2CalcError(
                 "Scenario LCA failed.",
                 "Constructed LCA matrix does not contain any exchanges from the superstructure",
             ).with_traceback(e.__traceback__)
         except KeyError as e:
-            QApplication.restoreOverrideCursor()
             raise BW2CalcError("LCA Failed", str(e)).with_traceback(e.__traceback__)
         except CriticalCalculationError as e:
-            QApplication.restoreOverrideCursor()
             raise Exception(e)
         except ScenarioExchangeNotFoundError as e:
-            QApplication.restoreOverrideCursor()
-            raise CriticalCalculationError
+            raise CriticalCalculationError(*e.args) from e
     else:
         log.error("Calculation type must be: simple or scenario. Given:", cs_name)
         raise ValueError
 
-    mlca.calculate()
+    # Reuse the results of an identical earlier calculation where possible.
+    progress(1, 3)
+    cache = ResultCache()
+    key = cache.key(mlca, data.get("data") if calculation_type == "scenario" else None)
+    results = cache.get(key)
+    if results is not None:
+        log.info(f"Using cached results for calculation setup '{cs_name}'")
+        mlca.load_result_arrays(results)
+    else:
+        mlca.calculate()
+        cache.put(key, mlca.result_arrays())
+    progress(2, 3)
     mc = MonteCarloLCA(cs_name)
+    progress(3, 3)
 
     return mlca, contributions, mc
@@ -130,3 +130,11 @@ class WrongFileTypeImportError(ABError):
     For example a database file with the scenario import dialog, or vice versa."""
 
     pass
+
+
+class NoUncertainInputsError(ABError):
+    """Should be raised when a global sensitivity analysis has no uncertain inputs to analyse for a reference flow and
+    impact category, for instance because no uncertain exchanges were included in the Monte Carlo simulation.
+    """
+
+    pass
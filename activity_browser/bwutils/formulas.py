@@ -0,0 +1,298 @@
+"""
+Compiled evaluation of brightway2 parameter and exchange formulas.
+
+Formulas are parsed once and then evaluated for many sets of parameter values
+(Monte Carlo samples, parameter scenarios) at the same time, using NumPy
+arrays instead of re-interpreting every formula for every set of values.
+"""
+import ast
+from collections import ChainMap
+from functools import reduce
+from typing import Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+from asteval import Interpreter
+
+from activity_browser.mod.bw2data.parameters import MissingName
+
+from .utils import Parameters, StaticParameters
+
+# Functions and constants that can be used in vectorized formulas, all other
+# functions are left to asteval.
+FUNCTIONS = {
+    "abs": np.abs,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+    "sqrt": np.sqrt,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "arcsin": np.arcsin,
+    "arccos": np.arccos,
+    "arctan": np.arctan,
+    "min": lambda *args: reduce(np.minimum, args),
+    "max": lambda *args: reduce(np.maximum, args),
+}
+CONSTANTS = {"pi": np.pi, "e": np.e, "inf": np.inf, "nan": np.nan}
+
+
+def _nan_division(func: Callable, zero: Callable) -> Callable:
+    """Wrap a NumPy operator so the samples for which Python raises a
+    ZeroDivisionError are NaN, like asteval evaluates failed formulas.
+    """
+
+    def operator(a, b):
+        with np.errstate(all="ignore"):
+            result = np.asarray(func(a, b), dtype=np.float64)
+        return np.where(zero(np.asarray(a), np.asarray(b)), np.nan, result)
+
+    return operator
+
+
+# Functions that replace the operators which can divide by zero in compiled
+# formulas, see `_Operators`.
+OPERATORS = {
+    ast.Div: ("__divide__", _nan_division(np.true_divide, lambda a, b: b == 0)),
+    ast.FloorDiv: ("__floordiv__", _nan_division(np.floor_divide, lambda a, b: b == 0)),
+    ast.Mod: ("__mod__", _nan_division(np.mod, lambda a, b: b == 0)),
+    ast.Pow: ("__pow__", _nan_division(np.power, lambda a, b: (a == 0) & (b < 0))),
+}
+
+_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Name,
+    ast.Load,
+    ast.Call,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.UAdd,
+    ast.USub,
+)
+
+_interpreter_names: Optional[set] = None
+
+
+def interpreter_names() -> set:
+    """Names that asteval defines by itself, which are not parameters."""
+    global _interpreter_names
+    if _interpreter_names is None:
+        _interpreter_names = set(Interpreter().symtable)
+    return _interpreter_names
+
+
+def vectorizable(tree: ast.AST) -> bool:
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES):
+            return False
+        if isinstance(node, ast.Constant) and (
+            isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+        ):
+            return False
+        if isinstance(node, ast.Call) and (
+            node.keywords
+            or not isinstance(node.func, ast.Name)
+            or node.func.id not in FUNCTIONS
+        ):
+            return False
+    return True
+
+
+class _Operators(ast.NodeTransformer):
+    """Replace the operators in `OPERATORS` by calls of their functions."""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if type(node.op) not in OPERATORS:
+            return node
+        name = OPERATORS[type(node.op)][0]
+        call = ast.Call(
+            func=ast.Name(id=name, ctx=ast.Load()),
+            args=[node.left, node.right],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+
+class Formula(object):
+    """A parameter or exchange formula that is parsed once.
+
+    Formulas that only use arithmetic and the FUNCTIONS are compiled and
+    evaluated for all samples at once, other formulas are evaluated by
+    asteval sample by sample. Divisions by zero give NaN either way.
+
+    The `symbols` are all names in the formula that are not called.
+    Parameters override constants of the same name, such as `e` or `pi`, the
+    `defaults` are the names that fall back on a constant or function when
+    no parameter is given for them.
+    """
+
+    def __init__(self, formula: str):
+        self.formula = formula
+        self.code = None
+        self.defaults = set()
+        try:
+            tree = ast.parse(formula.strip(), mode="eval")
+        except SyntaxError:
+            self.symbols = set()
+            return
+        called = {id(n.func) for n in ast.walk(tree) if isinstance(n, ast.Call)}
+        self.symbols = {
+            n.id
+            for n in ast.walk(tree)
+            if isinstance(n, ast.Name) and id(n) not in called
+        }
+        if vectorizable(tree):
+            self.defaults = self.symbols.intersection({**FUNCTIONS, **CONSTANTS})
+            tree = ast.fix_missing_locations(_Operators().visit(tree))
+            self.code = compile(tree, "<formula>", "eval")
+        else:
+            self.defaults = self.symbols.intersection(interpreter_names())
+
+    @property
+    def is_compiled(self) -> bool:
+        return self.code is not None
+
+    def evaluate(self, namespace: Mapping[str, np.ndarray], size: int) -> np.ndarray:
+        """Evaluate the formula for `size` samples, `namespace` contains an
+        array of values for each symbol.
+        """
+        missing = {
+            s for s in self.symbols if s not in namespace and s not in self.defaults
+        }
+        if missing:
+            raise MissingName(
+                "The following variables aren't defined:\n{}".format("|".join(missing))
+            )
+        # The parameters take precedence over the constants and functions.
+        symbols = {s: namespace[s] for s in self.symbols if s in namespace}
+        if self.is_compiled:
+            operators = {name: func for name, func in OPERATORS.values()}
+            with np.errstate(all="ignore"):
+                result = eval(
+                    self.code,
+                    {"__builtins__": {}, **FUNCTIONS, **CONSTANTS, **operators},
+                    symbols,
+                )
+            return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,))
+
+        interpreter = Interpreter()
+        result = np.empty(size)
+        for i in range(size):
+            interpreter.symtable.update({s: v[i] for s, v in symbols.items()})
+            value = interpreter(self.formula)
+            result[i] = np.nan if value is None else value
+        return result
+
+
+class ParameterGroup(object):
+    """The parameters of a single group with their formulas in order of
+    evaluation.
+    """
+
+    def __init__(self, name: str, data: dict):
+        self.name = name
+        self.amounts = {k: v.get("amount", 0) for k, v in data.items()}
+        formulas = {
+            k: Formula(v["formula"]) for k, v in data.items() if v.get("formula")
+        }
+        self.order = self.sort(formulas)
+
+    @staticmethod
+    def sort(formulas: Dict[str, Formula]) -> List[tuple]:
+        """Order the formulas so every formula comes after the formulas of the
+        same group it depends on, raises a ValueError for circular references.
+        """
+        order = []
+        remaining = dict(formulas)
+        while remaining:
+            ready = [
+                name
+                for name, formula in remaining.items()
+                if not (formula.symbols & set(remaining)) - {name}
+            ]
+            if not ready:
+                raise ValueError(
+                    "Circular reference in parameters: {}".format(", ".join(remaining))
+                )
+            for name in ready:
+                order.append((name, remaining.pop(name)))
+        return order
+
+    def evaluate(
+        self, columns: dict, namespace: Mapping[str, np.ndarray], size: int
+    ) -> Dict[str, np.ndarray]:
+        """Return the values of all parameters in the group, given the values
+        of the parameters in `columns` and of the outer scope in `namespace`.
+        """
+        values = {
+            name: columns.get((self.name, name), np.full(size, amount))
+            for name, amount in self.amounts.items()
+        }
+        scope = ChainMap(values, namespace)
+        for name, formula in self.order:
+            values[name] = formula.evaluate(scope, size)
+        return values
+
+
+class CompiledParameters(object):
+    """Vectorized equivalent of `ParameterManager.calculate`.
+
+    Evaluates the complete chain of project, database and activity parameters
+    and the parameterized exchanges for many sets of parameter values at once.
+
+    Parameters
+    ----------
+    initial : The parameters and formulas as stored in the project
+    parameters : The parameters in the order of the value columns
+    """
+
+    def __init__(self, initial: StaticParameters, parameters: Parameters):
+        self.keys = [(p.group, p.name) for p in parameters]
+        self.project = ParameterGroup("project", initial.project())
+        self.databases = {
+            db: ParameterGroup(db, initial.by_database(db)) for db in initial.databases
+        }
+        self.groups = [(p.group, p.database) for p in initial.act_by_group_db]
+        self.activities = {
+            group: ParameterGroup(group, initial.act_by_group(group))
+            for group, _ in self.groups
+        }
+        self.exchanges = {
+            group: [Formula(f) for f in initial.exc_by_group(group).values()]
+            for group, _ in self.groups
+        }
+        self.size = sum(len(self.exchanges[group]) for group, _ in self.groups)
+
+    def evaluate(self, values: np.ndarray) -> np.ndarray:
+        """Calculate the exchange amounts for an (N x parameters) array of
+        parameter values, returns an (N x exchanges) array in the order of
+        `ParameterManager.indices`.
+        """
+        n = len(values)
+        columns = {key: values[:, i] for i, key in enumerate(self.keys)}
+        project = self.project.evaluate(columns, {}, n)
+        databases = {
+            db: group.evaluate(columns, project, n)
+            for db, group in self.databases.items()
+        }
+
+        result = np.zeros((n, self.size))
+        offset = 0
+        for group, database in self.groups:
+            namespace = ChainMap(databases.get(database, {}), project)
+            namespace = ChainMap(
+                self.activities[group].evaluate(columns, namespace, n), namespace
+            )
+            for formula in self.exchanges[group]:
+                result[:, offset] = formula.evaluate(namespace, n)
+                offset += 1
+        return result
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import bw2calc as bc
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import factorized
+
+from activity_browser import log
+from activity_browser.mod import bw2data as bd
+
+try:
+    # test whether we're running bw25
+    from bw2calc.graph_traversal import AssumedDiagonalGraphTraversal as GraphTraversal
+except ImportError:
+    # fall back on regular bw
+    from bw2calc import GraphTraversal
+
+
+def method_state(method: tuple) -> tuple:
+    """Return the metadata of the impact category and the modification time
+    of its processed data, which together change whenever the impact
+    category is changed.
+    """
+    metadata = bd.methods.get(method, {})
+    try:
+        mtime = os.path.getmtime(bd.Method(method).filepath_processed())
+    except (AttributeError, OSError):
+        mtime = None
+    return metadata, mtime
+
+
+def checkout(value):
+    """Copy mutable LCA data, so changes to one LCA object do not end up
+    in a pool or cache.
+    """
+    if sparse.issparse(value) or isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class SharedSolver(object):
+    """Factorization shared by all LCA objects of a pool entry.
+
+    The LCA objects may solve on different threads at the same time, for
+    instance the Sankey diagram on the interface thread and a calculation
+    job. Factorizations such as the PyPardiso solver keep internal state, so
+    only one solve runs at a time.
+    """
+
+    def __init__(self, solver: Callable):
+        self.solver = solver
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.solver(*args, **kwargs)
+
+
+class PoolEntry(object):
+    """The inventory data of one set of databases, and optionally the
+    factorization of its technosphere matrix.
+    """
+
+    def __init__(self, state: dict):
+        self.state = state
+        self.solver = None
+        self.adjoint_solver = None
+
+
+class LCAPool(object):
+    """Project-scoped pool of assembled LCA matrices and factorizations.
+
+    Loading the processed arrays, assembling the technosphere and biosphere
+    matrices and factorizing the technosphere matrix are by far the most
+    expensive steps of an LCA, and their results only depend on the involved
+    databases. The pool keeps these results in memory, keyed by the processed
+    files of the databases and their modification times, so LCA objects for
+    other reference flows or impact categories on the same databases can
+    skip them entirely.
+
+    The pool is cleared when databases change or another project is opened.
+
+    Parameters
+    ----------
+    max_entries : Number of different database sets kept in memory
+    """
+
+    def __init__(self, max_entries: int = 2):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+        bd.databases.metadata_changed.connect(self.clear)
+        bd.projects.current_changed.connect(self.clear)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @staticmethod
+    def key(lca: bc.LCA) -> Optional[tuple]:
+        """Return the pool key of the given LCA, or None if it cannot be pooled."""
+        filepaths = getattr(lca, "database_filepath", None)
+        if not filepaths or getattr(lca, "presamples", None):
+            return None
+        try:
+            return tuple((fp, os.path.getmtime(fp)) for fp in sorted(filepaths))
+        except (OSError, TypeError):
+            return None
+
+    def load_lci_data(self, lca: bc.LCA) -> None:
+        """Pooled equivalent of `lca.load_lci_data()`."""
+        key = self.key(lca)
+        if key is None:
+            lca.load_lci_data()
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            before = dict(lca.__dict__)
+            lca.load_lci_data()
+            # Store everything that was set while loading the inventory data.
+            entry = PoolEntry(
+                {
+                    k: checkout(v)
+                    for k, v in lca.__dict__.items()
+                    if k not in before or before[k] is not v
+                }
+            )
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            log.debug("Using pooled inventory data")
+            self._entries.move_to_end(key)
+            for k, v in entry.state.items():
+                setattr(lca, k, checkout(v))
+        lca._pool_key = key
+
+    def decompose_technosphere(self, lca: bc.LCA) -> None:
+        """Pooled equivalent of `lca.decompose_technosphere()`.
+
+        The pooled factorization is only used if the technosphere matrix of
+        the LCA is still identical to the pooled matrix.
+        """
+        entry = self._entries.get(getattr(lca, "_pool_key", None))
+        if entry is None or not self._unchanged(
+            lca.technosphere_matrix, entry.state.get("technosphere_matrix")
+        ):
+            lca.decompose_technosphere()
+        elif entry.solver is None:
+            lca.decompose_technosphere()
+            entry.solver = SharedSolver(lca.solver)
+            lca.solver = entry.solver
+        else:
+            log.debug("Using pooled factorization")
+            lca.solver = entry.solver
+
+    def adjoint_solver(self, lca: bc.LCA):
+        """Return a solver for the transposed technosphere matrix of the LCA.
+
+        Solving the transposed system gives the sensitivity of a score to
+        every technosphere amount at once. The factorized solver of the LCA
+        cannot solve transposed systems, so the transposed matrix is
+        factorized separately and pooled next to the factorization.
+        """
+        entry = self._entries.get(getattr(lca, "_pool_key", None))
+        if entry is None or not self._unchanged(
+            lca.technosphere_matrix, entry.state.get("technosphere_matrix")
+        ):
+            return factorized(lca.technosphere_matrix.T.tocsc())
+        if entry.adjoint_solver is None:
+            entry.adjoint_solver = SharedSolver(
+                factorized(lca.technosphere_matrix.T.tocsc())
+            )
+        else:
+            log.debug("Using pooled adjoint factorization")
+        return entry.adjoint_solver
+
+    @staticmethod
+    def _unchanged(matrix, pooled) -> bool:
+        """Whether the matrix has the values of the pooled matrix. Explicit
+        zeros, such as the scenario slots of `SuperstructureMLCA`, are equal
+        to absent values.
+        """
+        if pooled is None or matrix.shape != pooled.shape:
+            return False
+        return (matrix != pooled).nnz == 0
+
+
+lca_pool = LCAPool()
+
+
+class CharacterizationCache(object):
+    """Cache of loaded impact categories, shared by all calculations.
+
+    Stores the characterization matrix and `cf_params` that
+    `LCA.switch_method` produces, keyed by the impact category, its
+    modification state and the biosphere index of the LCA they were built
+    for. Entries are dropped when impact categories change or another
+    project is opened.
+    """
+
+    # Attributes which are always taken from a loaded impact category.
+    ATTRIBUTES = ("method", "cf_params", "characterization_matrix")
+
+    def __init__(self):
+        self._entries = {}
+        self._connected = set()
+
+        bd.methods.metadata_changed.connect(self.clear)
+        bd.projects.current_changed.connect(self.clear)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        for method in list(self._connected):
+            self._disconnect(method)
+
+    def invalidate(self, method: tuple) -> None:
+        for key in [k for k in self._entries if k[0] == method]:
+            del self._entries[key]
+        self._disconnect(method)
+
+    def method_changed(self, method: bd.Method) -> None:
+        """Handler for the `changed` signal of every cached impact category."""
+        self.invalidate(method.name)
+
+    @staticmethod
+    def _fingerprint(lca: bc.LCA) -> int:
+        """Hash of the biosphere index of the LCA, memoized on the LCA."""
+        biosphere = lca.biosphere_dict
+        cached = getattr(lca, "_biosphere_fingerprint", None)
+        if cached is None or cached[0] is not biosphere:
+            cached = (biosphere, hash(frozenset(biosphere.items())))
+            lca._biosphere_fingerprint = cached
+        return cached[1]
+
+    def switch_method(self, lca: bc.LCA, method: tuple) -> None:
+        """Cached equivalent of `lca.switch_method(method)`."""
+        key = (method, repr(method_state(method)), self._fingerprint(lca))
+        entry = self._entries.get(key)
+        if entry is None:
+            before = dict(lca.__dict__)
+            lca.switch_method(method)
+            entry = {
+                k: checkout(v)
+                for k, v in lca.__dict__.items()
+                if k in self.ATTRIBUTES or k not in before or before[k] is not v
+            }
+            self._entries[key] = entry
+            self._connect(method)
+        else:
+            for k, v in entry.items():
+                setattr(lca, k, checkout(v))
+
+    def _connect(self, method: tuple) -> None:
+        if method in self._connected:
+            return
+        bd.Method(method).changed.connect(self.method_changed)
+        self._connected.add(method)
+
+    def _disconnect(self, method: tuple) -> None:
+        """Disconnect from an impact category that is no longer cached, so
+        its signal object can be released.
+        """
+        if method not in self._connected:
+            return
+        self._connected.discard(method)
+        try:
+            bd.Method(method).changed.disconnect(self.method_changed)
+        except (RuntimeError, TypeError):
+            pass  # The signal object was already deleted
+
+
+characterization_cache = CharacterizationCache()
+
+
+class PooledGraphTraversal(GraphTraversal):
+    """GraphTraversal which takes its inventory data and factorization from
+    the `lca_pool`.
+    """
+
+    def build_lca(self, demand, method):
+        lca = bc.LCA(demand, method)
+        lca_pool.load_lci_data(lca)
+        lca.build_demand_array()
+        lca_pool.decompose_technosphere(lca)
+        lca.lci_calculation()
+        lca.lcia()
+        return lca, lca.solve_linear_system(), lca.score
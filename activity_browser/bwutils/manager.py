@@ -6,10 +6,11 @@ import numpy as np
 from bw2calc import LCA
 from stats_arrays import MCRandomNumberGenerator, UncertaintyBase
 
-from activity_browser.mod.bw2data.backends import ExchangeDataset
+from activity_browser import log
 from activity_browser.mod.bw2data.parameters import *
 
-from .utils import Index, Indices, Parameters, StaticParameters
+from .formulas import CompiledParameters
+from .utils import Indices, Parameters, StaticParameters
 
 
 class ParameterManager(object):
@@ -21,6 +22,7 @@ class ParameterManager(object):
         self.parameters: Parameters = Parameters.from_bw_parameters()
         self.initial: StaticParameters = StaticParameters()
         self.indices: Indices = self.construct_indices()
+        self._compiled: Optional[CompiledParameters] = None
 
     def construct_indices(self) -> Indices:
         """Given that ParameterizedExchanges will always have the same order of
@@ -29,10 +31,7 @@ class ParameterManager(object):
         indices = Indices()
         for p in self.initial.act_by_group_db:
             params = self.initial.exc_by_group(p.group)
-            indices.extend(
-                Index.build_from_exchange(ExchangeDataset.get_by_id(pk))
-                for pk in params
-            )
+            indices.extend(self.initial.exchange(pk) for pk in params)
         return indices
 
     def recalculate_project_parameters(self) -> dict:
@@ -174,6 +173,39 @@ class ParameterManager(object):
         self.parameters.update(values)
         return self.calculate()
 
+    @property
+    def compiled(self) -> Optional[CompiledParameters]:
+        """The compiled parameter formulas, or None if these cannot be
+        compiled (e.g. because of circular references).
+        """
+        if self._compiled is None:
+            try:
+                self._compiled = CompiledParameters(self.initial, self.parameters)
+            except ValueError as e:
+                log.warning(f"Parameters cannot be compiled: {e}")
+                self._compiled = False
+        return self._compiled or None
+
+    def recalculate_samples(self, values: np.ndarray) -> np.ndarray:
+        """Recalculate the exchanges for an (N x parameters) array of
+        parameter values at once, returns an (N x exchanges) array.
+
+        As with `recalculate`, NaN values keep the amount of the previous set
+        of values. The parameters are left at the last set of values.
+        """
+        values = np.array(values, dtype=np.float64, ndmin=2)
+        current = np.array([p.amount for p in self.parameters], dtype=np.float64)
+        filled = np.vstack([current, values])
+        # Forward-fill NaN values with the previous value of the parameter.
+        rows = np.where(np.isnan(filled), 0, np.arange(len(filled))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        filled = filled[rows, np.arange(filled.shape[1])][1:]
+
+        if self.compiled is None:
+            return np.array([self.recalculate(v) for v in filled])
+        self.parameters.update(filled[-1])
+        return self.compiled.evaluate(filled)
+
     def ps_recalculate(self, values: List[float]) -> np.ndarray:
         """Used to recalculate brightway parameters without editing the database.
         Leftover from Presamples.
@@ -206,8 +238,8 @@ class ParameterManager(object):
         Side-note on presamples: Presamples was used in AB for calculating scenarios,
         presamples was superseded by this implementation. For more reading:
         https://presamples.readthedocs.io/en/latest/index.html"""
-        sample_data = [self.ps_recalculate(list(values)) for _, values in scenarios]
-        samples = np.concatenate(sample_data, axis=1)
+        values = [list(values) for _, values in scenarios]
+        samples = self.recalculate_samples(values).T
         indices = self.reformat_indices()
         return samples, indices
 
@@ -229,7 +261,7 @@ class ParameterManager(object):
             for exc, formula in exchanges.items():
                 params = get_new_symbols([formula])
                 # Convert exchange from int to Index
-                exc = Index.build_from_exchange(ExchangeDataset.get_by_id(exc))
+                exc = self.initial.exchange(exc)
                 for param in params:
                     parameters[param].append(exc)
         return parameters
@@ -316,6 +348,10 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
     def __next__(self):
         return self.next()
 
+    def reseed(self, seed: Optional[int] = None) -> None:
+        """Restart sampling the parameter uncertainties from the given seed."""
+        self.mc_generator = MCRandomNumberGenerator(self.uncertainties, seed=seed)
+
     def recalculate(self, iterations: int = 10) -> np.ndarray:
         assert iterations > 0, "Must have a positive amount of iterations"
         if iterations == 1:
@@ -325,13 +361,11 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
         all_data = np.empty((iterations, len(self.indices)), dtype=Indices.array_dtype)
         random_bounded_values = self.mc_generator.generate(iterations)
 
-        # Now, repeatedly replace parameter amounts with sampled data and
-        # recalculate. Every processed row is added to the sized array.
+        # Recalculate all samples at once, every processed row is added
+        # to the sized array.
+        data = self.recalculate_samples(random_bounded_values.T)
         for i in range(iterations):
-            values = random_bounded_values.take(i, axis=1)
-            self.parameters.update(values)
-            data = self.calculate()
-            all_data[i] = self.indices.mock_params(data)
+            all_data[i] = self.indices.mock_params(data[i])
 
         return all_data
 
@@ -339,24 +373,21 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
         """Similar to `recalculate` but only performs a single sampling and
         recalculation.
         """
+        return self.indices.mock_params(self.sample())
+
+    def sample(self) -> np.ndarray:
+        """Sample the parameters once and return the recalculated exchange
+        amounts, in the order of `indices`.
+        """
         values = self.mc_generator.next()
-        self.parameters.update(values)
-        data = self.calculate()
-        return self.indices.mock_params(data)
+        return self.recalculate_samples(values)[0]
 
     def retrieve_sampled_values(self, data: dict):
         """Enters the sampled values into the 'exchanges' list in the 'data'
         dictionary.
         """
         for name, vals in data.items():
-            param = next(
-                (
-                    p
-                    for p in self.parameters
-                    if p.name == vals.get("name") and p.group == vals.get("group")
-                ),
-                None,
-            )
+            param = self.parameters.get(vals.get("group"), vals.get("name"))
             if param is None:
                 continue
             data[name]["values"].append(param.amount)
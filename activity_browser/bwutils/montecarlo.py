@@ -1,21 +1,133 @@
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import tempfile
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from time import time
-from typing import Optional, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 import bw2calc as bc
 import numpy as np
 import pandas as pd
+from scipy.sparse.linalg import LinearOperator, bicgstab
 from stats_arrays import MCRandomNumberGenerator
 
 from activity_browser import log
 from activity_browser.mod import bw2data as bd
+from activity_browser.mod.bw2data.parameters import (
+    ActivityParameter,
+    DatabaseParameter,
+    ParameterizedExchange,
+    ProjectParameter,
+)
 
+from .lca_pool import characterization_cache, lca_pool, method_state
 from .manager import MonteCarloParameterManager
+from .multilca import linked_databases
+from .sampling import InverseCDF, SampledValues, UniformSampler
+
+# The relative tolerance of the Krylov solvers was renamed in scipy 1.12
+_RTOL = "rtol" if "rtol" in inspect.signature(bicgstab).parameters else "tol"
+
+
+class RunningStatistics(object):
+    """Mean and variance of the Monte Carlo scores of every reference flow
+    and impact category, updated block by block while the simulation runs.
+
+    Blocks are merged with the pairwise form of Welford's algorithm (Chan et
+    al.), so the statistics are numerically stable and do not require the
+    scores of earlier blocks.
+    """
+
+    # z-value of the two-sided 95% confidence interval
+    z = 1.959964
+    quantile_levels = (0.025, 0.5, 0.975)
+
+    def __init__(self, shape: Tuple[int, int]):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.quantiles = np.full((len(self.quantile_levels),) + tuple(shape), np.nan)
+
+    def update(self, scores: np.ndarray) -> None:
+        """Add a block of (iterations x reference flows x methods) scores."""
+        n = len(scores)
+        if n == 0:
+            return
+        mean = scores.mean(axis=0)
+        m2 = ((scores - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    def update_quantiles(self, scores: np.ndarray) -> None:
+        """Recalculate the quantiles from all scores so far."""
+        if len(scores):
+            self.quantiles = np.quantile(scores, self.quantile_levels, axis=0)
+
+    @property
+    def std(self) -> np.ndarray:
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    @property
+    def ci_width(self) -> np.ndarray:
+        """Width of the 95% confidence interval of the mean scores, relative
+        to the mean.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            width = 2 * self.z * self.std / np.sqrt(self.count) / np.abs(self.mean)
+        # Scores that are exactly zero in every iteration have converged.
+        width[(self.m2 == 0) & (self.mean == 0)] = 0
+        return width
+
+    def converged(self, tolerance: float) -> bool:
+        """Whether the confidence intervals of all mean scores are narrower
+        than `tolerance` (relative to the mean).
+        """
+        if self.count < 2:
+            return False
+        return bool(np.all(self.ci_width <= tolerance))
+
+    def copy(self) -> "RunningStatistics":
+        other = RunningStatistics(self.mean.shape)
+        other.count = self.count
+        other.mean = self.mean.copy()
+        other.m2 = self.m2.copy()
+        other.quantiles = self.quantiles.copy()
+        return other
 
 
 class MonteCarloLCA(object):
     """A Monte Carlo LCA for multiple reference flows and methods loaded from a calculation setup."""
 
+    # Number of iterations drawn from a single random stream, the unit of
+    # work that is distributed over worker processes.
+    block_size = 25
+    # Sample arrays larger than this (in bytes) are stored in a temporary
+    # file instead of in memory.
+    memmap_threshold = 256 * 1024**2
+    # Convergence settings of the iterative solver, iterations that do not
+    # converge are solved directly instead.
+    solver_tolerance = 1e-10
+    solver_max_iterations = 100
+    # Minimum number of iterations before a simulation with a target
+    # confidence interval width can stop, and the minimum number of seconds
+    # between two published intermediate statistics.
+    min_iterations = 100
+    publish_interval = 0.5
+    # Checkpoints are written to this folder in the project directory, at
+    # most every `checkpoint_interval` seconds and when a simulation ends.
+    CHECKPOINT_DIRECTORY = "ab_montecarlo"
+    CHECKPOINT_VERSION = 2
+    checkpoint_interval = 60
+
     def __init__(self, cs_name):
         if cs_name not in bd.calculation_setups:
             raise ValueError("{} is not a known `calculation_setup`.".format(cs_name))
@@ -24,12 +136,19 @@ class MonteCarloLCA(object):
         self.cs = bd.calculation_setups[cs_name]
         self.seed = None
         self.cf_rngs = {}
+        self.cf_rows = {}
+        self.cf_params = {}
         self.CF_rng_vectors = {}
         self.include_technosphere = True
         self.include_biosphere = True
         self.include_cfs = True
         self.include_parameters = True
+        self.solver = "direct"
+        self.sampler = "random"
         self.param_rng = None
+        # (tech_params/bio_params positions, parameterized exchange positions)
+        self.tech_param_map: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.bio_param_map: Optional[Tuple[np.ndarray, np.ndarray]] = None
         self.param_cols = ["row", "col", "type"]
 
         self.tech_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
@@ -54,45 +173,76 @@ class MonteCarloLCA(object):
         self.method_index = {m: i for i, m in enumerate(self.methods)}
         self.rev_method_index = {i: m for i, m in enumerate(self.methods)}
 
-        # GSA calculation variables
-        self.A_matrices = list()
-        self.B_matrices = list()
-        self.CF_dict = defaultdict(list)
+        # GSA calculation variables, the sampled tech_params, bio_params and
+        # cf_params amounts as (iterations x params) arrays.
+        self.technosphere_samples: Optional[np.ndarray] = None
+        self.biosphere_samples: Optional[np.ndarray] = None
+        self.cf_samples = {}
         self.parameter_exchanges = list()
         self.parameters = list()
         self.parameter_data = defaultdict(dict)
 
         self.results = list()
+        self.statistics: Optional[RunningStatistics] = None
+        self.tolerance: Optional[float] = None
+        self.settings = {}
+        # Key of the data the samples are drawn from, see `_checkpoint_key`.
+        self.checkpoint_key: Optional[str] = None
 
         self.lca = bc.LCA(demand=self.func_units_dict, method=self.methods[0])
 
-    def unify_param_exchanges(self, data: np.ndarray) -> np.ndarray:
-        """Convert an array of parameterized exchanges from input/output keys
-        into row/col values using dicts generated in bw.LCA object.
-
-        If any given exchange does not exist in the current LCA matrix,
-        it will be dropped from the returned array.
+    @staticmethod
+    def _match_params(
+        params: np.ndarray, rows: np.ndarray, cols: np.ndarray, types: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the positions in `params` that match the given row/col/type
+        combinations, and for each of these the matching combination.
         """
+        if not len(rows) or not len(params):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        width = int(max(params["col"].max(), cols.max())) + 1
+        keys = (params["row"].astype(np.int64) * width + params["col"]) * 256
+        keys += params["type"]
+        wanted = (rows * width + cols) * 256 + types
+        order = np.argsort(wanted)
+        position = np.searchsorted(wanted, keys, sorter=order)
+        position = order[np.clip(position, 0, len(wanted) - 1)]
+        match = wanted[position] == keys
+        return np.flatnonzero(match), position[match]
 
-        def key_to_rowcol(x) -> Optional[tuple]:
-            if x["type"] in [0, 1]:
-                row = self.lca.activity_dict.get(x["input"], None)
-                col = self.lca.product_dict.get(x["output"], None)
+    def build_parameter_map(self) -> None:
+        """Map the exchanges recalculated by the parameter manager to their
+        positions in the tech_params and bio_params arrays.
+
+        Sampled exchange amounts can then be inserted into the sampled vectors
+        with a single assignment, see `calculate_block`. Exchanges that are not
+        part of the LCA matrices are ignored.
+        """
+        count = len(self.param_rng.indices)
+        rows = np.full(count, -1, dtype=np.int64)
+        cols = np.full(count, -1, dtype=np.int64)
+        types = np.zeros(count, dtype=np.int64)
+        for i, index in enumerate(self.param_rng.indices):
+            types[i] = index.exchange_type
+            if types[i] in (0, 1):
+                row = self.lca.activity_dict.get(index.input)
+                col = self.lca.product_dict.get(index.output)
             else:
-                row = self.lca.biosphere_dict.get(x["input"], None)
-                col = self.lca.activity_dict.get(x["output"], None)
-            # if either the row or the column is None, return np.NaN.
-            if row is None or col is None:
-                return None
-            return row, col, x["type"], x["amount"]
-
-        # Convert the data and store in a new array, dropping Nones.
-        converted = (key_to_rowcol(d) for d in data)
-        unified = np.array(
-            [x for x in converted if x is not None],
-            dtype=[("row", "<u4"), ("col", "<u4"), ("type", "u1"), ("amount", "<f4")],
-        )
-        return unified
+                row = self.lca.biosphere_dict.get(index.input)
+                col = self.lca.activity_dict.get(index.output)
+            if row is not None and col is not None:
+                rows[i], cols[i] = row, col
+
+        found = (rows >= 0) & (cols >= 0)
+        for name, params, subset in (
+            ("tech_param_map", self.lca.tech_params, found & np.isin(types, [0, 1])),
+            ("bio_param_map", self.lca.bio_params, found & (types == 2)),
+        ):
+            sources = np.flatnonzero(subset)
+            targets, position = self._match_params(
+                params, rows[sources], cols[sources], types[sources]
+            )
+            setattr(self, name, (targets, sources[position]))
 
     def load_data(self) -> None:
         """Constructs the random number generators for all of the matrices that
@@ -102,7 +252,7 @@ class MonteCarloLCA(object):
         amounts of the 'params' matrices are used in place of generating
         a vector
         """
-        self.lca.load_lci_data()
+        lca_pool.load_lci_data(self.lca)
 
         self.tech_rng = (
             MCRandomNumberGenerator(self.lca.tech_params, seed=self.seed)
@@ -120,8 +270,9 @@ class MonteCarloLCA(object):
                 {}
             )  # we need as many cf_rng as impact categories, because they are of different size
             for m in self.methods:
-                self.lca.switch_method(m)
-                self.lca.load_lcia_data()
+                characterization_cache.switch_method(self.lca, m)
+                self.cf_params[m] = self.lca.cf_params
+                self.cf_rows[m] = self.lca.cf_params["row"]
                 self.cf_rngs[m] = (
                     MCRandomNumberGenerator(self.lca.cf_params, seed=self.seed)
                     if self.include_cfs
@@ -130,6 +281,7 @@ class MonteCarloLCA(object):
         # Construct the MC parameter manager
         if self.include_parameters:
             self.param_rng = MonteCarloParameterManager(seed=self.seed)
+            self.build_parameter_map()
 
         (
             self.lca.activity_dict_rev,
@@ -137,28 +289,23 @@ class MonteCarloLCA(object):
             self.lca.biosphere_dict_rev,
         ) = self.lca.reverse_dict()
 
-    def calculate(self, iterations=10, seed: int = None, **kwargs):
-        """Main calculate method for the MC LCA class, allows fine-grained control
-        over which uncertainties are included when running MC sampling.
+    def prepare(self, seed: int, **kwargs) -> None:
+        """Load the data and random number generators for the given seed and
+        uncertainty settings, see `calculate`.
         """
-        start = time()
-        self.iterations = iterations
-        self.seed = seed or bc.utils.get_seed()
+        self.seed = seed
         self.include_technosphere = kwargs.get("technosphere", True)
         self.include_biosphere = kwargs.get("biosphere", True)
         self.include_cfs = kwargs.get("cf", True)
         self.include_parameters = kwargs.get("parameters", True)
+        self.solver = kwargs.get("solver", "direct")
+        self.sampler = kwargs.get("sampler", "random")
 
         self.load_data()
-
-        self.results = np.zeros((iterations, len(self.func_units), len(self.methods)))
-
-        # Reset GSA variables to empty.
-        self.A_matrices = list()
-        self.B_matrices = list()
-        self.CF_dict = defaultdict(list)
-        self.parameter_exchanges = list()
-        self.parameters = list()
+        if self.solver == "iterative":
+            self.prepare_iterative_solver()
+        if self.sampler != "random":
+            self.prepare_sampler()
 
         # Prepare GSA parameter schema:
         if self.include_parameters:
@@ -167,90 +314,596 @@ class MonteCarloLCA(object):
             for k in self.parameter_data:
                 self.parameter_data[k]["values"] = []
 
-        for iteration in range(iterations):
+    def prepare_iterative_solver(self) -> None:
+        """Factorize the deterministic technosphere matrix and solve the
+        baseline supply vector of every reference flow.
+
+        The baseline factorization preconditions the iterative solver and the
+        baseline supply vectors are its starting points, see `solve`.
+        """
+        lca_pool.decompose_technosphere(self.lca)
+        self.base_solver = self.lca.solver
+        # Sampled matrices must not be solved with the baseline factorization.
+        del self.lca.solver
+        self.demand_arrays, self.base_supply = {}, {}
+        for row, func_unit in self.rev_fu_index.items():
+            self.lca.build_demand_array(func_unit)
+            self.demand_arrays[row] = self.lca.demand_array.copy()
+            self.base_supply[row] = self.base_solver(self.demand_arrays[row])
+
+    def solve(self, row: int) -> np.ndarray:
+        """Iteratively solve the supply vector of the reference flow for the
+        current (sampled) technosphere matrix.
+
+        Sampled matrices are close to the baseline, so BiCGSTAB preconditioned
+        with the baseline factorization and started from the baseline supply
+        converges in a few iterations. Falls back on a direct solve otherwise.
+        """
+        matrix = self.lca.technosphere_matrix
+        preconditioner = LinearOperator(matrix.shape, matvec=self.base_solver)
+        supply, info = bicgstab(
+            matrix,
+            self.demand_arrays[row],
+            x0=self.base_supply[row],
+            M=preconditioner,
+            maxiter=self.solver_max_iterations,
+            **{_RTOL: self.solver_tolerance},
+        )
+        demand = self.demand_arrays[row]
+        residual = np.linalg.norm(matrix @ supply - demand)
+        if info != 0 or residual > self.solver_tolerance * np.linalg.norm(demand):
+            log.debug(f"Iterative solver did not converge ({info}), solving directly")
+            self.lca.demand_array = demand
+            supply = self.lca.solve_linear_system()
+        return supply
+
+    def blocks(self, iterations: int) -> List[Tuple[int, int, int]]:
+        """Split the iterations into (block, first iteration, size) blocks."""
+        return [
+            (block, first, min(self.block_size, iterations - first))
+            for block, first in enumerate(range(0, iterations, self.block_size))
+        ]
+
+    def prepare_sampler(self) -> None:
+        """Prepare the Latin hypercube or Sobol' sampling of all included
+        uncertainties.
+
+        Every uncertain amount is a dimension of the uniform points, which
+        are mapped through the inverse CDF of its distribution. Parameters
+        and CFs come first, as the first dimensions of a Sobol' sequence are
+        the most evenly distributed.
+        """
+        self.inverse_cdfs = {}
+        if self.include_parameters:
+            self.inverse_cdfs["parameters"] = InverseCDF(self.param_rng.uncertainties)
+        if self.include_cfs:
+            for m in self.methods:
+                self.inverse_cdfs[m] = InverseCDF(self.cf_params[m])
+        if self.include_biosphere:
+            self.inverse_cdfs["biosphere"] = InverseCDF(self.lca.bio_params)
+        if self.include_technosphere:
+            self.inverse_cdfs["technosphere"] = InverseCDF(self.lca.tech_params)
+        dimensions = sum(f.dimensions for f in self.inverse_cdfs.values())
+        self.uniform_sampler = UniformSampler(self.sampler, dimensions, self.seed)
+
+    def reseed(self, block: int, size: int) -> None:
+        """Restart all random number generators on the random stream of the
+        given block.
+
+        The streams are spawned from the user seed, so every block draws the
+        same samples regardless of the process that calculates it. With
+        Latin hypercube or Sobol' sampling all samples of the block are drawn
+        at once.
+        """
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(block,))
+        seeds = [int(s) for s in sequence.generate_state(3 + len(self.methods))]
+        if self.sampler != "random":
+            self.sample_block(block, size, seeds[0])
+            return
+        if self.include_technosphere:
+            self.tech_rng = MCRandomNumberGenerator(self.lca.tech_params, seed=seeds[0])
+        if self.include_biosphere:
+            self.bio_rng = MCRandomNumberGenerator(self.lca.bio_params, seed=seeds[1])
+        if self.include_parameters:
+            self.param_rng.reseed(seeds[2])
+        if self.include_cfs:
+            for i, m in enumerate(self.methods):
+                self.cf_rngs[m] = MCRandomNumberGenerator(
+                    self.cf_params[m], seed=seeds[3 + i]
+                )
+
+    def sample_block(self, block: int, size: int, seed: int) -> None:
+        """Draw the samples of a block from the uniform points of the sampler."""
+        uniforms = self.uniform_sampler.sample(block, block * self.block_size, size)
+        offset = 0
+        for name, inverse_cdf in self.inverse_cdfs.items():
+            end = offset + inverse_cdf.dimensions
+            generator = SampledValues(inverse_cdf(uniforms[:, offset:end], seed))
+            offset = end
+            if name == "technosphere":
+                self.tech_rng = generator
+            elif name == "biosphere":
+                self.bio_rng = generator
+            elif name == "parameters":
+                self.param_rng.mc_generator = generator
+            else:
+                self.cf_rngs[name] = generator
+
+    def calculate_block(self, block: int, size: int) -> dict:
+        """Calculate the iterations of a single block.
+
+        Returns the results of the block together with the sampled values
+        that are used as input for the GSA, see `merge_block`.
+        """
+        self.reseed(block, size)
+        results = np.zeros((size, len(self.func_units), len(self.methods)))
+        tech_vectors = np.zeros((size, len(self.lca.tech_params)), dtype=np.float32)
+        bio_vectors = np.zeros((size, len(self.lca.bio_params)), dtype=np.float32)
+        cf_vectors = {
+            m: np.zeros((size, len(self.cf_params[m])), dtype=np.float32)
+            for m in self.methods
+        }
+        param_exchanges, parameters = [], []
+        parameter_data = {k: dict(v, values=[]) for k, v in self.parameter_data.items()}
+
+        for iteration in range(size):
             tech_vector = (
-                self.tech_rng.next() if self.include_technosphere else self.tech_rng
+                self.tech_rng.next()
+                if self.include_technosphere
+                else self.tech_rng.copy()
+            )
+            bio_vector = (
+                self.bio_rng.next() if self.include_biosphere else self.bio_rng.copy()
             )
-            bio_vector = self.bio_rng.next() if self.include_biosphere else self.bio_rng
             if self.include_parameters:
-                # Convert the input/output keys into row/col keys, and then match them against
-                # the tech_ and bio_params
-                data = self.param_rng.next()
-                param_exchanges = self.unify_param_exchanges(data)
-
-                # Select technosphere subset from param_exchanges.
-                subset = param_exchanges[np.isin(param_exchanges["type"], [0, 1])]
-                # Create index of where to insert new values from tech_params array.
-                idx = np.argwhere(
-                    np.isin(
-                        self.lca.tech_params[self.param_cols], subset[self.param_cols]
-                    )
-                ).flatten()
-                # Construct unique array of row+col+type combinations
-                uniq = np.unique(self.lca.tech_params[idx][self.param_cols])
-                # Use the unique array to sort the subset (ensures values
-                # are inserted at the correct index)
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                # Finally, insert the sorted subset amounts into the tech_vector
-                # at the correct indexes.
-                tech_vector[idx] = subset[sort_idx]["amount"]
-                # Repeat the above, but for the biosphere array.
-                subset = param_exchanges[param_exchanges["type"] == 2]
-                idx = np.argwhere(
-                    np.isin(
-                        self.lca.bio_params[self.param_cols], subset[self.param_cols]
-                    )
-                ).flatten()
-                uniq = np.unique(self.lca.bio_params[idx][self.param_cols])
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                bio_vector[idx] = subset[sort_idx]["amount"]
+                # Recalculate the parameterized exchanges and insert their
+                # amounts at the precomputed tech_ and bio_params positions.
+                amounts = self.param_rng.sample()
+                tech_vector[self.tech_param_map[0]] = amounts[self.tech_param_map[1]]
+                bio_vector[self.bio_param_map[0]] = amounts[self.bio_param_map[1]]
 
                 # Store parameter data for GSA
-                self.parameter_exchanges.append(param_exchanges)
-                self.parameters.append(self.param_rng.parameters.to_gsa())
+                param_exchanges.append(amounts)
+                parameters.append(self.param_rng.parameters.to_gsa())
                 # Extract sampled values for parameters, store.
-                self.param_rng.retrieve_sampled_values(self.parameter_data)
+                self.param_rng.retrieve_sampled_values(parameter_data)
 
+            tech_vectors[iteration] = tech_vector
+            bio_vectors[iteration] = bio_vector
             self.lca.rebuild_technosphere_matrix(tech_vector)
             self.lca.rebuild_biosphere_matrix(bio_vector)
 
-            # store matrices for GSA
-            self.A_matrices.append(self.lca.technosphere_matrix)
-            self.B_matrices.append(self.lca.biosphere_matrix)
-
-            if not hasattr(self.lca, "demand_array"):
-                self.lca.build_demand_array()
-            self.lca.lci_calculation()
+            if self.solver == "direct":
+                if not hasattr(self.lca, "demand_array"):
+                    self.lca.build_demand_array()
+                self.lca.lci_calculation()
 
             # pre-calculating CF vectors enables the use of the SAME CF vector for each FU in a given run
-            cf_vectors = {}
+            cf_vector = {}
             for m in self.methods:
-                cf_vectors[m] = (
+                cf_vector[m] = (
                     self.cf_rngs[m].next() if self.include_cfs else self.cf_rngs[m]
                 )
-                # store CFs for GSA (in a list defaultdict)
-                self.CF_dict[m].append(cf_vectors[m])
+                # store CFs for GSA
+                cf_vectors[m][iteration] = cf_vector[m]
 
             # iterate over FUs
             for row, func_unit in self.rev_fu_index.items():
-                self.lca.redo_lci(func_unit)  # lca calculation
+                if self.solver == "iterative":
+                    inventory = self.lca.biosphere_matrix @ self.solve(row)
+                else:
+                    self.lca.redo_lci(func_unit)  # lca calculation
+                    inventory = np.asarray(self.lca.inventory.sum(axis=1)).ravel()
 
-                # iterate over methods
+                # iterate over methods, the score is the sum of all sampled
+                # CFs multiplied with the inventory of their elementary flow.
                 for col, m in self.rev_method_index.items():
-                    self.lca.switch_method(m)
-                    self.lca.rebuild_characterization_matrix(cf_vectors[m])
-                    self.lca.lcia_calculation()
-                    self.results[iteration, row, col] = self.lca.score
+                    results[iteration, row, col] = (
+                        cf_vector[m] @ inventory[self.cf_rows[m]]
+                    )
+
+        return {
+            "results": results,
+            "technosphere": tech_vectors,
+            "biosphere": bio_vectors,
+            "cf": cf_vectors,
+            "parameter_exchanges": param_exchanges,
+            "parameters": parameters,
+            "parameter_values": {k: v["values"] for k, v in parameter_data.items()},
+        }
+
+    def merge_block(self, first: int, block: dict) -> None:
+        """Store the results and GSA inputs of a calculated block.
+
+        Blocks have to be merged in order to keep the GSA inputs aligned
+        with the iterations.
+        """
+        end = first + len(block["results"])
+        self.results[first:end] = block["results"]
+        self.statistics.update(block["results"])
+        self.technosphere_samples[first:end] = block["technosphere"]
+        self.biosphere_samples[first:end] = block["biosphere"]
+        for m, vectors in block["cf"].items():
+            self.cf_samples[m][first:end] = vectors
+        self.parameter_exchanges.extend(block["parameter_exchanges"])
+        self.parameters.extend(block["parameters"])
+        for k, values in block["parameter_values"].items():
+            self.parameter_data[k]["values"].extend(values)
+
+    def _sample_array(self, size: int) -> np.ndarray:
+        """Return a float32 (iterations x size) array to store samples in,
+        memory-mapped to a temporary file if it is large.
+        """
+        shape = (self.iterations, size)
+        if np.prod(shape) * np.dtype(np.float32).itemsize > self.memmap_threshold:
+            handle = tempfile.TemporaryFile(prefix="ab_mc_")
+            return np.memmap(handle, dtype=np.float32, mode="w+", shape=shape)
+        return np.zeros(shape, dtype=np.float32)
+
+    def calculate(self, iterations=10, seed: int = None, **kwargs):
+        """Main calculate method for the MC LCA class, allows fine-grained control
+        over which uncertainties are included when running MC sampling.
+
+        Iterations are calculated in blocks of `block_size`, every block draws
+        from its own random stream spawned from the seed. With `workers` > 1
+        the blocks are distributed over that many processes, which each build
+        their own LCA. The results are identical for any number of workers.
+
+        With `solver="iterative"` the sampled technosphere matrices are solved
+        iteratively, using the deterministic matrix as preconditioner.
+
+        The `sampler` is either "random", "lhs" (Latin hypercube per block)
+        or "sobol" (scrambled Sobol' sequence).
+
+        With a `tolerance` the simulation stops early, once the 95% confidence
+        intervals of all mean scores are narrower than `tolerance` times the
+        mean, `iterations` is then the maximum number of iterations. The
+        running statistics are passed to `publish` while the simulation runs.
+
+        The completed iterations are regularly written to a checkpoint, unless
+        `checkpoint=False`. With `resume=True` the simulation continues from
+        the checkpoint, with its seed and uncertainty settings, up to a total
+        of `iterations`. This continues an interrupted simulation or appends
+        iterations to a finished one, with the same results as a simulation
+        that was never interrupted.
+        """
+        start = time()
+        self.checkpoint_key = self._checkpoint_key()
+        self.tolerance = kwargs.get("tolerance")
+        workers = kwargs.get("workers", 1)
+        progress = kwargs.get("progress") or (lambda current, total: None)
+        publish = self._throttle(
+            self.publish_interval, self._publish_callback(kwargs.get("publish"))
+        )
+        checkpoint = self._throttle(
+            self.checkpoint_interval,
+            self.save_checkpoint if kwargs.get("checkpoint", True) else None,
+        )
+
+        state = None
+        if kwargs.get("resume"):
+            state = self.load_checkpoint()
+            if state is None:
+                raise ValueError(
+                    "No Monte Carlo simulation to resume for '{}'.".format(self.cs_name)
+                )
+            seed = state["seed"]
+            settings = state["settings"]
+            iterations = max(iterations, state["completed"])
+        else:
+            settings = {
+                k: kwargs.get(k, True)
+                for k in ("technosphere", "biosphere", "cf", "parameters")
+            }
+            settings["solver"] = kwargs.get("solver", "direct")
+            settings["sampler"] = kwargs.get("sampler", "random")
+        self.iterations = iterations
+        self.settings = settings
+
+        self.prepare(seed or bc.utils.get_seed(), **settings)
+
+        self.results = np.zeros((iterations, len(self.func_units), len(self.methods)))
+        self.statistics = RunningStatistics(self.results.shape[1:])
+
+        # Reset GSA variables to empty.
+        self.technosphere_samples = self._sample_array(len(self.lca.tech_params))
+        self.biosphere_samples = self._sample_array(len(self.lca.bio_params))
+        self.cf_samples = {
+            m: self._sample_array(len(self.cf_params[m])) for m in self.methods
+        }
+        self.parameter_exchanges = list()
+        self.parameters = list()
+
+        done = 0
+        if state is not None:
+            # Iterations of an interrupted block are calculated again.
+            done = state["completed"]
+            if done < iterations:
+                done -= done % self.block_size
+            self.restore_checkpoint(state, done)
+        blocks = [b for b in self.blocks(iterations) if b[1] >= done]
+
+        def merged() -> None:
+            publish()
+            checkpoint()
+
+        try:
+            if workers > 1 and len(blocks) > 1:
+                self._calculate_parallel(
+                    blocks, min(workers, len(blocks)), settings, progress, merged
+                )
+            else:
+                for block, first, size in blocks:
+                    progress(first, iterations)
+                    self.merge_block(first, self.calculate_block(block, size))
+                    merged()
+                    if self.converged:
+                        break
+            if self.statistics.count < iterations:
+                self.truncate(self.statistics.count)
+            publish(force=True)
+        finally:
+            # Also keep the merged blocks of a cancelled or failed simulation,
+            # so it can be resumed.
+            checkpoint(force=True)
+        progress(self.iterations, self.iterations)
 
         log.info(
             "Monte Carlo LCA: finished {} iterations for {} reference flows and {} methods in {} seconds.".format(
-                iterations,
+                self.iterations,
                 len(self.func_units),
                 len(self.methods),
                 np.round(time() - start, 2),
             )
         )
 
+    @property
+    def converged(self) -> bool:
+        """Whether a simulation with a target confidence interval width can
+        stop.
+        """
+        if self.tolerance is None or self.statistics.count < self.min_iterations:
+            return False
+        return self.statistics.converged(self.tolerance)
+
+    def truncate(self, iterations: int) -> None:
+        """Discard the results and samples after the first `iterations`."""
+        self.iterations = iterations
+        self.results = self.results[:iterations]
+        self.technosphere_samples = self.technosphere_samples[:iterations]
+        self.biosphere_samples = self.biosphere_samples[:iterations]
+        self.cf_samples = {m: v[:iterations] for m, v in self.cf_samples.items()}
+
+    @staticmethod
+    def _throttle(interval: float, func: Optional[Callable]) -> Callable:
+        """Wrap `func` so it is called at most every `interval` seconds,
+        unless forced.
+        """
+        last = time()
+
+        def throttled(force: bool = False) -> None:
+            nonlocal last
+            if func is None or (not force and time() - last < interval):
+                return
+            func()
+            last = time()
+
+        return throttled
+
+    def _publish_callback(self, publish: Optional[Callable]) -> Optional[Callable]:
+        if publish is None:
+            return None
+
+        def publish_statistics() -> None:
+            if self.statistics.count:
+                self.statistics.update_quantiles(self.results[: self.statistics.count])
+                publish(self.statistics.copy())
+
+        return publish_statistics
+
+    @property
+    def checkpoint_path(self) -> str:
+        name = hashlib.sha256(self.cs_name.encode()).hexdigest()[:16]
+        return os.path.join(bd.projects.dir, self.CHECKPOINT_DIRECTORY, f"{name}.npz")
+
+    @staticmethod
+    def _parameter_state() -> str:
+        """Hash of all parameters and parameterized exchanges of the project."""
+        digest = hashlib.sha256()
+        for model in (
+            ProjectParameter,
+            DatabaseParameter,
+            ActivityParameter,
+            ParameterizedExchange,
+        ):
+            for row in model.select().order_by(model.id).tuples():
+                digest.update(repr(row).encode())
+        return digest.hexdigest()
+
+    def _checkpoint_key(self) -> str:
+        """Identify the calculation setup and the state of its databases,
+        impact categories and parameters. Checkpoints of a changed setup or
+        changed data cannot be resumed.
+        """
+        setup = {
+            "inv": [list(fu.items()) for fu in self.func_units],
+            "ia": self.methods,
+            "databases": {
+                db: [bd.databases[db].get(f) for f in ("modified", "processed")]
+                for db in sorted(linked_databases(self.activity_keys))
+                if db in bd.databases
+            },
+            "methods": [method_state(method) for method in self.methods],
+            "parameters": self._parameter_state(),
+        }
+        dump = json.dumps(setup, sort_keys=True, default=str)
+        return hashlib.sha256(dump.encode()).hexdigest()
+
+    def _checkpoint_sizes(self) -> dict:
+        return {
+            "technosphere": len(self.lca.tech_params),
+            "biosphere": len(self.lca.bio_params),
+            "cf": [len(self.cf_params[m]) for m in self.methods],
+            "parameters": list(self.parameter_data),
+        }
+
+    def save_checkpoint(self) -> None:
+        """Write the completed iterations to the checkpoint of the calculation
+        setup.
+
+        The random number generators are not stored: each block draws from
+        its own stream, which is restored from the seed and the block number.
+        """
+        n = self.statistics.count
+        parameters = [[p[:3] for p in self.parameters[0]]] if self.parameters else []
+        state = {
+            "version": self.CHECKPOINT_VERSION,
+            "setup": self.checkpoint_key,
+            "seed": int(self.seed),
+            "settings": self.settings,
+            "block_size": self.block_size,
+            "iterations": self.iterations,
+            "completed": n,
+            "sizes": self._checkpoint_sizes(),
+            "gsa_parameters": parameters[0] if parameters else [],
+        }
+        arrays = {
+            "state": np.array(json.dumps(state, default=str)),
+            "results": self.results[:n],
+            "technosphere": self.technosphere_samples[:n],
+            "biosphere": self.biosphere_samples[:n],
+            "parameter_exchanges": np.asarray(self.parameter_exchanges, dtype=float),
+            "parameters": np.array(
+                [[p[3] for p in row] for row in self.parameters], dtype=float
+            ),
+            "parameter_values": np.array(
+                [v["values"] for v in self.parameter_data.values()], dtype=float
+            ),
+        }
+        for i, m in enumerate(self.methods):
+            arrays[f"cf_{i}"] = self.cf_samples[m][:n]
+
+        path = self.checkpoint_path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            log.warning(f"Could not write Monte Carlo checkpoint: {e}")
+
+    def load_checkpoint(self, arrays: bool = True) -> Optional[dict]:
+        """Return the state of the checkpoint of the calculation setup, with
+        its arrays under "arrays", or None if there is no checkpoint that can
+        be resumed.
+        """
+        path = self.checkpoint_path
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                state = json.loads(str(data["state"]))
+                if (
+                    state.get("version") != self.CHECKPOINT_VERSION
+                    or state["setup"] != self._checkpoint_key()
+                    or state["block_size"] != self.block_size
+                ):
+                    return None
+                if arrays:
+                    state["arrays"] = {k: data[k] for k in data.files if k != "state"}
+        except (OSError, KeyError, ValueError) as e:
+            log.warning(f"Could not read Monte Carlo checkpoint: {e}")
+            return None
+        return state
+
+    def checkpoint_info(self) -> Optional[Tuple[int, int]]:
+        """Return the completed and planned iterations of the checkpoint."""
+        state = self.load_checkpoint(arrays=False)
+        if state is None:
+            return None
+        return state["completed"], state["iterations"]
+
+    def restore_checkpoint(self, state: dict, iterations: int) -> None:
+        """Restore the first `iterations` from a checkpoint, after `prepare`."""
+        if state["sizes"] != self._checkpoint_sizes():
+            raise ValueError(
+                "The data of calculation setup '{}' changed since the Monte Carlo "
+                "simulation was interrupted, it cannot be resumed.".format(self.cs_name)
+            )
+        arrays = state["arrays"]
+        self.results[:iterations] = arrays["results"][:iterations]
+        self.technosphere_samples[:iterations] = arrays["technosphere"][:iterations]
+        self.biosphere_samples[:iterations] = arrays["biosphere"][:iterations]
+        for i, m in enumerate(self.methods):
+            self.cf_samples[m][:iterations] = arrays[f"cf_{i}"][:iterations]
+        self.parameter_exchanges = list(arrays["parameter_exchanges"][:iterations])
+        gsa_parameters = [
+            (name, scope, tuple(act) if act else None)
+            for name, scope, act in state["gsa_parameters"]
+        ]
+        self.parameters = [
+            [p + (value,) for p, value in zip(gsa_parameters, row)]
+            for row in arrays["parameters"][:iterations].tolist()
+        ]
+        for k, values in zip(self.parameter_data, arrays["parameter_values"]):
+            self.parameter_data[k]["values"] = values[:iterations].tolist()
+        # Merge the statistics block by block, as during the simulation.
+        for first in range(0, iterations, self.block_size):
+            self.statistics.update(self.results[first : first + self.block_size])
+
+    def _calculate_parallel(
+        self,
+        blocks: list,
+        workers: int,
+        settings: dict,
+        progress: Callable,
+        merged_callback: Callable,
+    ) -> None:
+        """Calculate the blocks in worker processes.
+
+        Results are written into `self.results` as soon as a block finishes,
+        the GSA inputs and statistics are merged in order of the blocks.
+        """
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                bd.projects.base_dir,
+                bd.projects.current,
+                self.cs_name,
+                self.seed,
+                settings,
+            ),
+        )
+        futures = {
+            executor.submit(_calculate_block, block, size): (block, first)
+            for block, first, size in blocks
+        }
+        finished, merged, done = {}, blocks[0][0], blocks[0][1]
+        try:
+            pending = set(futures)
+            while pending and not self.converged:
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    block, first = futures[future]
+                    result = future.result()
+                    size = len(result["results"])
+                    self.results[first : first + size] = result["results"]
+                    finished[block] = (first, result)
+                    done += size
+                # Merge the GSA inputs of all blocks that are next in line,
+                # stopping at the same block as a serial simulation would.
+                while merged in finished and not self.converged:
+                    self.merge_block(*finished.pop(merged))
+                    merged += 1
+                progress(done, self.iterations)
+                merged_callback()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
     @property
     def func_units_dict(self) -> dict:
         """Return a dictionary of reference flows (key, demand)."""
@@ -330,6 +983,25 @@ class MonteCarloLCA(object):
         return translated_keys
 
 
+# The Monte Carlo LCA of a worker process, see `MonteCarloLCA.calculate`.
+_worker_mc: Optional[MonteCarloLCA] = None
+
+
+def _init_worker(
+    base_dir: str, project: str, cs_name: str, seed: int, settings: dict
+) -> None:
+    global _worker_mc
+    if bd.projects.base_dir != base_dir:
+        bd.projects.switch_dir(base_dir)
+    bd.projects.set_current(project, writable=False)
+    _worker_mc = MonteCarloLCA(cs_name)
+    _worker_mc.prepare(seed, **settings)
+
+
+def _calculate_block(block: int, size: int) -> dict:
+    return _worker_mc.calculate_block(block, size)
+
+
 def perform_MonteCarlo_LCA(project="default", cs_name=None, iterations=10):
     """Performs Monte Carlo LCA based on a calculation setup and returns the
     Monte Carlo LCA object."""
@@ -1,11 +1,12 @@
 from collections import OrderedDict
-from typing import Iterable, Optional, Union
+from collections.abc import Mapping
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
 
 import bw2analyzer as ba
 import bw2calc as bc
 import numpy as np
 import pandas as pd
-from PySide2.QtWidgets import QApplication, QMessageBox
+from scipy import sparse
 
 from activity_browser import log
 from activity_browser.mod import bw2data as bd
@@ -13,11 +14,254 @@ from activity_browser.mod.bw2data.backends import ActivityDataset
 
 from .commontasks import wrap_text
 from .errors import ReferenceFlowValueError
+from .lca_pool import characterization_cache, lca_pool
 from .metadata import AB_metadata
 
 ca = ba.ContributionAnalysis()
 
 
+def solve_columns(solver: Callable, demands: np.ndarray) -> np.ndarray:
+    """Solve all columns of `demands` with the given solver, returns the
+    supply arrays as columns.
+    """
+    try:
+        supply = np.asarray(solver(demands))
+    except (ValueError, TypeError, RuntimeError):
+        supply = None
+    if supply is None or supply.shape != demands.shape:
+        # Not every solver backend accepts a multi-column right-hand side,
+        # fall back on solving the columns one by one.
+        supply = np.column_stack(
+            [solver(demands[:, i]) for i in range(demands.shape[1])]
+        )
+    return supply
+
+
+def linked_databases(keys: Iterable[tuple]) -> set:
+    """Get the databases of the given activity keys and all databases they
+    depend on.
+    """
+
+    def get_dependents(dbs: set, dependents: list) -> set:
+        for dep in (bd.databases[db].get("depends", []) for db in dependents):
+            if not dbs.issuperset(dep):
+                dbs = get_dependents(dbs.union(dep), dep)
+        return dbs
+
+    dbs = set(key[0] for key in keys)
+    dbs = get_dependents(dbs, list(dbs))
+    # In rare cases, the default biosphere is not found as a dependency, see:
+    # https://github.com/LCA-ActivityBrowser/activity-browser/issues/298
+    # Always include it.
+    dbs.add(bd.config.biosphere)
+    return dbs
+
+
+class ReferenceFlowResult(NamedTuple):
+    """The results of a single reference flow across all impact categories,
+    as produced by `MLCA.batch_results`.
+    """
+
+    supply: np.ndarray
+    technosphere_flows: np.ndarray
+    inventory: np.ndarray
+    scores: np.ndarray
+    elementary_flow_contributions: np.ndarray
+    process_contributions: np.ndarray
+
+
+class LazyInventories(Mapping):
+    """Read-only mapping which rebuilds (characterized) inventory matrices
+    on request instead of storing all of them.
+
+    Rebuilt matrices are kept in a least-recently-used cache, which is
+    bounded by `max_bytes`. The most recently requested matrix is always
+    kept, even if it exceeds the budget by itself.
+
+    The available keys are collected once and kept until `clear` is called,
+    which must be done whenever the results are recalculated.
+
+    Parameters
+    ----------
+    build : Callable which constructs the sparse matrix for a given key
+    keys : Callable returning the keys that can currently be built
+    max_bytes : Memory budget of the cache in bytes
+    """
+
+    def __init__(
+        self,
+        build: Callable[[tuple], sparse.spmatrix],
+        keys: Callable[[], Iterable],
+        max_bytes: int,
+    ):
+        self._build = build
+        self._keys = keys
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._key_list: Optional[list] = None
+        self._key_set: Optional[set] = None
+
+    @staticmethod
+    def nbytes(matrix: sparse.spmatrix) -> int:
+        matrix = matrix.tocsr()
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    def __getitem__(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key not in self:
+            raise KeyError(key)
+        matrix = self._build(key)
+        self._cache[key] = matrix
+        self._cache_bytes += self.nbytes(matrix)
+        while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+            _, dropped = self._cache.popitem(last=False)
+            self._cache_bytes -= self.nbytes(dropped)
+        return matrix
+
+    def _load_keys(self) -> None:
+        if self._key_list is None:
+            self._key_list = list(self._keys())
+            self._key_set = set(self._key_list)
+
+    def __contains__(self, key) -> bool:
+        self._load_keys()
+        return key in self._key_set
+
+    def __iter__(self):
+        self._load_keys()
+        return iter(self._key_list)
+
+    def __len__(self) -> int:
+        self._load_keys()
+        return len(self._key_list)
+
+    def clear(self) -> None:
+        """Drop all cached matrices and keys, for instance after
+        recalculating.
+        """
+        self._cache.clear()
+        self._cache_bytes = 0
+        self._key_list = None
+        self._key_set = None
+
+
+class ContributionMatrix(NamedTuple):
+    """Two-dimensional selection from a `ContributionStore`.
+
+    Holds the contribution vectors as the rows of a sparse matrix, together
+    with the exact total and absolute sum (magnitude) of every row.
+    """
+
+    data: sparse.csr_matrix
+    totals: np.ndarray
+    magnitudes: np.ndarray
+
+
+class ContributionStore(object):
+    """Compact storage for contribution vectors.
+
+    Behaves like a dense array of shape `shape + (size,)` for assignment,
+    but only keeps the entries of every vector whose absolute value is at
+    least `tolerance` times the absolute sum of that vector. The exact
+    totals and absolute sums of all vectors are kept separately, so dropped
+    entries end up in the 'Rest' of a contribution analysis and relative
+    cutoffs are the same as for the dense vectors.
+
+    Selecting a single row of vectors (e.g. `store[fu_index]`) returns a
+    `ContributionMatrix`.
+
+    Parameters
+    ----------
+    shape : Leading dimensions, e.g. (reference flows, impact categories)
+    size : Length of every contribution vector
+    tolerance : Relative threshold below which entries are dropped
+    """
+
+    def __init__(self, shape: tuple, size: int, tolerance: float = 1e-9):
+        self.shape = tuple(shape)
+        self.size = size
+        self.tolerance = tolerance
+        self.totals = np.zeros(self.shape)
+        self.magnitudes = np.zeros(self.shape)
+        self._positions = np.arange(int(np.prod(self.shape))).reshape(self.shape)
+        self._indices = [np.empty(0, dtype=np.int32)] * self._positions.size
+        self._data = [np.empty(0)] * self._positions.size
+
+    def __setitem__(self, key, values: np.ndarray) -> None:
+        positions = self._positions[key]
+        values = np.asarray(values).reshape(positions.shape + (self.size,))
+        self.totals[key] = values.sum(axis=-1)
+        self.magnitudes[key] = np.abs(values).sum(axis=-1)
+        for position, vector in zip(positions.ravel(), values.reshape(-1, self.size)):
+            threshold = self.tolerance * np.abs(vector).sum()
+            indices = np.flatnonzero(np.abs(vector) > threshold)
+            self._indices[position] = indices.astype(np.int32)
+            self._data[position] = vector[indices]
+
+    def __getitem__(self, key) -> ContributionMatrix:
+        positions = self._positions[key]
+        if positions.ndim != 1:
+            raise ValueError(
+                "Selection must leave exactly one dimension, got shape {}".format(
+                    positions.shape
+                )
+            )
+        indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(self._indices[p]) for p in positions])
+        indices = [self._indices[p] for p in positions]
+        data = [self._data[p] for p in positions]
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                indptr,
+            ),
+            shape=(len(positions), self.size),
+        )
+        return ContributionMatrix(matrix, self.totals[key], self.magnitudes[key])
+
+    def take(self, index: int, axis: int) -> ContributionMatrix:
+        """Select `index` along the given leading `axis`, similar to `numpy.take`."""
+        key = [slice(None)] * len(self.shape)
+        key[axis] = index
+        return self[tuple(key)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(d.nbytes + i.nbytes for d, i in zip(self._data, self._indices))
+
+    def to_arrays(self) -> dict:
+        """Return the contents of the store as flat arrays, see `load_arrays`."""
+        indptr = np.zeros(len(self._indices) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(i) for i in self._indices])
+        return {
+            "totals": self.totals,
+            "magnitudes": self.magnitudes,
+            "indptr": indptr,
+            "indices": np.concatenate(self._indices),
+            "data": np.concatenate(self._data),
+        }
+
+    def load_arrays(
+        self,
+        totals: np.ndarray,
+        magnitudes: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+    ) -> None:
+        """Replace the contents of the store, the (possibly memory-mapped)
+        `indices` and `data` arrays are used without copying them.
+        """
+        self.totals = np.array(totals).reshape(self.shape)
+        self.magnitudes = np.array(magnitudes).reshape(self.shape)
+        self._indices = [indices[a:b] for a, b in zip(indptr[:-1], indptr[1:])]
+        self._data = [data[a:b] for a, b in zip(indptr[:-1], indptr[1:])]
+
+
 class MLCA(object):
     """Wrapper class for performing LCA calculations with many reference flows and impact categories.
 
@@ -64,6 +308,12 @@ class MLCA(object):
         calculations
     method_matrices: list
         Contains the characterization matrix for each impact category.
+    characterization_operator: `scipy.sparse.csr_matrix`
+        The diagonals of all `method_matrices` stacked into a single
+        (impact categories, biosphere) matrix
+    demand_matrix: `numpy.ndarray`
+        2-dimensional array of shape (`technosphere`, `func_units`) holding
+        the demand array of each reference flow as a column
     lca_scores: `numpy.ndarray`
         2-dimensional array of shape (`func_units`, `methods`) holding the
         calculated LCA scores of each combination of reference flow and
@@ -80,17 +330,19 @@ class MLCA(object):
         Contains the calculated technosphere flows per reference flow
     inventory: dict
         Life cycle inventory (biosphere flows) per reference flow
-    inventories: dict
-        Biosphere flows per reference flow and impact category combination
-    characterized_inventories: dict
+    inventories: `LazyInventories`
+        Biosphere flows per reference flow, disaggregated by process. Rebuilt
+        from the scaling factors when requested.
+    characterized_inventories: `LazyInventories`
         Inventory multiplied by scaling (relative impact on environment) per
-        reference flow and impact category combination
-    elementary_flow_contributions: `numpy.ndarray`
-        3-dimensional array of shape (`func_units`, `methods`, `biosphere`)
+        reference flow and impact category combination. Rebuilt from the
+        scaling factors and characterization matrices when requested.
+    elementary_flow_contributions: `ContributionStore`
+        Compact 3-dimensional store of shape (`func_units`, `methods`, `biosphere`)
         which holds the characterized inventory results summed along the
         technosphere axis
-    process_contributions: `numpy.ndarray`
-        3-dimensional array of shape (`func_units`, `methods`, `technosphere`)
+    process_contributions: `ContributionStore`
+        Compact 3-dimensional store of shape (`func_units`, `methods`, `technosphere`)
         which holds the characterized inventory results summed along the
         biosphere axis
     func_unit_translation_dict: dict
@@ -108,6 +360,11 @@ class MLCA(object):
 
     """
 
+    # Memory budget (in bytes) for each of the (characterized) inventory caches.
+    inventory_cache_size = 512 * 1024**2
+    # Contributions smaller than this fraction of the absolute total are not stored.
+    contribution_tolerance = 1e-9
+
     def __init__(self, cs_name: str):
         try:
             cs = bd.calculation_setups[cs_name]
@@ -118,16 +375,10 @@ class MLCA(object):
         # cs['inv'] contains all reference flows (rf),
         # all values of rf are the individual reference flow items.
         if [v for rf in cs["inv"] for v in rf.values() if v == 0]:
-            msg = QMessageBox()
-            msg.setWindowTitle("Reference flows equal 0")
-            msg.setText("All reference flows must be non-zero.")
-            msg.setInformativeText(
-                "Please enter a valid value before calculating LCA results again."
+            raise ReferenceFlowValueError(
+                "All reference flows must be non-zero.",
+                "Please enter a valid value before calculating LCA results again.",
             )
-            msg.setIcon(QMessageBox.Warning)
-            QApplication.restoreOverrideCursor()
-            msg.exec_()
-            raise ReferenceFlowValueError("Reference flow == 0")
 
         # reference flows and related indexes
         self.func_units = cs["inv"]
@@ -140,13 +391,16 @@ class MLCA(object):
         self.method_index = {m: i for i, m in enumerate(self.methods)}
         self.rev_method_index = {v: k for k, v in self.method_index.items()}
 
-        # initial LCA and prepare method matrices
+        # initial LCA and prepare method matrices, the technosphere matrix
+        # is only factorized once the results are actually calculated.
         self.lca = self._construct_lca()
-        self.lca.lci(factorize=True)
+        lca_pool.load_lci_data(self.lca)
         self.method_matrices = []
         for method in self.methods:
-            self.lca.switch_method(method)
+            characterization_cache.switch_method(self.lca, method)
             self.method_matrices.append(self.lca.characterization_matrix)
+        self.characterization_operator = self._construct_characterization_operator()
+        self.demand_matrix = self._construct_demand_matrix()
 
         self.lca_scores = np.zeros((len(self.func_units), len(self.methods)))
 
@@ -165,24 +419,28 @@ class MLCA(object):
         # Life cycle inventory (biosphere flows) by reference flow
         self.inventory = dict()
         # Inventory (biosphere flows) for specific reference flow (e.g. 2000x15000) and impact category.
-        self.inventories = dict()
+        self.inventories = LazyInventories(
+            self._build_inventory,
+            self.scaling_factors.keys,
+            self.inventory_cache_size,
+        )
         # Inventory multiplied by scaling (relative impact on environment) per impact category.
-        self.characterized_inventories = dict()
+        self.characterized_inventories = LazyInventories(
+            self._build_characterized_inventory,
+            self._characterized_inventory_keys,
+            self.inventory_cache_size,
+        )
 
         # Summarized contributions for EF and processes.
-        self.elementary_flow_contributions = np.zeros(
-            (
-                len(self.func_units),
-                len(self.methods),
-                self.lca.biosphere_matrix.shape[0],
-            )
+        self.elementary_flow_contributions = ContributionStore(
+            (len(self.func_units), len(self.methods)),
+            self.lca.biosphere_matrix.shape[0],
+            self.contribution_tolerance,
         )
-        self.process_contributions = np.zeros(
-            (
-                len(self.func_units),
-                len(self.methods),
-                self.lca.technosphere_matrix.shape[0],
-            )
+        self.process_contributions = ContributionStore(
+            (len(self.func_units), len(self.methods)),
+            self.lca.technosphere_matrix.shape[0],
+            self.contribution_tolerance,
         )
 
         self.func_unit_translation_dict = {}
@@ -207,56 +465,158 @@ class MLCA(object):
     def _construct_lca(self):
         return bc.LCA(demand=self.func_units_dict, method=self.methods[0])
 
-    def _perform_calculations(self):
-        """Isolates the code which performs calculations to allow subclasses
-        to either alter the code or redo calculations after matrix substitution.
+    def _construct_characterization_operator(self) -> sparse.csr_matrix:
+        """Stack the characterization factors of all impact categories into
+        a single (methods, biosphere) matrix, so all methods can be applied
+        to an inventory with one sparse product.
         """
-        for row, func_unit in enumerate(self.func_units):
-            # Do the LCA for the current reference flow
+        return sparse.vstack(
+            [sparse.csr_matrix(m.diagonal()) for m in self.method_matrices]
+        ).tocsr()
+
+    def _construct_demand_matrix(self) -> np.ndarray:
+        """Construct the multi-column right-hand side with the demand array
+        of each reference flow as a column.
+        """
+        demands = np.zeros(
+            (self.lca.technosphere_matrix.shape[0], len(self.func_units))
+        )
+        for col, func_unit in enumerate(self.func_units):
             try:
-                self.lca.redo_lci(func_unit)
+                self.lca.build_demand_array(func_unit)
             except:
                 # bw25 compatibility
                 key = list(func_unit.keys())[0]
-                self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
+                self.lca.build_demand_array({bd.get_activity(key).id: func_unit[key]})
+            demands[:, col] = self.lca.demand_array
+        return demands
+
+    def solve_demands(self, demands: np.ndarray) -> np.ndarray:
+        """Solve all columns of `demands` against a single factorization of
+        the current technosphere matrix, returns the supply arrays as columns.
+        """
+        if not hasattr(self.lca, "solver"):
+            lca_pool.decompose_technosphere(self.lca)
+        return solve_columns(self.lca.solver, demands)
+
+    def batch_results(
+        self, supply: np.ndarray
+    ) -> Iterator[Tuple[int, dict, ReferenceFlowResult]]:
+        """Calculate the inventory, scores and contributions of all reference
+        flows for all impact categories at once.
+
+        Yields the row, reference flow and results for every column in the
+        given supply arrays.
+        """
+        biosphere = self.lca.biosphere_matrix
+        diagonal = self.lca.technosphere_matrix.diagonal()
+        # (biosphere, reference flows)
+        inventories = np.asarray(biosphere @ supply)
+        # (methods, reference flows)
+        scores = np.asarray(self.characterization_operator @ inventories)
+        # Characterized biosphere, (methods, technosphere)
+        characterized = (self.characterization_operator @ biosphere).toarray()
+        factors = self.characterization_operator.toarray()
+
+        for row, func_unit in enumerate(self.func_units):
+            yield row, func_unit, ReferenceFlowResult(
+                supply=supply[:, row],
+                technosphere_flows=np.multiply(supply[:, row], diagonal),
+                inventory=inventories[:, row],
+                scores=scores[:, row],
+                elementary_flow_contributions=factors * inventories[:, row],
+                process_contributions=characterized * supply[:, row],
+            )
 
+    def _inventory_matrix(
+        self, supply: np.ndarray, biosphere: Optional[sparse.spmatrix] = None
+    ) -> sparse.spmatrix:
+        """Return the biosphere flows disaggregated by contributing process."""
+        biosphere = self.lca.biosphere_matrix if biosphere is None else biosphere
+        count = len(supply)
+        return biosphere @ sparse.spdiags([supply], [0], count, count)
+
+    def _build_inventory(self, key: str) -> sparse.spmatrix:
+        return self._inventory_matrix(self.scaling_factors[key])
+
+    def _characterized_inventory_keys(self) -> Iterator[tuple]:
+        for row, func_unit in enumerate(self.func_units):
+            if str(func_unit) in self.scaling_factors:
+                yield from ((row, col) for col in range(len(self.methods)))
+
+    def _build_characterized_inventory(self, key: tuple) -> sparse.spmatrix:
+        row, col = key
+        inventory = self._build_inventory(str(self.func_units[row]))
+        return self.method_matrices[col] @ inventory
+
+    def _perform_calculations(self):
+        """Isolates the code which performs calculations to allow subclasses
+        to either alter the code or redo calculations after matrix substitution.
+
+        All reference flows are solved together as a multi-column right-hand
+        side and all impact categories are applied at once.
+        """
+        supply = self.solve_demands(self.demand_matrix)
+
+        for row, func_unit, result in self.batch_results(supply):
             # Now update the:
             # - Scaling factors
             # - Technosphere flows
             # - Life cycle inventory
-            # - Life-cycle inventory (disaggregated by contributing process)
             # for current reference flow
-            self.scaling_factors.update({str(func_unit): self.lca.supply_array})
-            self.technosphere_flows.update(
-                {
-                    str(func_unit): np.multiply(
-                        self.lca.supply_array, self.lca.technosphere_matrix.diagonal()
-                    )
-                }
-            )
-            self.inventory.update(
-                {str(func_unit): np.array(self.lca.inventory.sum(axis=1)).ravel()}
-            )
-            self.inventories.update({str(func_unit): self.lca.inventory})
-
-            # Now, for each method, take the current reference flow and do inventory analysis
-            for col, cf_matrix in enumerate(self.method_matrices):
-                self.lca.characterization_matrix = cf_matrix
-                self.lca.lcia_calculation()
-                self.lca_scores[row, col] = self.lca.score
-                self.characterized_inventories[
-                    row, col
-                ] = self.lca.characterized_inventory.copy()
-                self.elementary_flow_contributions[row, col] = np.array(
-                    self.lca.characterized_inventory.sum(axis=1)
-                ).ravel()
-                self.process_contributions[
-                    row, col
-                ] = self.lca.characterized_inventory.sum(axis=0)
+            # The (characterized) inventories are rebuilt from these on request.
+            self.scaling_factors.update({str(func_unit): result.supply})
+            self.technosphere_flows.update({str(func_unit): result.technosphere_flows})
+            self.inventory.update({str(func_unit): result.inventory})
+
+            self.lca_scores[row] = result.scores
+            self.elementary_flow_contributions[
+                row
+            ] = result.elementary_flow_contributions
+            self.process_contributions[row] = result.process_contributions
+        self.inventories.clear()
+        self.characterized_inventories.clear()
 
     def calculate(self):
         self._perform_calculations()
 
+    def _result_keys(self) -> list:
+        """Keys of the per reference flow results, in a fixed order."""
+        return list(dict.fromkeys(str(fu) for fu in self.func_units))
+
+    def result_arrays(self) -> dict:
+        """Return the calculated results as a flat dictionary of arrays."""
+        keys = self._result_keys()
+        arrays = {
+            "lca_scores": self.lca_scores,
+            "scaling_factors": np.vstack([self.scaling_factors[k] for k in keys]),
+            "technosphere_flows": np.vstack([self.technosphere_flows[k] for k in keys]),
+            "inventory": np.vstack([self.inventory[k] for k in keys]),
+        }
+        for name in ("elementary_flow_contributions", "process_contributions"):
+            for part, array in getattr(self, name).to_arrays().items():
+                arrays[f"{name}-{part}"] = array
+        return arrays
+
+    def load_result_arrays(self, arrays: dict) -> None:
+        """Use previously calculated results instead of calculating them,
+        the counterpart of `result_arrays`.
+        """
+        self.lca_scores[...] = arrays["lca_scores"]
+        for i, key in enumerate(self._result_keys()):
+            self.scaling_factors[key] = arrays["scaling_factors"][i]
+            self.technosphere_flows[key] = arrays["technosphere_flows"][i]
+            self.inventory[key] = arrays["inventory"][i]
+        for name in ("elementary_flow_contributions", "process_contributions"):
+            getattr(self, name).load_arrays(
+                **{
+                    part: arrays[f"{name}-{part}"]
+                    for part in ("totals", "magnitudes", "indptr", "indices", "data")
+                }
+            )
+        self.inventories.clear()
+        self.characterized_inventories.clear()
+
     @property
     def func_units_dict(self) -> dict:
         """Return a dictionary of reference flow (key, demand)."""
@@ -265,20 +625,7 @@ class MLCA(object):
     @property
     def all_databases(self) -> set:
         """Get all databases linked to the reference flows."""
-
-        def get_dependents(dbs: set, dependents: list) -> set:
-            for dep in (bd.databases[db].get("depends", []) for db in dependents):
-                if not dbs.issuperset(dep):
-                    dbs = get_dependents(dbs.union(dep), dep)
-            return dbs
-
-        dbs = set(f[0] for f in self.fu_activity_keys)
-        dbs = get_dependents(dbs, list(dbs))
-        # In rare cases, the default biosphere is not found as a dependency, see:
-        # https://github.com/LCA-ActivityBrowser/activity-browser/issues/298
-        # Always include it.
-        dbs.add(bd.config.biosphere)
-        return dbs
+        return linked_databases(self.fu_activity_keys)
 
     def get_results_for_method(self, index: int = 0) -> pd.DataFrame:
         data = self.lca_scores[:, index]
@@ -395,24 +742,29 @@ class Contributions(object):
             ),
         }
 
-    def normalize(self, contribution_array: np.ndarray) -> np.ndarray:
+    def normalize(self, contribution_array: ContributionMatrix) -> ContributionMatrix:
         """Normalise the contribution array.
 
         Parameters
         ----------
-        contribution_array : A 2-dimensional contribution array
+        contribution_array : A 2-dimensional contribution matrix
 
         Returns
         -------
-        2-dimensional array of same shape, with scores normalized.
+        2-dimensional matrix of same shape, with scores normalized.
 
         """
-        scores = abs(contribution_array.sum(axis=1, keepdims=True))
-        return contribution_array / scores
+        data, totals, magnitudes = contribution_array
+        scores = abs(totals)
+        with np.errstate(divide="ignore"):
+            scaling = sparse.diags(1 / scores)
+        return ContributionMatrix(
+            (scaling @ data).tocsr(), totals / scores, magnitudes / scores
+        )
 
     def _build_dict(
         self,
-        contributions: np.ndarray,
+        contributions: ContributionMatrix,
         FU_M_index: dict,
         rev_dict: dict,
         limit: int,
@@ -422,7 +774,7 @@ class Contributions(object):
 
         Parameters
         ----------
-        contributions: A 2-dimensional contribution array
+        contributions: A 2-dimensional contribution matrix
         FU_M_index : Dictionary which maps the reference flows or methods to their matching columns
         rev_dict : 'reverse' dictionary used to map correct activity/method to its value
         limit : Number of top-contributing items to include
@@ -433,21 +785,27 @@ class Contributions(object):
         Top-contributing flows per method or activity
 
         """
+        data, totals, magnitudes = contributions
         topcontribution_dict = dict()
         for fu_or_method, col in FU_M_index.items():
+            # Only the stored (non-negligible) entries of the row are sorted,
+            # percentages are relative to the magnitude of the complete row.
+            start, end = data.indptr[col], data.indptr[col + 1]
             top_contribution = ca.sort_array(
-                contributions[col, :], limit=limit, limit_type=limit_type
+                data.data[start:end],
+                limit=limit,
+                limit_type=limit_type,
+                total=magnitudes[col],
             )
             cont_per = OrderedDict()
             cont_per.update(
                 {
-                    ("Total", ""): contributions[col, :].sum(),
-                    ("Rest", ""): contributions[col, :].sum()
-                    - top_contribution[:, 0].sum(),
+                    ("Total", ""): totals[col],
+                    ("Rest", ""): totals[col] - top_contribution[:, 0].sum(),
                 }
             )
             for value, index in top_contribution:
-                cont_per.update({rev_dict[index]: value})
+                cont_per.update({rev_dict[data.indices[start + int(index)]]: value})
             topcontribution_dict.update({fu_or_method: cont_per})
         return topcontribution_dict
 
@@ -687,12 +1045,14 @@ class Contributions(object):
         return self._build_lca_scores_df(scores)
 
     @staticmethod
-    def _build_contributions(data: np.ndarray, index: int, axis: int) -> np.ndarray:
+    def _build_contributions(
+        data: ContributionStore, index: int, axis: int
+    ) -> ContributionMatrix:
         return data.take(index, axis=axis)
 
     def get_contributions(
         self, contribution, functional_unit=None, method=None, **kwargs
-    ) -> np.ndarray:
+    ) -> ContributionMatrix:
         """Return a contribution matrix given the type and fu / method."""
         if all([functional_unit, method]) or not any([functional_unit, method]):
             raise ValueError(
@@ -716,7 +1076,7 @@ class Contributions(object):
 
     def aggregate_by_parameters(
         self,
-        contributions: np.ndarray,
+        contributions: ContributionMatrix,
         inventory: str,
         parameters: Union[str, list] = None,
     ):
@@ -724,14 +1084,14 @@ class Contributions(object):
 
         Parameters
         ----------
-        contributions : 2-dimensional contribution array
+        contributions : 2-dimensional contribution matrix
         inventory : Either 'biosphere' or 'technosphere', used to determine which inventory to use
         parameters : One or more parameters by which to aggregate the given contribution array.
 
         Returns
         -------
-        aggregated : pd.DataFrame
-            The aggregated 2-dimensional contribution array
+        aggregated : `ContributionMatrix`
+            The aggregated 2-dimensional contribution matrix
         mask_index : dict
             Contains all of the values of the aggregation mask, linked to their indexes
         mask : list or dictview or None
@@ -742,18 +1102,33 @@ class Contributions(object):
         if not parameters:
             return contributions, rev_index, None
 
-        df = pd.DataFrame(contributions).T
-        columns = list(range(contributions.shape[0]))
-        df.index = pd.MultiIndex.from_tuples(rev_index.values())
         metadata = AB_metadata.get_metadata(list(keys), fields)
-
-        joined = metadata.join(df)
-        joined.reset_index(inplace=True, drop=True)
-        grouped = joined.groupby(parameters)
-        aggregated = grouped[columns].sum()
-        mask_index = {i: m for i, m in enumerate(aggregated.index)}
-
-        return aggregated.T.values, mask_index, mask_index.values()
+        metadata = metadata.reindex(pd.MultiIndex.from_tuples(rev_index.values()))
+        grouped = metadata.groupby(parameters)
+        # Flows without a value for the parameters are not part of any group.
+        # Depending on the pandas version these get -1 or NaN as group number.
+        codes = grouped.ngroup().fillna(-1).to_numpy()
+        member = codes >= 0
+        groups = grouped.size().index
+        indicator = sparse.csr_matrix(
+            (
+                np.ones(member.sum()),
+                (np.flatnonzero(member), codes[member].astype(np.int64)),
+            ),
+            shape=(len(codes), len(groups)),
+        )
+        aggregated = (contributions.data @ indicator).tocsr()
+        mask_index = {i: m for i, m in enumerate(groups)}
+        # Entries dropped from the store are not aggregated, but still count
+        # with their absolute value.
+        dropped = contributions.magnitudes - abs(contributions.data).sum(axis=1).A1
+        magnitudes = abs(aggregated).sum(axis=1).A1 + dropped
+
+        return (
+            ContributionMatrix(aggregated, contributions.totals, magnitudes),
+            mask_index,
+            mask_index.values(),
+        )
 
     def _contribution_rows(self, contribution: str, aggregator=None):
         if aggregator is None:
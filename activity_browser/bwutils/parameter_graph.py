@@ -0,0 +1,306 @@
+"""
+Dependency-aware recalculation of brightway2 parameters.
+
+Brightway recalculates complete parameter groups, and everything downstream
+of them, whenever a single parameter changes. The `ParameterGraph` links every
+parameter and parameterized exchange to the parameters its formula uses, so
+an edit only needs to recalculate the parameters and exchanges that actually
+depend on the edited parameter.
+"""
+from collections import defaultdict, deque
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from activity_browser import log
+from activity_browser.mod import bw2data as bd
+from activity_browser.mod.bw2data.backends import ExchangeDataset
+from activity_browser.mod.bw2data.parameters import (
+    ActivityParameter,
+    DatabaseParameter,
+    Group,
+    MissingName,
+    ProjectParameter,
+)
+from activity_browser.signals import qparameter_list, qparameters
+
+from .formulas import Formula
+from .utils import QUERY_CHUNK, StaticParameters
+
+# Parameters are identified by (group, name), exchanges by their id.
+Node = Union[Tuple[str, str], int]
+
+# Parsed formulas, shared between graphs as most formulas do not change.
+_formulas: Dict[str, Formula] = {}
+
+
+def parse(formula: str) -> Formula:
+    if formula not in _formulas:
+        _formulas[formula] = Formula(formula)
+    return _formulas[formula]
+
+
+class ParameterGraph(object):
+    """Dependency graph of the parameters and parameterized exchanges of the
+    current project.
+
+    Symbols in formulas are resolved the way brightway does: first in the own
+    group, then in the groups the activity group depends on, then in the
+    database parameters and finally in the project parameters.
+    """
+
+    def __init__(self, initial: Optional[StaticParameters] = None):
+        initial = initial or StaticParameters()
+        self.amounts: Dict[Node, float] = {}
+        self.formulas: Dict[Node, Formula] = {}
+        self.exchange_groups: Dict[int, str] = {}
+        self.scopes: Dict[str, List[str]] = {}
+        self.models = {"project": ProjectParameter}
+
+        self._add_group("project", initial.project(), [])
+        for db in initial.databases:
+            self._add_group(db, initial.by_database(db), ["project"])
+            self.models[db] = DatabaseParameter
+        orders = {g.name: g.order or [] for g in Group.select()}
+        for p in initial.act_by_group_db:
+            dependencies = [
+                g for g in reversed(orders.get(p.group, [])) if g in initial.groups
+            ]
+            scope = dependencies + [p.database, "project"]
+            self._add_group(p.group, initial.act_by_group(p.group), scope)
+            self.models[p.group] = ActivityParameter
+            for pk, formula in initial.exc_by_group(p.group).items():
+                self.formulas[pk] = parse(formula)
+                self.exchange_groups[pk] = p.group
+
+        # Link every node to the nodes that use it.
+        self.dependencies: Dict[Node, List[Node]] = {}
+        self.dependents: Dict[Node, List[Node]] = defaultdict(list)
+        for node, formula in self.formulas.items():
+            group = self.exchange_groups[node] if isinstance(node, int) else node[0]
+            self.dependencies[node] = []
+            for symbol in formula.symbols:
+                source = self.resolve(symbol, group)
+                if source is not None and source != node:
+                    self.dependencies[node].append(source)
+                    self.dependents[source].append(node)
+
+    def _add_group(self, group: str, data: dict, scope: List[str]) -> None:
+        self.scopes[group] = [group] + scope
+        for name, values in data.items():
+            self.amounts[(group, name)] = values.get("amount", 0)
+            if values.get("formula"):
+                self.formulas[(group, name)] = parse(values["formula"])
+
+    def resolve(self, symbol: str, group: str) -> Optional[Tuple[str, str]]:
+        """Return the parameter a symbol refers to in the formulas of a group."""
+        for scope in self.scopes.get(group, [group]):
+            if (scope, symbol) in self.amounts:
+                return scope, symbol
+        return None
+
+    def downstream(self, node: Node) -> List[Node]:
+        """Return the node and all nodes that depend on it, in order of
+        evaluation. Raises a ValueError for circular references.
+        """
+        closure, queue = {node}, deque([node])
+        while queue:
+            for dependent in self.dependents.get(queue.popleft(), []):
+                if dependent not in closure:
+                    closure.add(dependent)
+                    queue.append(dependent)
+
+        order = []
+        waiting = {
+            n: sum(1 for d in self.dependencies.get(n, []) if d in closure)
+            for n in closure
+        }
+        ready = deque(n for n, count in waiting.items() if count == 0)
+        while ready:
+            current = ready.popleft()
+            order.append(current)
+            for dependent in self.dependents.get(current, []):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(closure):
+            raise ValueError("Circular reference in parameters")
+        return order
+
+    def evaluate(self, node: Node, values: Dict[Hashable, float]) -> float:
+        """Evaluate the formula of a node, with `values` overriding the
+        stored amounts.
+        """
+        formula = self.formulas[node]
+        group = self.exchange_groups[node] if isinstance(node, int) else node[0]
+        namespace = {}
+        for symbol in formula.symbols:
+            source = self.resolve(symbol, group)
+            if source is None and symbol in formula.defaults:
+                continue
+            elif source is None:
+                raise MissingName(
+                    "The following variables aren't defined:\n{}".format(symbol)
+                )
+            namespace[symbol] = np.array([values.get(source, self.amounts[source])])
+        value = float(formula.evaluate(namespace, 1)[0])
+        if not np.isfinite(value):
+            raise ValueError(
+                "Formula '{}' of {} does not give a finite number".format(
+                    formula.formula, node
+                )
+            )
+        return value
+
+    def recalculate(self, key: Tuple[str, str], amount: float) -> Tuple[dict, dict]:
+        """Recalculate everything downstream of the parameter `key`, given its
+        new amount. Returns the parameters whose stored amounts change and
+        all recalculated exchanges as {node: amount} dictionaries.
+        """
+        values = {key: amount}
+        parameters, exchanges = {}, {}
+        for node in self.downstream(key):
+            if node != key or node in self.formulas:
+                values[node] = self.evaluate(node, values)
+            if isinstance(node, int):
+                exchanges[node] = values[node]
+            elif values[node] != (amount if node == key else self.amounts[node]):
+                # The edited parameter is stored with the given amount, which
+                # its formula overrides.
+                parameters[node] = values[node]
+        return parameters, exchanges
+
+
+class IncrementalRecalculation(object):
+    """Recalculate and store only what changes downstream of an edited
+    parameter, falls back on a complete recalculation otherwise.
+
+    The graph is kept between edits and updated with the recalculated
+    amounts. It is rebuilt after any other change to the parameters, or when
+    another project is opened.
+    """
+
+    def __init__(self):
+        self._graph: Optional[ParameterGraph] = None
+        # Whether the next parameters_changed signal is caused by an edit
+        # that was already recalculated on the graph.
+        self._recalculated = False
+
+        bd.parameters.parameters_changed.connect(self.parameters_changed)
+        bd.projects.current_changed.connect(self.clear)
+
+    def clear(self) -> None:
+        self._graph = None
+        self._recalculated = False
+
+    def parameters_changed(self) -> None:
+        if self._recalculated:
+            self._recalculated = False
+        else:
+            self._graph = None
+
+    def graph(self) -> ParameterGraph:
+        if self._graph is None:
+            self._graph = ParameterGraph()
+        return self._graph
+
+    def __call__(self, parameter) -> None:
+        try:
+            done = self.recalculate(parameter)
+        except ValueError as e:
+            log.warning(f"Incremental parameter recalculation failed: {e}")
+            done = False
+        if not done:
+            self.clear()
+            bd.parameters.recalculate()
+
+    def recalculate(self, parameter) -> bool:
+        """Recalculate the parameters and exchanges downstream of the changed
+        parameter. Returns False if a complete recalculation is required.
+        """
+        group, name = parameter.key
+        # Other groups with pending changes require a complete recalculation.
+        expired = {g.name for g in Group.select().where(Group.fresh == False)}
+        if expired - {group}:
+            return False
+
+        graph = self.graph()
+        formula = graph.formulas.get((group, name))
+        if (formula.formula if formula else None) != (parameter.formula or None):
+            # The formula changed, so do the dependencies.
+            self._graph = None
+            graph = self.graph()
+        if (group, name) not in graph.amounts:
+            return False
+        parameters, exchanges = graph.recalculate((group, name), parameter.amount)
+
+        with ActivityParameter._meta.database.atomic():
+            stored = self.store_parameters(parameters, graph)
+            databases = self.store_exchanges(exchanges)
+            # The triggers on the parameter tables expired the changed groups.
+            groups = {group}.union(g for g, _ in parameters)
+            Group.update(fresh=True).where(Group.name.in_(list(groups))).execute()
+        for db in databases:
+            bd.databases.set_dirty(db)
+        graph.amounts[(group, name)] = parameters.get((group, name), parameter.amount)
+        graph.amounts.update(parameters)
+        self._recalculated = True
+        self.signal_changed(stored)
+        log.info(
+            f"Recalculated {len(parameters)} parameters and {len(exchanges)} exchanges"
+        )
+        return True
+
+    def store_parameters(self, changed: dict, graph: ParameterGraph) -> list:
+        """Write the changed parameter amounts, returns the stored parameters."""
+        stored = []
+        by_group = defaultdict(dict)
+        for (group, name), amount in changed.items():
+            by_group[group][name] = amount
+        for group, amounts in by_group.items():
+            model = graph.models[group]
+            query = model.select().where(model.name.in_(list(amounts)))
+            if model is DatabaseParameter:
+                query = query.where(model.database == group)
+            elif model is ActivityParameter:
+                query = query.where(model.group == group)
+            objects = list(query)
+            for obj in objects:
+                obj.amount = amounts[obj.name]
+            model.bulk_update(objects, fields=[model.amount])
+            stored.extend(objects)
+        return stored
+
+    @staticmethod
+    def signal_changed(stored: list) -> None:
+        """Emit the signals of the stored parameters, which `bulk_update`
+        bypasses, like the patched `save` does.
+        """
+        for param in stored:
+            [
+                qprm.emitLater("changed", param)
+                for qprm in qparameter_list
+                if qprm["key"] == param.key
+            ]
+        qparameters.emitLater("parameters_changed")
+
+    def store_exchanges(self, amounts: Dict[int, float]) -> set:
+        """Write the exchange amounts that changed, returns the databases of
+        the changed exchanges.
+        """
+        ids = list(amounts)
+        changed = []
+        for i in range(0, len(ids), QUERY_CHUNK):
+            chunk = ids[i : i + QUERY_CHUNK]
+            for exc in ExchangeDataset.select().where(ExchangeDataset.id.in_(chunk)):
+                if exc.data.get("amount") != amounts[exc.id]:
+                    exc.data["amount"] = amounts[exc.id]
+                    changed.append(exc)
+        if changed:
+            ExchangeDataset.bulk_update(
+                changed, fields=[ExchangeDataset.data], batch_size=QUERY_CHUNK
+            )
+        return {exc.output_database for exc in changed}
+
+
+recalculate_parameter = IncrementalRecalculation()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from activity_browser import log
+from activity_browser.mod import bw2data as bd
+
+from .lca_pool import method_state
+from .multilca import MLCA
+
+
+class ResultCache(object):
+    """On-disk cache of calculated `MLCA` results.
+
+    Results are stored per key in a directory inside the current project
+    directory, with every array as a separate .npy file. Cached results are
+    opened as memory-mapped arrays, so only the parts that are looked at are
+    actually read from disk.
+
+    The key combines the calculation setup, the state of all involved
+    databases and impact categories and the scenario data, so any change to
+    these results in a new calculation. When the total size of the cache
+    exceeds `max_size` the least recently used results are removed.
+
+    Every entry lists its arrays in a `MARKER` file, which is written last
+    and removed first. Entries without it are incomplete, for instance
+    because arrays that were still memory-mapped could not be removed, and
+    are not used.
+
+    Parameters
+    ----------
+    directory : Location of the cache, defaults to a folder in the project directory
+    max_size : Maximum size of the cache in bytes
+    """
+
+    VERSION = 3
+    DIRECTORY = "ab_result_cache"
+    MARKER = "arrays.json"
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 2 * 1024**3):
+        self.directory = directory or os.path.join(bd.projects.dir, self.DIRECTORY)
+        self.max_size = max_size
+
+    @staticmethod
+    def _scenario_state(df: Optional[pd.DataFrame]) -> Optional[str]:
+        if df is None:
+            return None
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        digest.update(str(list(df.columns)).encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def key(cls, mlca: MLCA, scenarios: Optional[pd.DataFrame] = None) -> str:
+        """Return the cache key of the given (not yet calculated) `MLCA`."""
+        state = {
+            "version": cls.VERSION,
+            "type": type(mlca).__name__,
+            "inv": [[(k, v) for k, v in fu.items()] for fu in mlca.func_units],
+            "ia": mlca.methods,
+            "tolerance": mlca.contribution_tolerance,
+            "databases": {
+                db: [
+                    bd.databases[db].get(f) for f in ("modified", "processed", "dirty")
+                ]
+                for db in sorted(mlca.all_databases)
+                if db in bd.databases
+            },
+            "methods": [method_state(method) for method in mlca.methods],
+            "scenarios": cls._scenario_state(scenarios),
+        }
+        dump = json.dumps(state, sort_keys=True, default=str)
+        return hashlib.sha256(dump.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the memory-mapped result arrays stored under `key`, or None."""
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            with open(os.path.join(path, self.MARKER)) as f:
+                names = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in names
+            }
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read cached results, recalculating: {e}")
+            self._remove(path)
+            return None
+        return arrays
+
+    def put(self, key: str, arrays: dict) -> None:
+        """Store the result arrays under `key` and evict old results if required."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+            with open(os.path.join(tmp, self.MARKER), "w") as f:
+                json.dump(list(arrays), f)
+            self._remove(self._path(key))
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            log.warning(f"Could not cache calculation results: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict(keep=key)
+
+    def _remove(self, path: str) -> None:
+        """Remove an entry, starting with its marker so a partially removed
+        entry is never read.
+        """
+        try:
+            os.remove(os.path.join(path, self.MARKER))
+        except OSError:
+            pass
+        shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _size(path: str) -> int:
+        return sum(
+            entry.stat().st_size for entry in os.scandir(path) if entry.is_file()
+        )
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used results until the cache fits in `max_size`."""
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        sizes = {entry.name: self._size(entry.path) for entry in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry.name == keep:
+                continue
+            self._remove(entry.path)
+            total -= sizes[entry.name]
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,177 @@
+"""
+Latin hypercube and quasi-random sampling of uncertainty distributions.
+
+Uniform points from a Latin hypercube or a scrambled Sobol' sequence are
+mapped through the inverse cumulative distribution functions (ppf) of the
+stats_arrays distributions. The samples cover the distributions more evenly
+than pseudo-random samples, so the Monte Carlo results converge with fewer
+iterations.
+"""
+import warnings
+from typing import Optional
+
+import numpy as np
+from scipy.stats import qmc
+from stats_arrays import NoUncertainty, UndefinedUncertainty
+from stats_arrays import uncertainty_choices as uc
+
+from activity_browser import log
+
+SAMPLERS = {
+    "random": "Pseudo-random",
+    "lhs": "Latin hypercube",
+    "sobol": "Sobol sequence",
+}
+
+# Maximum number of dimensions of the scipy Sobol' engine, further dimensions
+# are sampled with a Latin hypercube.
+SOBOL_DIMENSIONS = 21201
+
+
+class InverseCDF(object):
+    """Maps uniform points to samples of the distributions of a params array.
+
+    Every uncertain row of the params array is a dimension of the uniform
+    points. Distributions without a ppf in stats_arrays are sampled
+    pseudo-randomly instead.
+    """
+
+    def __init__(self, params: np.ndarray):
+        self.params = params
+        types = params["uncertainty_type"]
+        certain = np.isin(types, (UndefinedUncertainty.id, NoUncertainty.id))
+        self.certain = np.flatnonzero(certain)
+        self.uncertain = np.flatnonzero(~certain)
+        self.dimensions = len(self.uncertain)
+
+        # Positions of every distribution in the params array.
+        self.choices = {
+            choice: np.flatnonzero(types == choice.id)
+            for choice in uc.choices
+            if choice.id in types
+            and choice.id not in (UndefinedUncertainty.id, NoUncertainty.id)
+        }
+        self.bounds = {
+            choice: self._bounds(choice, params[rows])
+            for choice, rows in self.choices.items()
+        }
+        # Columns of the uniform points of every distribution.
+        column = np.full(len(params), -1)
+        column[self.uncertain] = np.arange(self.dimensions)
+        self.columns = {choice: column[rows] for choice, rows in self.choices.items()}
+
+    @staticmethod
+    def _bounds(choice, params: np.ndarray) -> Optional[tuple]:
+        """Return the cumulative densities of the minimum and maximum, so
+        bounded distributions are sampled within their bounds.
+        """
+        lower, upper = np.zeros(len(params)), np.ones(len(params))
+        try:
+            for bound, values in (
+                (lower, params["minimum"]),
+                (upper, params["maximum"]),
+            ):
+                mask = ~np.isnan(values)
+                if mask.any():
+                    bound[mask] = choice.cdf(params[mask], values[mask]).ravel()
+        except Exception:
+            # No (working) cdf, the samples are clipped instead.
+            return None
+        return lower, upper
+
+    def __call__(self, uniforms: np.ndarray, seed: Optional[int] = None) -> np.ndarray:
+        """Return (samples x params) values for (samples x dimensions) uniform
+        points in (0, 1).
+        """
+        size = len(uniforms)
+        values = np.empty((size, len(self.params)))
+        # Like the random generator, certain values are taken from `loc`.
+        values[:, self.certain] = self.params["loc"][self.certain]
+        random = np.random.RandomState(seed)
+        for choice, rows in self.choices.items():
+            params = self.params[rows]
+            percentages = uniforms[:, self.columns[choice]].T
+            bounds = self.bounds[choice]
+            if bounds is not None:
+                lower, upper = bounds
+                percentages = lower[:, None] + percentages * (upper - lower)[:, None]
+            try:
+                sampled = choice.ppf(params, percentages)
+            except (NotImplementedError, AttributeError):
+                log.debug(f"No inverse CDF for {choice.__name__}, sampling randomly")
+                sampled = choice.bounded_random_variables(params, size, random)
+            if bounds is None:
+                sampled = np.fmax(sampled, params["minimum"][:, None])
+                sampled = np.fmin(sampled, params["maximum"][:, None])
+            values[:, rows] = sampled.T
+        return values
+
+
+class UniformSampler(object):
+    """Uniform points in (0, 1) for blocks of Monte Carlo iterations.
+
+    Latin hypercubes are stratified per block, drawn from the random stream
+    of the block. Sobol' points are taken from a single scrambled sequence,
+    starting at the first iteration of the block, so a simulation covers the
+    first points of the sequence in whichever order the blocks are run.
+    """
+
+    def __init__(self, method: str, dimensions: int, seed: int):
+        if method not in ("lhs", "sobol"):
+            raise ValueError(f"Unknown sampling method: {method}")
+        self.method = method
+        self.dimensions = dimensions
+        self.seed = seed
+        self._sobol: Optional[qmc.Sobol] = None
+
+    def latin_hypercube(
+        self, size: int, dimensions: int, random: np.random.Generator
+    ) -> np.ndarray:
+        strata = np.argsort(random.random((size, dimensions)), axis=0)
+        return (strata + random.random((size, dimensions))) / size
+
+    def sobol(self, first: int, size: int) -> np.ndarray:
+        dimensions = min(self.dimensions, SOBOL_DIMENSIONS)
+        if self._sobol is None or self._sobol.num_generated > first:
+            self._sobol = qmc.Sobol(
+                dimensions, scramble=True, seed=np.random.default_rng(self.seed)
+            )
+        if first > self._sobol.num_generated:
+            self._sobol.fast_forward(first - self._sobol.num_generated)
+        with warnings.catch_warnings():
+            # Sobol' points are balanced for powers of 2, but not required to be.
+            warnings.simplefilter("ignore", UserWarning)
+            return self._sobol.random(size)
+
+    def sample(self, block: int, first: int, size: int) -> np.ndarray:
+        """Return (size x dimensions) uniform points for a block of iterations."""
+        random = np.random.default_rng(
+            np.random.SeedSequence(self.seed, spawn_key=(block, 1))
+        )
+        if self.method == "lhs":
+            points = self.latin_hypercube(size, self.dimensions, random)
+        else:
+            points = self.sobol(first, size)
+            if self.dimensions > SOBOL_DIMENSIONS:
+                padding = self.latin_hypercube(
+                    size, self.dimensions - SOBOL_DIMENSIONS, random
+                )
+                points = np.hstack([points, padding])
+        # The ppf of unbounded distributions is infinite at 0 and 1.
+        eps = np.finfo(float).eps
+        return np.clip(points, eps, 1 - eps)
+
+
+class SampledValues(object):
+    """Returns precalculated samples one by one, in place of the `next`
+    method of a `MCRandomNumberGenerator`.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.index = 0
+
+    def next(self) -> np.ndarray:
+        values = self.values[self.index]
+        self.index += 1
+        return values
@@ -5,34 +5,45 @@
 # Moment-Independent measure based on Monte Carlo simulation LCA results.
 # see: https://salib.readthedocs.io/en/latest/api.html#delta-moment-independent-measure
 # =============================================================================
+import multiprocessing
 import os
 import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from time import time
+from typing import Callable, Optional
 
 import bw2calc as bc
 import numpy as np
 import pandas as pd
 from SALib.analyze import delta
+from scipy import sparse
+from scipy.stats import rankdata
 
 from activity_browser import log
 from activity_browser.mod import bw2data as bd
+from activity_browser.mod.bw2data.backends import Exchange, ExchangeDataset
 
 from ..settings import ab_settings
+from .errors import NoUncertainInputsError
+from .lca_pool import characterization_cache, lca_pool
+from .metadata import AB_metadata
 from .montecarlo import MonteCarloLCA, perform_MonteCarlo_LCA
+from .utils import QUERY_CHUNK
 
-try:
-    # attempt bw25 import
-    from bw2calc.graph_traversal import AssumedDiagonalGraphTraversal as GraphTraversal
-except ImportError:
-    # standard import on failure
-    from bw2calc import GraphTraversal
+# Metadata of the elementary flows included for characterization factors.
+CF_FIELDS = ["name", "categories", "unit", "type", "database", "code", "CAS number"]
 
 
 def get_lca(fu, method):
     """Calculates a non-stochastic LCA and returns a the LCA object."""
     lca = bc.LCA(fu, method=method)
-    lca.lci()
-    lca.lcia()
+    lca_pool.load_lci_data(lca)
+    lca.build_demand_array()
+    lca_pool.decompose_technosphere(lca)
+    lca.lci_calculation()
+    characterization_cache.switch_method(lca, method)
+    lca.lcia_calculation()
     log.info("Non-stochastic LCA score:", lca.score)
 
     # add reverse dictionaries
@@ -45,54 +56,100 @@ def get_lca(fu, method):
     return lca
 
 
-def filter_technosphere_exchanges(fu, method, cutoff=0.05, max_calc=1e4):
-    """Use brightway's GraphTraversal to identify the relevant
-    technosphere exchanges in a non-stochastic LCA."""
-    start = time()
-    res = GraphTraversal().calculate(fu, method, cutoff=cutoff, max_calc=max_calc)
+def sensitivity_coefficients(lca):
+    """Return the first-order sensitivity of the score of a non-stochastic LCA
+    to every technosphere and biosphere exchange.
 
-    # get all edges
-    technosphere_exchange_indices = []
-    for e in res["edges"]:
-        if e["to"] != -1:  # filter out head introduced in graph traversal
-            technosphere_exchange_indices.append((e["from"], e["to"]))
-    log.info(
-        "TECHNOSPHERE {} filtering resulted in {} of {} exchanges and took {} iterations in {} seconds.".format(
-            res["lca"].technosphere_matrix.shape,
-            len(technosphere_exchange_indices),
-            res["lca"].technosphere_matrix.getnnz(),
-            res["counter"],
-            np.round(time() - start, 2),
-        )
+    The coefficients are the change of the score relative to the score for a
+    relative change of the exchange amount, as sparse matrices in the shape of
+    the technosphere and biosphere matrices. The technosphere coefficients
+    take a single solve of the transposed technosphere matrix.
+    """
+    weights = lca.biosphere_matrix.T @ lca.characterization_matrix.diagonal()
+    adjoint = lca_pool.adjoint_solver(lca)(np.asarray(weights).ravel())
+    supply = lca.supply_array
+
+    technosphere = lca.technosphere_matrix.tocoo()
+    technosphere.sum_duplicates()
+    technosphere.data = (
+        -adjoint[technosphere.row] * technosphere.data * supply[technosphere.col]
     )
-    return technosphere_exchange_indices
+    biosphere = sparse.coo_matrix(lca.characterized_inventory)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        technosphere.data /= lca.score
+        biosphere = biosphere / lca.score
+    return technosphere.tocsr(), sparse.csr_matrix(biosphere)
 
 
-def filter_biosphere_exchanges(lca, cutoff=0.005):
-    """Reduce biosphere exchanges to those that matter for a given impact
-    category in a non-stochastic LCA."""
-    start = time()
+def screen_exchanges(lca, cutoff_technosphere=0.01, cutoff_biosphere=0.01):
+    """Identify the relevant technosphere and biosphere exchanges in a
+    non-stochastic LCA by their first-order sensitivity coefficients.
 
-    inv = lca.characterized_inventory
-    finv = inv.multiply(abs(inv) > abs(lca.score / (1 / cutoff)))
-    biosphere_exchange_indices = list(zip(*finv.nonzero()))
-    explained_fraction = finv.sum() / lca.score
-    log.info(
-        "BIOSPHERE {} filtering resulted in {} of {} exchanges ({}% of total impact) and took {} seconds.".format(
-            inv.shape,
-            finv.nnz,
-            inv.nnz,
-            np.round(explained_fraction * 100, 2),
-            np.round(time() - start, 2),
+    Returns the (row, column) indices of all exchanges whose coefficient is
+    at least the cutoff in absolute value.
+    """
+    start = time()
+    technosphere, biosphere = sensitivity_coefficients(lca)
+    indices = []
+    for name, matrix, cutoff in (
+        ("TECHNOSPHERE", technosphere, cutoff_technosphere),
+        ("BIOSPHERE", biosphere, cutoff_biosphere),
+    ):
+        matrix = matrix.tocoo()
+        relevant = np.abs(np.nan_to_num(matrix.data)) >= cutoff
+        indices.append(
+            list(zip(matrix.row[relevant].tolist(), matrix.col[relevant].tolist()))
         )
-    )
-    return biosphere_exchange_indices
+        log.info(
+            "{} {} screening resulted in {} of {} exchanges.".format(
+                name, matrix.shape, relevant.sum(), matrix.nnz
+            )
+        )
+    log.info("Screening took {} seconds.".format(np.round(time() - start, 2)))
+    return indices[0], indices[1]
+
+
+def load_exchanges(pairs):
+    """Return the exchanges between (input key, output key) pairs as a
+    {pair: [exchanges]} dictionary.
+
+    The exchanges of all output activities are queried in a few chunks,
+    instead of loading both activities and their exchanges for every pair.
+    """
+    wanted = set(pairs)
+    outputs = defaultdict(set)
+    for _, (database, code) in wanted:
+        outputs[database].add(code)
+
+    found = defaultdict(list)
+    for database, codes in outputs.items():
+        codes = sorted(codes)
+        for i in range(0, len(codes), QUERY_CHUNK):
+            query = (
+                ExchangeDataset.select()
+                .where(
+                    (ExchangeDataset.output_database == database)
+                    & ExchangeDataset.output_code.in_(codes[i : i + QUERY_CHUNK])
+                )
+                .order_by(ExchangeDataset.id)
+            )
+            for doc in query:
+                pair = (
+                    (doc.input_database, doc.input_code),
+                    (doc.output_database, doc.output_code),
+                )
+                if pair in wanted:
+                    found[pair].append(Exchange(doc))
+    return found
 
 
 def get_exchanges(lca, indices, biosphere=False, only_uncertain=True):
     """Get actual exchange objects from indices.
     By default get only exchanges that have uncertainties.
 
+    If there are multiple exchanges between two activities, the first
+    exchange with uncertainties is used.
+
     Returns
     -------
     exchanges : list
@@ -100,28 +157,23 @@ def get_exchanges(lca, indices, biosphere=False, only_uncertain=True):
     indices : list of tuples
         List of indices
     """
+    inputs = lca.biosphere_dict_rev if biosphere else lca.activity_dict_rev
+    pairs = [(inputs[i], lca.activity_dict_rev[j]) for i, j in indices]
+    found = load_exchanges(pairs)
+
     exchanges = list()
-    for i in indices:
-        if biosphere:
-            from_act = bd.get_activity(lca.biosphere_dict_rev[i[0]])
-        else:  # technosphere
-            from_act = bd.get_activity(lca.activity_dict_rev[i[0]])
-        to_act = bd.get_activity(lca.activity_dict_rev[i[1]])
-
-        for exc in to_act.exchanges():
-            if exc.input == from_act.key:
-                exchanges.append(exc)
-                # continue  # if there was always only one max exchange between two activities
-
-    # in theory there should be as many exchanges as indices, but since
-    # multiple exchanges are possible between two activities, the number of
-    # exchanges must be at least equal or higher to the number of indices
-    if len(exchanges) < len(
-        indices
-    ):  # must have at least as many exchanges as indices (assu)
+    missing = 0
+    for pair in pairs:
+        matches = found.get(pair)
+        if not matches:
+            missing += 1
+            continue
+        uncertain = [exc for exc in matches if (exc.get("uncertainty type") or 0) >= 1]
+        exchanges.append((uncertain or matches)[0])
+    if missing:
         raise ValueError(
-            "Error: mismatch between indices provided ({}) and Exchanges received ({}).".format(
-                len(indices), len(exchanges)
+            "Error: no exchanges found for {} of the {} indices provided.".format(
+                missing, len(indices)
             )
         )
 
@@ -132,6 +184,16 @@ def get_exchanges(lca, indices, biosphere=False, only_uncertain=True):
     return exchanges, indices
 
 
+def get_activity_labels(keys, fields):
+    """Return the metadata fields of activities and elementary flows as a
+    {key: {field: value}} dictionary."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    AB_metadata.add_metadata({key[0] for key in keys})
+    return AB_metadata.get_metadata(keys, fields).to_dict("index")
+
+
 def drop_no_uncertainty_exchanges(excs, indices):
     excs_no = list()
     indices_no = list()
@@ -149,10 +211,14 @@ def drop_no_uncertainty_exchanges(excs, indices):
 
 def get_exchanges_dataframe(exchanges, indices, biosphere=False):
     """Returns a Dataframe from the exchange data and a bit of additional information."""
+    labels = get_activity_labels(
+        [exc["input"] for exc in exchanges] + [exc["output"] for exc in exchanges],
+        ["name", "location", "reference product"],
+    )
 
     for exc, i in zip(exchanges, indices):
-        from_act = bd.get_activity(exc.get("input"))
-        to_act = bd.get_activity(exc.get("output"))
+        from_act = labels[exc["input"]]
+        to_act = labels[exc["output"]]
 
         exc.update(
             {
@@ -197,13 +263,20 @@ def get_CF_dataframe(lca, only_uncertain_CFs=True):
     """Returns a dataframe with the metadata for the characterization factors
     (in the biosphere matrix). Filters non-stochastic CFs if desired (default)."""
     data = dict()
+    uncertain = lca.cf_params["uncertainty_type"] > 1
+    rows = (
+        lca.cf_params["row"][uncertain] if only_uncertain_CFs else lca.cf_params["row"]
+    )
+    flows = get_activity_labels(
+        [lca.biosphere_dict_rev[row] for row in rows], CF_FIELDS
+    )
     for params_index, row in enumerate(lca.cf_params):
         if only_uncertain_CFs and row["uncertainty_type"] <= 1:
             continue
         cf_index = row["row"]
-        bio_act = bd.get_activity(lca.biosphere_dict_rev[cf_index])
+        bio_act = flows[lca.biosphere_dict_rev[cf_index]]
 
-        data.update({params_index: bio_act.as_dict()})
+        data.update({params_index: dict(bio_act)})
 
         for name in row.dtype.names:
             data[params_index][name] = row[name]
@@ -236,19 +309,39 @@ def get_parameters_DF(mc):
         return pd.DataFrame()  # return emtpy df
 
 
-def get_exchange_values(matrix, indices):
-    """Get technosphere exchanges values from a list of exchanges
-    (row and column information)"""
-    return [matrix[i] for i in indices]
+def get_exchange_map(params, indices, technosphere=True):
+    """Map the sampled `params` vectors to matrix values for a list of
+    exchanges (row and column information).
+
+    Returns a sparse (params x exchanges) matrix, the matrix values are the
+    product of the sampled vectors with this map. Technosphere inputs are
+    negated in the technosphere matrix, as done by bw2calc.
+    """
+    rows = params["row"].astype(np.int64)
+    cols = params["col"].astype(np.int64)
+    width = int(max(cols.max(initial=0), max((c for _, c in indices), default=0))) + 1
+    param_keys = rows * width + cols
+    index_keys = np.array([r * width + c for r, c in indices], dtype=np.int64)
+
+    order = np.argsort(index_keys)
+    position = np.searchsorted(index_keys, param_keys, sorter=order)
+    position = order[np.clip(position, 0, len(index_keys) - 1)]
+    match = index_keys[position] == param_keys
+
+    signs = np.ones(len(params))
+    if technosphere:
+        signs[params["type"] == 1] = -1
+    return sparse.csr_matrix(
+        (signs[match], (np.flatnonzero(match), position[match])),
+        shape=(len(params), len(indices)),
+    )
 
 
-def get_X(matrix_list, indices):
+def get_X(samples, params, indices, technosphere=True):
     """Get the input data to the GSA, i.e. A and B matrix values for each
-    model run."""
-    X = np.zeros((len(matrix_list), len(indices)))
-    for row, M in enumerate(matrix_list):
-        X[row, :] = get_exchange_values(M, indices)
-    return X
+    model run, from the (iterations x params) array of sampled values."""
+    exchange_map = get_exchange_map(params, indices, technosphere)
+    return np.asarray(exchange_map.T.dot(samples.T).T, dtype=np.float64)
 
 
 def get_X_CF(mc, dfcf, method):
@@ -256,7 +349,7 @@ def get_X_CF(mc, dfcf, method):
     that are in the dfcf dataframe will be returned (i.e. by default only the
     CFs that have uncertainties."""
     # get all CF inputs
-    CF_data = np.array(mc.CF_dict[method])  # has the same shape as the Xa and Xb below
+    CF_data = mc.cf_samples[method]  # has the same shape as the Xa and Xb below
 
     # reduce this to uncertain CFs only (if this was done for the dfcf)
     params_indices = dfcf.index.values
@@ -279,6 +372,148 @@ def get_problem(X, names):
     }
 
 
+def transform_scores(Y):
+    """Log-transform the Monte Carlo LCA scores if they all have the same sign.
+
+    This makes the GSA more robust for very uneven distributions of LCA
+    results (e.g. toxicity related impacts). It cannot be applied when the
+    LCA scores overlap zero (sometimes positive and sometimes negative).
+    """
+    if np.all(Y > 0):  # all positive numbers
+        log.info("All positive LCA scores. Log-transformation performed.")
+        return np.log(np.abs(Y))
+    elif np.all(Y < 0):  # all negative numbers
+        log.info("All negative LCA scores. Log-transformation performed.")
+        return -np.log(np.abs(Y))
+    log.warning("Log-transformation cannot be applied as LCA scores overlap zero.")
+    return Y
+
+
+def rank_screening(X, Y):
+    """Return the Spearman rank correlation coefficient and the standardized
+    rank regression coefficient (SRRC) of every column of X with Y.
+
+    Both are calculated for all columns at once, as a cheap screening before
+    the delta analysis. The SRRC are only defined with fewer columns than
+    samples, they are NaN otherwise. Constant columns have coefficients of 0.
+    """
+    n = len(X)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ranks = rankdata(X, axis=0)
+        ranks = np.nan_to_num((ranks - ranks.mean(axis=0)) / ranks.std(axis=0))
+        y = rankdata(Y)
+        y = np.nan_to_num((y - y.mean()) / y.std())
+    spearman = ranks.T @ y / n
+    srrc = np.full(X.shape[1], np.nan)
+    if X.shape[1] < n:
+        srrc = np.linalg.lstsq(ranks, y, rcond=None)[0]
+    return spearman, srrc
+
+
+def select_inputs(scores, max_inputs=None, threshold=None):
+    """Return the positions of the inputs with the highest absolute screening
+    scores: at most `max_inputs` inputs, and only those with a score of at
+    least `threshold`. Raises a ValueError if no input is selected.
+    """
+    scores = np.abs(scores)
+    selected = np.argsort(-scores, kind="stable")
+    if threshold:
+        selected = selected[scores[selected] >= threshold]
+    if max_inputs:
+        selected = selected[:max_inputs]
+    if not len(selected):
+        raise ValueError(
+            "No inputs have a rank correlation of at least {}.".format(threshold)
+        )
+    return np.sort(selected)
+
+
+def delta_analysis(X, Y, names, max_inputs=None, threshold=None):
+    """Screen the inputs by their Spearman rank correlation with Y and
+    perform the delta analysis for the selected inputs.
+
+    Returns the results for all inputs, the delta analysis results of inputs
+    that were not selected are NaN.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    spearman, srrc = rank_screening(X, Y)
+    selected = select_inputs(spearman, max_inputs, threshold)
+    if len(selected) < len(names):
+        log.info(
+            "Rank correlation screening selected {} of {} inputs.".format(
+                len(selected), len(names)
+            )
+        )
+    X = X[:, selected]
+    Si = delta.analyze(
+        get_problem(X, [names[i] for i in selected]), X, Y, print_to_console=False
+    )
+    results = {"names": list(names)}
+    for key, values in Si.items():
+        if key != "names":
+            results[key] = np.full(len(names), np.nan)
+            results[key][selected] = values
+    results["Spearman"] = spearman
+    results["SRRC"] = srrc
+    return results
+
+
+# The shared GSA input data of a worker process, see `run_delta_analyses`.
+_worker_X: Optional[np.ndarray] = None
+
+
+def _init_worker(X):
+    global _worker_X
+    _worker_X = X
+
+
+def _delta_analysis(names, X_extra, Y, max_inputs=None, threshold=None):
+    """Delta analysis of the shared input data of the worker, extended with
+    the columns in `X_extra`."""
+    X = np.concatenate([_worker_X, X_extra], axis=1)
+    return delta_analysis(X, Y, names, max_inputs, threshold)
+
+
+def run_delta_analyses(
+    X, tasks, workers=1, progress=None, max_inputs=None, threshold=None
+):
+    """Run a delta analysis for each of the `tasks`, a {key: (names, X_extra,
+    Y)} dictionary, which all share the input data `X`. The inputs are
+    screened first, see `delta_analysis`.
+
+    With `workers` > 1 the analyses are run in a process pool that receives
+    the shared input data only once per process. Yields (key, results) in
+    order of completion.
+    """
+    progress = progress or (lambda current, total: None)
+    if workers <= 1 or len(tasks) <= 1:
+        _init_worker(X)
+        for done, (key, task) in enumerate(tasks.items(), 1):
+            yield key, _delta_analysis(*task, max_inputs, threshold)
+            progress(done, len(tasks))
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(X,),
+    )
+    futures = {}
+    try:
+        futures = {
+            executor.submit(_delta_analysis, *task, max_inputs, threshold): key
+            for key, task in tasks.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            yield futures[future], future.result()
+            progress(done, len(tasks))
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
 class GlobalSensitivityAnalysis(object):
     """Class for Global Sensitivity Analysis.
     For now Delta Moment Independent Measure based on:
@@ -292,6 +527,7 @@ class GlobalSensitivityAnalysis(object):
         self.method_number = int()
         self.cutoff_technosphere = float()
         self.cutoff_biosphere = float()
+        self.batch = False
 
     def update_mc(self, mc):
         "Update the Monte Carlo Simulation object (and results)."
@@ -311,12 +547,20 @@ class GlobalSensitivityAnalysis(object):
         method_number=0,
         cutoff_technosphere=0.01,
         cutoff_biosphere=0.01,
+        max_inputs=None,
+        screening_threshold=None,
     ):
-        """Perform GSA for specific reference flow and impact category."""
+        """Perform GSA for specific reference flow and impact category.
+
+        Only the `max_inputs` inputs with the highest Spearman rank
+        correlation with the scores, and with a correlation of at least
+        `screening_threshold`, are included in the delta analysis.
+        """
         start = time()
 
         # set FU and method
         try:
+            self.batch = False
             self.act_number = act_number
             self.method_number = method_number
             self.cutoff_technosphere = cutoff_technosphere
@@ -349,12 +593,13 @@ class GlobalSensitivityAnalysis(object):
         # =============================================================================
         #   Filter exchanges and get metadata DataFrames
         # =============================================================================
+        t_indices, b_indices = screen_exchanges(
+            self.lca, cutoff_technosphere, cutoff_biosphere
+        )
         dfs = []
         # technosphere
         if self.mc.include_technosphere:
-            self.t_indices = filter_technosphere_exchanges(
-                self.fu, self.method, cutoff=cutoff_technosphere, max_calc=1e4
-            )
+            self.t_indices = t_indices
             self.t_exchanges, self.t_indices = get_exchanges(self.lca, self.t_indices)
             self.dft = get_exchanges_dataframe(self.t_exchanges, self.t_indices)
             if not self.dft.empty:
@@ -362,9 +607,7 @@ class GlobalSensitivityAnalysis(object):
 
         # biosphere
         if self.mc.include_biosphere:
-            self.b_indices = filter_biosphere_exchanges(
-                self.lca, cutoff=cutoff_biosphere
-            )
+            self.b_indices = b_indices
             self.b_exchanges, self.b_indices = get_exchanges(
                 self.lca, self.b_indices, biosphere=True
             )
@@ -389,6 +632,10 @@ class GlobalSensitivityAnalysis(object):
             dfs.append(self.dfp)
 
         # Join dataframes to get metadata
+        if not dfs:
+            raise NoUncertainInputsError(
+                "No uncertain inputs for {} / {}.".format(self.activity, self.method)
+            )
         self.metadata = pd.concat(dfs, axis=0, ignore_index=True, sort=False)
         self.metadata.set_index("GSA name", inplace=True)
 
@@ -399,10 +646,17 @@ class GlobalSensitivityAnalysis(object):
         # Get X (Technosphere, Biosphere and CF values)
         X_list = list()
         if self.mc.include_technosphere and self.t_indices:
-            self.Xa = get_X(self.mc.A_matrices, self.t_indices)
+            self.Xa = get_X(
+                self.mc.technosphere_samples, self.mc.lca.tech_params, self.t_indices
+            )
             X_list.append(self.Xa)
         if self.mc.include_biosphere and self.b_indices:
-            self.Xb = get_X(self.mc.B_matrices, self.b_indices)
+            self.Xb = get_X(
+                self.mc.biosphere_samples,
+                self.mc.lca.bio_params,
+                self.b_indices,
+                technosphere=False,
+            )
             X_list.append(self.Xb)
         if self.mc.include_cfs and not self.dfcf.empty:
             self.Xc = get_X_CF(self.mc, self.dfcf, self.method)
@@ -419,21 +673,7 @@ class GlobalSensitivityAnalysis(object):
             self.method
         ].to_numpy()
 
-        # log-transformation. This makes it more robust for very uneven distributions of LCA results (e.g. toxicity related impacts).
-        # Can only be applied if all Monte-Carlo LCA scores are either positive or negative.
-        # Should not be used when LCA scores overlap zero (sometimes positive and sometimes negative)
-        # if np.all(self.Y > 0) if self.Y[0] > 0 else np.all(self.Y < 0):  # check if all LCA scores are of the same sign
-        #     self.Y = np.log(np.abs(self.Y))  # this makes it more robust for very uneven distributions of LCA results
-        if np.all(self.Y > 0):  # all positive numbers
-            self.Y = np.log(np.abs(self.Y))
-            log.info("All positive LCA scores. Log-transformation performed.")
-        elif np.all(self.Y < 0):  # all negative numbers
-            self.Y = -np.log(np.abs(self.Y))
-            log.info("All negative LCA scores. Log-transformation performed.")
-        else:  # mixed positive and negative numbers
-            log.warning(
-                "Log-transformation cannot be applied as LCA scores overlap zero."
-            )
+        self.Y = transform_scores(self.Y)
 
         # print('Filtering took {} seconds'.format(np.round(time() - start, 2)))
 
@@ -444,7 +684,9 @@ class GlobalSensitivityAnalysis(object):
 
         # perform delta analysis
         time_delta = time()
-        self.Si = delta.analyze(self.problem, self.X, self.Y, print_to_console=False)
+        self.Si = delta_analysis(
+            self.X, self.Y, self.names, max_inputs, screening_threshold
+        )
         log.info(
             "Delta analysis took {} seconds".format(
                 np.round(time() - time_delta, 2),
@@ -464,7 +706,161 @@ class GlobalSensitivityAnalysis(object):
 
         log.info("GSA took {} seconds".format(np.round(time() - start, 2)))
 
+    def perform_batch_GSA(
+        self,
+        cutoff_technosphere=0.01,
+        cutoff_biosphere=0.01,
+        workers: int = 1,
+        progress: Optional[Callable] = None,
+        max_inputs=None,
+        screening_threshold=None,
+    ):
+        """Perform GSA for every reference flow and impact category of the
+        calculation setup.
+
+        The exchanges that are relevant for any of the combinations are
+        included in all analyses, so the input data of the technosphere,
+        biosphere and parameters is assembled once from the Monte Carlo
+        samples. The inputs are screened per combination like in
+        `perform_GSA`. The delta analyses are run in `workers` processes and
+        the results are stored in `df_final` in long format.
+        """
+        start = time()
+        progress = progress or (lambda current, total: None)
+        self.batch = True
+        self.cutoff_technosphere = cutoff_technosphere
+        self.cutoff_biosphere = cutoff_biosphere
+        methods = self.mc.methods
+
+        # Screen all combinations on a single LCA with the indices of the
+        # Monte Carlo LCA.
+        self.lca = get_lca(self.mc.func_units_dict, methods[0])
+        t_indices, b_indices = set(), set()
+        for fu in self.mc.func_units:
+            self.lca.redo_lci(fu)
+            for method in methods:
+                characterization_cache.switch_method(self.lca, method)
+                self.lca.lcia_calculation()
+                t, b = screen_exchanges(self.lca, cutoff_technosphere, cutoff_biosphere)
+                t_indices.update(t)
+                b_indices.update(b)
+
+        dfs, X_list = [], []
+        if self.mc.include_technosphere and t_indices:
+            self.t_exchanges, self.t_indices = get_exchanges(
+                self.lca, sorted(t_indices)
+            )
+            self.dft = get_exchanges_dataframe(self.t_exchanges, self.t_indices)
+            if self.t_indices:
+                dfs.append(self.dft)
+                X_list.append(
+                    get_X(
+                        self.mc.technosphere_samples,
+                        self.mc.lca.tech_params,
+                        self.t_indices,
+                    )
+                )
+        if self.mc.include_biosphere and b_indices:
+            self.b_exchanges, self.b_indices = get_exchanges(
+                self.lca, sorted(b_indices), biosphere=True
+            )
+            self.dfb = get_exchanges_dataframe(
+                self.b_exchanges, self.b_indices, biosphere=True
+            )
+            if self.b_indices:
+                dfs.append(self.dfb)
+                X_list.append(
+                    get_X(
+                        self.mc.biosphere_samples,
+                        self.mc.lca.bio_params,
+                        self.b_indices,
+                        technosphere=False,
+                    )
+                )
+        self.dfp = get_parameters_DF(self.mc)
+        if self.mc.include_parameters and not self.dfp.empty:
+            dfs.append(self.dfp)
+            X_list.append(np.asarray(get_X_P(self.dfp), dtype=np.float64))
+        X_shared = (
+            np.concatenate(X_list, axis=1)
+            if X_list
+            else np.zeros((len(self.mc.results), 0))
+        )
+
+        # Characterization factors differ per impact category.
+        cfs = {}
+        for method in methods:
+            characterization_cache.switch_method(self.lca, method)
+            dfcf = pd.DataFrame()
+            if self.mc.include_cfs:
+                dfcf = get_CF_dataframe(self.lca, only_uncertain_CFs=True)
+            X_cf = (
+                get_X_CF(self.mc, dfcf, method)
+                if not dfcf.empty
+                else np.zeros((len(X_shared), 0))
+            )
+            cfs[method] = (dfcf, np.asarray(X_cf, dtype=np.float64))
+
+        shared = (
+            pd.concat(dfs, axis=0, ignore_index=True, sort=False)
+            if dfs
+            else pd.DataFrame(columns=["GSA name"])
+        )
+        tasks = {}
+        for act_number, act_key in self.mc.rev_activity_index.items():
+            for method_number, method in enumerate(methods):
+                metadata = pd.concat(
+                    [shared, cfs[method][0]], axis=0, ignore_index=True, sort=False
+                )
+                if metadata.empty:
+                    raise NoUncertainInputsError(
+                        "No uncertain inputs for {} / {}.".format(
+                            bd.get_activity(act_key), method
+                        )
+                    )
+                names = metadata["GSA name"]
+                Y = transform_scores(
+                    np.asarray(self.mc.results[:, act_number, method_number])
+                )
+                tasks[(act_key, method)] = (list(names), cfs[method][1], Y, metadata)
+
+        results = {}
+        for (act_key, method), Si in run_delta_analyses(
+            X_shared,
+            {k: v[:3] for k, v in tasks.items()},
+            workers,
+            progress,
+            max_inputs,
+            screening_threshold,
+        ):
+            names, _, _, metadata = tasks[(act_key, method)]
+            df = pd.DataFrame(Si, index=names).sort_values(by="delta", ascending=False)
+            df.index.names = ["GSA name"]
+            df = df.join(metadata.set_index("GSA name"), on="GSA name")
+            df.reset_index(inplace=True)
+            df.insert(0, "Impact category", str(method))
+            df.insert(0, "Reference flow", self.mc.get_labels([act_key])[0])
+            results[(act_key, method)] = df
+
+        self.df_final = pd.concat(
+            [results[k] for k in tasks], ignore_index=True, sort=False
+        )
+        if "pedigree" in self.df_final:
+            self.df_final["pedigree"] = [str(x) for x in self.df_final["pedigree"]]
+        self.X = np.concatenate([X_shared] + [cf[1] for cf in cfs.values()], axis=1)
+        self.metadata = pd.concat(
+            [shared] + [cf[0] for cf in cfs.values()], ignore_index=True, sort=False
+        ).set_index("GSA name")
+        log.info(
+            "GSA of {} combinations took {} seconds".format(
+                len(tasks), np.round(time() - start, 2)
+            )
+        )
+
     def get_save_name(self):
+        if self.batch:
+            save_name = self.mc.cs_name + "_" + str(self.mc.iterations) + "_all.xlsx"
+            return save_name.replace(",", "").replace("'", "").replace("/", "")
         save_name = (
             self.mc.cs_name
             + "_"
@@ -1,27 +1,92 @@
 # -*- coding: utf-8 -*-
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Optional
 
 import numpy as np
 import pandas as pd
-from PySide2.QtWidgets import QPushButton
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
 
+from activity_browser import log
 from activity_browser.mod import bw2data as bd
 
 from ..commontasks import format_activity_label
 from ..errors import ScenarioExchangeNotFoundError
-from ..multilca import MLCA, Contributions
+from ..lca_pool import lca_pool
+from ..multilca import (
+    MLCA,
+    ContributionMatrix,
+    Contributions,
+    ContributionStore,
+    solve_columns,
+)
 from ..utils import Index
 from .dataframe import (
     arrays_from_indexed_superstructure,
     filter_databases_indexed_superstructure,
     scenario_names_from_df,
 )
-from .file_dialogs import ABPopup
 
-try:
-    from bw2calc.matrices import TechnosphereBiosphereMatrixBuilder as MB
-except ModuleNotFoundError:
-    pass  # removed in bw25
+
+def data_positions(matrix, rows: np.ndarray, cols: np.ndarray):
+    """Return the CSR matrix and the positions of the given entries in its
+    `data` array.
+
+    Entries that are not yet part of the matrix are added as explicit zeros,
+    in which case a new matrix is returned.
+    """
+    matrix.sum_duplicates()
+    width = matrix.shape[1]
+    rows, cols = rows.astype(np.int64), cols.astype(np.int64)
+    keys = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr))
+    keys = keys * width + matrix.indices
+    wanted = rows * width + cols
+    positions = np.searchsorted(keys, wanted)
+    missing = np.ones(len(wanted), dtype=bool)
+    if len(keys):
+        missing = keys[np.minimum(positions, len(keys) - 1)] != wanted
+    if missing.any():
+        coo = matrix.tocoo()
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate([coo.data, np.zeros(missing.sum())]),
+                (
+                    np.concatenate([coo.row, rows[missing]]),
+                    np.concatenate([coo.col, cols[missing]]),
+                ),
+            ),
+            shape=matrix.shape,
+        )
+        return data_positions(matrix, rows, cols)
+    return matrix, positions
+
+
+class LowRankSolver(object):
+    """Solver for a technosphere matrix that differs from a factorized base
+    matrix in a few columns.
+
+    The matrix is the base matrix plus `difference`, which only has values
+    in `columns`. Using the Sherman-Morrison-Woodbury formula, every solve
+    takes a solve with the base factorization and a small dense solve. Setting
+    up the solver takes one base solve per changed column.
+    """
+
+    def __init__(
+        self, base_solver: Callable, difference: sparse.spmatrix, columns: np.ndarray
+    ):
+        self.base_solver = base_solver
+        self.columns = columns
+        # Base solution for every changed column, (technosphere, columns)
+        self.updates = solve_columns(
+            base_solver, np.asarray(difference[:, columns].todense())
+        )
+        capacitance = np.eye(len(columns)) + self.updates[columns]
+        self.capacitance = lu_factor(capacitance)
+
+    def __call__(self, demand: np.ndarray) -> np.ndarray:
+        supply = solve_columns(self.base_solver, np.atleast_2d(demand.T).T)
+        correction = lu_solve(self.capacitance, supply[self.columns])
+        supply = supply - self.updates @ correction
+        return supply.reshape(demand.shape)
 
 
 class SuperstructureMLCA(MLCA):
@@ -35,6 +100,15 @@ class SuperstructureMLCA(MLCA):
         "production": "technosphere_matrix",
     }
 
+    # Scenarios that change at most `low_rank_threshold` technosphere columns
+    # are solved as a low-rank update of the factorization of the default
+    # technosphere matrix, unless the relative residual of the solution
+    # exceeds `low_rank_tolerance`. Set `scenario_solver` to "direct" to
+    # factorize the technosphere matrix of every scenario.
+    scenario_solver = "low_rank"
+    low_rank_threshold = 250
+    low_rank_tolerance = 1e-8
+
     def __init__(self, cs_name: str, df: pd.DataFrame):
         assert isinstance(df, pd.DataFrame), (
             "Check if you have provided at least 1 reference flow, 1 impact category "
@@ -47,17 +121,6 @@ class SuperstructureMLCA(MLCA):
 
         super().__init__(cs_name)
 
-        # Scenarios overwrite the lca.xxx_matrix. For supporting absent values
-        # in scenario files defaults are required, to prevent these from being
-        # overwritten duplicates are required...
-        self.default_technosphere_matrix = self.lca.technosphere_matrix.copy()
-        self.default_biosphere_matrix = self.lca.biosphere_matrix.copy()
-        self.defaults = {
-            "technosphere": "default_technosphere_matrix",
-            "production": "default_technosphere_matrix",
-            "biosphere": "default_biosphere_matrix",
-        }
-
         # Filter dataframe for keys that do not occur in the LCA matrix.
         df = filter_databases_indexed_superstructure(df, self.all_databases)
         assert not df.empty, "Filtering unused flows removed all of the scenario data."
@@ -80,30 +143,27 @@ class SuperstructureMLCA(MLCA):
             ],
         )
         self.indices_to_matrix()
+        self.prepare_scenario_slots()
 
         # Construct an index dictionary similar to fu_index and method_index
         self._current_index = 0
+        # The scenario of which the values are in the matrices.
+        self._applied_index: Optional[int] = None
         self.scenario_index = {k: i for i, k in enumerate(self.scenario_names)}
 
         # Rebuild numpy arrays with scenario dimension included.
         self.lca_scores = np.zeros(
             (len(self.func_units), len(self.methods), self.total)
         )
-        self.elementary_flow_contributions = np.zeros(
-            (
-                len(self.func_units),
-                len(self.methods),
-                self.total,
-                self.lca.biosphere_matrix.shape[0],
-            )
+        self.elementary_flow_contributions = ContributionStore(
+            (len(self.func_units), len(self.methods), self.total),
+            self.lca.biosphere_matrix.shape[0],
+            self.contribution_tolerance,
         )
-        self.process_contributions = np.zeros(
-            (
-                len(self.func_units),
-                len(self.methods),
-                self.total,
-                self.lca.technosphere_matrix.shape[0],
-            )
+        self.process_contributions = ContributionStore(
+            (len(self.func_units), len(self.methods), self.total),
+            self.lca.technosphere_matrix.shape[0],
+            self.contribution_tolerance,
         )
 
     @property
@@ -119,12 +179,25 @@ class SuperstructureMLCA(MLCA):
         self.update_matrices()
         self.current += 1
 
+    def apply_scenario(self, index: int) -> None:
+        """Write the values of the given scenario into the matrices and make
+        it the current scenario.
+
+        Only the values of this scenario are written, regardless of the
+        scenario that was applied before. Applying the scenario that is
+        already in the matrices does nothing, so its factorization is kept.
+        """
+        if index < 0:
+            raise ValueError("Negative indexes are not allowed")
+        elif index >= self.total:
+            raise ValueError("Given index is not possible for current scenario dataset")
+        self._current_index = index
+        if self._applied_index != index:
+            self.update_matrices()
+
     def set_scenario(self, index: int) -> None:
         """Set the current scenario index given a new index to go to"""
-        steps = self._get_steps_to_index(index)
-        # self.current = steps[-1] + 1  # Walk the steps to the new index
-        for _ in steps:
-            self.next_scenario()
+        self.apply_scenario(index)
 
     def indices_to_matrix(self) -> None:
         def convert(idx: Index) -> tuple:
@@ -154,108 +227,195 @@ class SuperstructureMLCA(MLCA):
                 # This is to be used as a fail safe for the case where we don't catch a bad exchange during the import
                 # process, or if something else causes an issue with the exchange
                 msg = f"One of the activities in the exchange between ({index.input.database}, {index.input.code}) and ({index.output.database}, {index.output.code}) from the scenario file is not present within the designated database. Please check both keys for this exchange within your scenario file with the corresponding databases."
-                critical = ABPopup.abCritical(
-                    "Scenario Key Error", msg, QPushButton("Cancel")
-                )
-                critical.exec_()
-                raise ScenarioExchangeNotFoundError
+                raise ScenarioExchangeNotFoundError("Scenario Key Error", msg)
             except Exception as e:
                 continue
 
+    def prepare_scenario_slots(self) -> None:
+        """Find the positions in the `data` arrays of the technosphere and
+        biosphere matrices of all scenario exchanges, so a scenario can be
+        written into the matrices at once, see `update_matrices`.
+
+        Exchanges that are absent from the matrices are added as explicit
+        zeros. Scenarios overwrite the lca.xxx_matrix, the values in the
+        matrices at this point are the defaults for absent values in the
+        scenario files.
+        """
+        kinds = np.array([idx[2] for idx in self.indices])
+        # {matrix: (rows in self.values, data positions, signs, defaults)}
+        self.scenario_slots = {}
+        for name in set(self.matrices.values()):
+            matrix = getattr(self.lca, name, None)
+            if matrix is None:
+                # This LCA doesn't have this matrix
+                continue
+            rows = np.flatnonzero(
+                np.isin(kinds, [k for k, m in self.matrices.items() if m == name])
+            )
+            idx = self.matrix_indices[rows]
+            matrix, positions = data_positions(matrix, idx["row"], idx["col"])
+            setattr(self.lca, name, matrix)
+            # Technosphere inputs are stored as negative values, see
+            # `TechnosphereBiosphereMatrixBuilder.fix_supply_use`.
+            signs = np.where(
+                (kinds[rows] == "technosphere") & (idx["type"] == 1), -1.0, 1.0
+            )
+            defaults = matrix.data[positions].copy()
+            self.scenario_slots[name] = (rows, positions, signs, defaults)
+        self.default_technosphere_matrix = self.lca.technosphere_matrix.copy()
+        self.default_biosphere_matrix = self.lca.biosphere_matrix.copy()
+        self._base_solver: Optional[Callable] = None
+
+    def base_solver(self) -> Callable:
+        """Return the factorization of the default technosphere matrix."""
+        if self._base_solver is None:
+            matrix = self.lca.technosphere_matrix
+            solver = getattr(self.lca, "solver", None)
+            self.lca.technosphere_matrix = self.default_technosphere_matrix
+            try:
+                lca_pool.decompose_technosphere(self.lca)
+                self._base_solver = self.lca.solver
+            finally:
+                self.lca.technosphere_matrix = matrix
+                if solver is None:
+                    if hasattr(self.lca, "solver"):
+                        del self.lca.solver
+                else:
+                    self.lca.solver = solver
+        return self._base_solver
+
+    def low_rank_solver(self) -> Optional[Callable]:
+        """Return a solver for the technosphere matrix of the current scenario
+        that updates the factorization of the default matrix, or None if the
+        scenario changes too many columns.
+        """
+        positions = self.scenario_slots["technosphere_matrix"][1]
+        matrix = self.lca.technosphere_matrix
+        default = self.default_technosphere_matrix
+        delta = matrix.data[positions] - default.data[positions]
+        changed = np.unique(positions[delta != 0])
+        if not len(changed):
+            return self.base_solver()
+        columns = np.unique(matrix.indices[changed])
+        if len(columns) > self.low_rank_threshold:
+            return None
+        rows = np.searchsorted(matrix.indptr, changed, side="right") - 1
+        difference = sparse.csc_matrix(
+            (
+                matrix.data[changed] - default.data[changed],
+                (rows, matrix.indices[changed]),
+            ),
+            shape=matrix.shape,
+        )
+        return LowRankSolver(self.base_solver(), difference, columns)
+
+    def solve_scenario(self) -> np.ndarray:
+        """Solve the demands of all reference flows for the current scenario.
+
+        With the "low_rank" scenario solver the base factorization is
+        updated for the changed columns, and the technosphere matrix is only
+        factorized if too many columns change or the solution is inaccurate.
+        """
+        if (
+            self.scenario_solver == "low_rank"
+            and "technosphere_matrix" in self.scenario_slots
+            and not hasattr(self.lca, "solver")
+        ):
+            solver = self.low_rank_solver()
+            if solver is not None:
+                supply = solve_columns(solver, self.demand_matrix)
+                residual = self.lca.technosphere_matrix @ supply - self.demand_matrix
+                if np.linalg.norm(residual) <= self.low_rank_tolerance * np.linalg.norm(
+                    self.demand_matrix
+                ):
+                    self.lca.solver = solver
+                    return supply
+                log.debug("Inaccurate low-rank scenario solution, factorizing")
+        return self.solve_demands(self.demand_matrix)
+
+    def scenario_data(self, name: str, index: int) -> np.ndarray:
+        """Return the values of the scenario exchanges in the `data` array of
+        the matrix `name` for the given scenario. Absent scenario values fall
+        back on the default values.
+        """
+        rows, _, signs, defaults = self.scenario_slots[name]
+        values = self.values[rows, index]
+        return np.where(np.isnan(values), defaults, signs * values)
+
     def update_matrices(self) -> None:
         """A Simplified version of the `PackagesDataLoader.update_matrices` method.
         In this case, we expect to only replace technosphere and biosphere
         values, leaving out characterization factor values.
+
+        The values are written directly into the `data` arrays of the
+        matrices, at the positions found by `prepare_scenario_slots`.
         """
-        kinds = set([idx[2] for idx in self.indices])
-        types = np.array([idx[2] for idx in self.indices])
-        for kind in kinds:
-            idx = self.matrix_indices[types == kind]
-            sample = self.values[types == kind, self.current]
-            # Previously filtered sample and idx for NaN values in samples.
-            # Currently replaces sample NaN values with defaults from the databases
-            if np.isnan(sample).any():
-                default = getattr(self, self.defaults[kind])
-                na_idx = idx[np.isnan(sample)]
-                if kind == "technosphere":
-                    sample[np.isnan(sample)] = np.multiply(
-                        default[na_idx["row"], na_idx["col"]].tolist()[0], -1
-                    )
-                else:
-                    sample[np.isnan(sample)] = default[
-                        na_idx["row"], na_idx["col"]
-                    ].tolist()[0]
-            try:
-                matrix = getattr(self.lca, self.matrices[kind])
-            except AttributeError:
-                # This LCA doesn't have this matrix
-                continue
+        for name, (_, positions, _, _) in self.scenario_slots.items():
+            matrix = getattr(self.lca, name)
+            matrix.data[positions] = self.scenario_data(name, self.current)
+        self._applied_index = self.current
+        if "technosphere_matrix" in self.scenario_slots and hasattr(self.lca, "solver"):
+            # Remove existing matrix factorization because changing technosphere
+            delattr(self.lca, "solver")
+
+    def scenario_biosphere_matrix(self, index: int):
+        """Return the biosphere matrix as it is used in the given scenario,
+        without touching the matrices of the LCA object.
+        """
+        if getattr(self, "_scenario_biosphere", (None, None))[0] == index:
+            return self._scenario_biosphere[1]
+        matrix = self.default_biosphere_matrix.copy()
+        if "biosphere_matrix" in self.scenario_slots:
+            positions = self.scenario_slots["biosphere_matrix"][1]
+            matrix.data[positions] = self.scenario_data("biosphere_matrix", index)
+        self._scenario_biosphere = (index, matrix)
+        return matrix
+
+    def _build_inventory(self, key: tuple):
+        return self._inventory_matrix(
+            self.scaling_factors[key], self.scenario_biosphere_matrix(key[1])
+        )
 
-            if self.matrices[kind] == "technosphere_matrix":
-                # Remove existing matrix factorization
-                # because changing technosphere
-                if hasattr(self.lca, "solver"):
-                    delattr(self.lca, "solver")
+    def _characterized_inventory_keys(self):
+        for fu, ps_col in self.scaling_factors:
+            rows = (
+                i for i, func_unit in enumerate(self.func_units) if str(func_unit) == fu
+            )
+            for row in rows:
+                yield from ((row, col, ps_col) for col in range(len(self.methods)))
 
-            # TODO: Check if this doesnt break stuff
-            # TODO: Update: It does..
-            try:
-                if kind == "technosphere":
-                    MB.fix_supply_use(idx, sample)
-            except:
-                # removed in BW25
-                mask = np.where(idx["type"] == 1)
-                sample[mask] = -1 * sample[mask]
-            matrix[
-                idx["row"],
-                idx["col"],
-            ] = sample
+    def _build_characterized_inventory(self, key: tuple):
+        row, col, ps_col = key
+        inventory = self._build_inventory((str(self.func_units[row]), ps_col))
+        return self.method_matrices[col] @ inventory
 
     def _perform_calculations(self):
         """Near copy of `MLCA` class, but includes a loop for all scenarios."""
         for ps_col in range(self.total):
-            self.next_scenario()
-            for row, func_unit in enumerate(self.func_units):
-                try:
-                    self.lca.redo_lci(func_unit)
-                except:
-                    # bw25 compatibility requires activity id instead of activity key
-                    key = list(func_unit.keys())[0]
-                    self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
-
-                self.scaling_factors.update(
-                    {(str(func_unit), ps_col): self.lca.supply_array}
-                )
+            self.apply_scenario(ps_col)
+            supply = self.solve_scenario()
+            for row, func_unit, result in self.batch_results(supply):
+                self.scaling_factors.update({(str(func_unit), ps_col): result.supply})
                 self.technosphere_flows.update(
-                    {
-                        (str(func_unit), ps_col): np.multiply(
-                            self.lca.supply_array,
-                            self.lca.technosphere_matrix.diagonal(),
-                        )
-                    }
-                )
-                self.inventory.update(
-                    {
-                        (str(func_unit), ps_col): np.array(
-                            self.lca.inventory.sum(axis=1)
-                        ).ravel()
-                    }
+                    {(str(func_unit), ps_col): result.technosphere_flows}
                 )
-                self.inventories.update({(str(func_unit), ps_col): self.lca.inventory})
-
-                for col, cf_matrix in enumerate(self.method_matrices):
-                    self.lca.characterization_matrix = cf_matrix
-                    self.lca.lcia_calculation()
-                    self.lca_scores[row, col, ps_col] = self.lca.score
-                    self.characterized_inventories[
-                        (row, col, ps_col)
-                    ] = self.lca.characterized_inventory.copy()
-                    self.elementary_flow_contributions[row, col, ps_col] = np.array(
-                        self.lca.characterized_inventory.sum(axis=1)
-                    ).ravel()
-                    self.process_contributions[
-                        row, col, ps_col
-                    ] = self.lca.characterized_inventory.sum(axis=0)
+                self.inventory.update({(str(func_unit), ps_col): result.inventory})
+
+                self.lca_scores[row, :, ps_col] = result.scores
+                self.elementary_flow_contributions[
+                    row, :, ps_col
+                ] = result.elementary_flow_contributions
+                self.process_contributions[
+                    row, :, ps_col
+                ] = result.process_contributions
+        self.apply_scenario(0)
+        self.inventories.clear()
+        self.characterized_inventories.clear()
+
+    def _result_keys(self) -> list:
+        return [
+            (k, ps_col) for ps_col in range(self.total) for k in super()._result_keys()
+        ]
 
     def update_lca_calculation_for_sankey(
         self, scenario_index: int, func_unit: str, method_index: int
@@ -268,8 +428,7 @@ class SuperstructureMLCA(MLCA):
         @param func_unit: The functional unit for which the calculation must be performed
         @param method_index: Index of the method for which the calculation must be performed
         """
-        self.current = scenario_index
-        self.update_matrices()
+        self.apply_scenario(scenario_index)
         try:
             self.lca.redo_lci(func_unit)
         except:
@@ -287,23 +446,6 @@ class SuperstructureMLCA(MLCA):
         data = self.lca_scores[:, index, :]
         return pd.DataFrame(data, index=self.func_key_list, columns=self.scenario_names)
 
-    def _get_steps_to_index(self, index: int) -> list:
-        """Determine how many steps to take when given the index we want
-         to land on.
-
-        We can only iterate through the presample arrays in one direction, so
-         if we go from 2 to 1 we need to calculate the amount of steps to loop
-         around to 1.
-        """
-        if index < 0:
-            raise ValueError("Negative indexes are not allowed")
-        elif index >= self.total:
-            raise ValueError("Given index is not possible for current scenario dataset")
-        if index < self.current:
-            return [*range(self.current, self.total), *range(index)]
-        else:
-            return list(range(self.current, index))
-
     def lca_scores_to_dataframe(self) -> pd.DataFrame:
         """Returns a dataframe of LCA scores using FU labels as index and
         the product of methods and scenarios as columns.
@@ -348,20 +490,21 @@ class SuperstructureContributions(Contributions):
         return self._build_lca_scores_df(scores)
 
     def _build_contributions(
-        self, data: np.ndarray, index: int, axis: int
-    ) -> np.ndarray:
-        data = data[:, :, self.mlca.current]
-        return super()._build_contributions(data, index, axis)
+        self, data: ContributionStore, index: int, axis: int
+    ) -> ContributionMatrix:
+        key = [slice(None), slice(None), self.mlca.current]
+        key[axis] = index
+        return data[tuple(key)]
 
     @staticmethod
     def _build_scenario_contributions(
-        data: np.ndarray, fu_index: int, m_index: int
-    ) -> np.ndarray:
+        data: ContributionStore, fu_index: int, m_index: int
+    ) -> ContributionMatrix:
         return data[fu_index, m_index, :]
 
     def get_contributions(
         self, contribution, functional_unit=None, method=None, scenario=0
-    ) -> np.ndarray:
+    ) -> ContributionMatrix:
         """Return a contribution matrix given the type and fu / method
 
         Allow for both fu and method to exist.
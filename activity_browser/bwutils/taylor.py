@@ -0,0 +1,192 @@
+"""
+First-order (Taylor series) propagation of the uncertainty of LCA scores.
+
+The variance of every score is approximated from the variances of the
+uncertain technosphere, biosphere and characterization factor amounts and
+the sensitivity of the score to each of these amounts. This takes a few
+linear solves instead of a full Monte Carlo simulation, but assumes that the
+scores depend linearly on every amount and that all amounts are independent,
+so it is only accurate for small uncertainties.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+from stats_arrays import (
+    LognormalUncertainty,
+    NormalUncertainty,
+    NoUncertainty,
+    TriangularUncertainty,
+    UndefinedUncertainty,
+    UniformUncertainty,
+)
+from stats_arrays import uncertainty_choices as uc
+
+from activity_browser import log
+
+from .commontasks import format_activity_label
+from .lca_pool import characterization_cache, checkout, lca_pool
+from .multilca import MLCA, solve_columns
+
+# z-value of the two-sided 95% interval of the normal distribution
+Z_95 = 1.959964
+
+
+def distribution_variance(params: np.ndarray) -> np.ndarray:
+    """Return the variance of every distribution in a stats_arrays params
+    array.
+
+    Bounds are ignored for the distributions with a closed-form variance,
+    the variance of other distributions is estimated from samples.
+    """
+    types = params["uncertainty_type"]
+    loc, scale = params["loc"], params["scale"]
+    lower, upper = params["minimum"], params["maximum"]
+    variance = np.zeros(len(params))
+    with np.errstate(all="ignore"):
+        lognormal = np.expm1(scale**2) * np.exp(2 * loc + scale**2)
+        triangular = (
+            lower**2
+            + upper**2
+            + loc**2
+            - lower * upper
+            - lower * loc
+            - upper * loc
+        ) / 18
+    closed_form = {
+        LognormalUncertainty.id: lognormal,
+        NormalUncertainty.id: scale**2,
+        UniformUncertainty.id: (upper - lower) ** 2 / 12,
+        TriangularUncertainty.id: triangular,
+    }
+    for choice_id, values in closed_form.items():
+        rows = types == choice_id
+        variance[rows] = values[rows]
+
+    random = np.random.RandomState(0)
+    skip = set(closed_form) | {UndefinedUncertainty.id, NoUncertainty.id}
+    for choice_id in set(np.unique(types)) - skip:
+        rows = np.flatnonzero(types == choice_id)
+        samples = uc[int(choice_id)].bounded_random_variables(
+            params[rows], 10000, random
+        )
+        variance[rows] = samples.var(axis=1)
+    return np.nan_to_num(variance)
+
+
+class FirstOrderUncertainty(object):
+    """Approximate uncertainty of the scores of a calculated `MLCA`.
+
+    The score h = c'Bs of a reference flow and impact category, with supply
+    s = A^-1 f, changes with:
+    - a technosphere amount A_ij by -l_i * s_j, where l = A'^-1 B'c is the
+      solution of the adjoint (transposed) system for the impact category
+    - a biosphere amount B_kj by c_k * s_j
+    - a characterization factor c_k by the inventory g_k
+
+    The variance of the score is the sum of the squared sensitivities times
+    the variances of the amounts. All reference flows are solved at once and
+    a single adjoint solve is needed per impact category.
+
+    The matrices of the `MLCA` are copied when this is created, so the
+    calculation can run in the background while the shared LCA object is
+    switched to other scenarios or impact categories.
+    """
+
+    SOURCES = ("technosphere", "biosphere", "cf")
+
+    def __init__(self, mlca: MLCA):
+        self.mlca = mlca
+        self.lca = copy.copy(mlca.lca)
+        for name, value in vars(mlca.lca).items():
+            setattr(self.lca, name, checkout(value))
+        # The factorization belongs to the shared LCA object.
+        vars(self.lca).pop("solver", None)
+        self.operator = mlca.characterization_operator.copy()
+        self.demand_matrix = mlca.demand_matrix.copy()
+        self.scores = np.zeros((len(mlca.func_units), len(mlca.methods)))
+        self.variances = {source: np.zeros_like(self.scores) for source in self.SOURCES}
+
+    @property
+    def variance(self) -> np.ndarray:
+        return sum(self.variances.values())
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def calculate(self) -> "FirstOrderUncertainty":
+        lca = self.lca
+        operator = self.operator
+        lca_pool.decompose_technosphere(lca)
+        supply = solve_columns(lca.solver, self.demand_matrix)
+        inventory = np.asarray(lca.biosphere_matrix @ supply)
+        self.scores = np.asarray(operator @ inventory).T
+
+        # Adjoint solutions, (technosphere, methods)
+        solve = lca_pool.adjoint_solver(lca)
+        weights = (operator @ lca.biosphere_matrix).T.toarray()
+        adjoint = np.column_stack(
+            [solve(weights[:, i]) for i in range(weights.shape[1])]
+        )
+
+        params = lca.tech_params
+        variance = distribution_variance(params)
+        rows = np.flatnonzero(variance)
+        params = params[rows]
+        self.variances["technosphere"] = (
+            supply[params["col"]] ** 2 * variance[rows, None]
+        ).T @ (adjoint[params["row"]] ** 2)
+
+        params = lca.bio_params
+        variance = distribution_variance(params)
+        rows = np.flatnonzero(variance)
+        params = params[rows]
+        factors = operator.toarray().T[params["row"]]
+        self.variances["biosphere"] = (
+            supply[params["col"]] ** 2 * variance[rows, None]
+        ).T @ (factors**2)
+
+        current = getattr(lca, "method", None)
+        try:
+            for col, method in enumerate(self.mlca.methods):
+                characterization_cache.switch_method(lca, method)
+                params = lca.cf_params
+                variance = distribution_variance(params)
+                self.variances["cf"][:, col] = (
+                    variance[:, None] * inventory[params["row"]] ** 2
+                ).sum(axis=0)
+        finally:
+            if current is not None:
+                characterization_cache.switch_method(lca, current)
+
+        log.info(
+            f"First-order uncertainty of {self.scores.size} scores: "
+            f"{len(lca.tech_params)} technosphere and {len(lca.bio_params)} "
+            "biosphere exchanges"
+        )
+        return self
+
+    def get_results_dataframe(self, method_index: int = 0) -> pd.DataFrame:
+        """Return the scores, standard deviations, approximate 95% intervals
+        and the share of each source in the variance for an impact category.
+        """
+        score = self.scores[:, method_index]
+        std = self.std[:, method_index]
+        variance = self.variance[:, method_index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data = {
+                "Reference flow": [
+                    format_activity_label(key, style="pnld")
+                    for key in self.mlca.fu_activity_keys
+                ],
+                "Score": score,
+                "Standard deviation": std,
+                "CV (%)": 100 * std / np.abs(score),
+                "2.5%": score - Z_95 * std,
+                "97.5%": score + Z_95 * std,
+            }
+            for source in self.SOURCES:
+                share = self.variances[source][:, method_index] / variance
+                data[f"Variance {source} (%)"] = 100 * share
+        return pd.DataFrame(data)
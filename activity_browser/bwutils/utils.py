@@ -1,6 +1,6 @@
-from collections import UserList
+from collections import UserList, defaultdict
 from itertools import chain
-from typing import Iterable, List, NamedTuple, Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
 import numpy as np
 
@@ -22,6 +22,9 @@ for a significant amount of repeated logic or heavy IO calls to be avoided by ei
 holding values in memory or allowing simple shortcuts to retrieve them. 
 """
 
+# Maximum number of ids in a single `IN` query, SQLite allows 999 variables.
+QUERY_CHUNK = 900
+
 
 class Parameter(NamedTuple):
     name: str
@@ -29,20 +32,27 @@ class Parameter(NamedTuple):
     amount: float = 1.0
     param_type: Optional[str] = None
 
-    def as_gsa_tuple(self) -> tuple:
+    def as_gsa_tuple(self, associated: Optional[tuple] = None) -> tuple:
         """Return the parameter data formatted as follows:
         - Parameter name
         - Scope [global/activity]
         - Associated activity [or None]
         - Value
+
+        The associated activity of activity parameters is looked up unless
+        it is given.
         """
-        if self.group == "project" or self.group in bd.databases:
+        if self.param_type in ("project", "database") or (
+            self.param_type is None
+            and (self.group == "project" or self.group in bd.databases)
+        ):
             scope = "global"
             associated = None
         else:
             scope = "activity"
-            p = ActivityParameter.get(name=self.name, group=self.group)
-            associated = (p.database, p.code)
+            if associated is None:
+                p = ActivityParameter.get(name=self.name, group=self.group)
+                associated = (p.database, p.code)
         return self.name, scope, associated, self.amount
 
 
@@ -126,10 +136,18 @@ class Index(NamedTuple):
 class Parameters(UserList):
     data: List[Parameter]
 
+    def __init__(self, initlist=None):
+        super().__init__(initlist)
+        # Activity (database, code) keys of activity parameters by (group, name)
+        self.activity_keys: Dict[tuple, tuple] = {}
+        self._positions: Optional[Dict[tuple, int]] = None
+        self._groups: Optional[Dict[str, List[int]]] = None
+
     @classmethod
     def from_bw_parameters(cls) -> "Parameters":
         """Construct a Parameters list from brightway2 parameters."""
-        return cls(
+        activity_parameters = list(ActivityParameter.select())
+        parameters = cls(
             chain(
                 (
                     Parameter(p.name, "project", p.amount, "project")
@@ -141,17 +159,39 @@ class Parameters(UserList):
                 ),
                 (
                     Parameter(p.name, p.group, p.amount, "activity")
-                    for p in ActivityParameter.select()
+                    for p in activity_parameters
                 ),
             )
         )
+        parameters.activity_keys = {
+            (p.group, p.name): (p.database, p.code) for p in activity_parameters
+        }
+        return parameters
+
+    def _index(self) -> None:
+        """Index the positions of the parameters by group and (group, name),
+        positions stay valid as `update` replaces parameters in place.
+        """
+        if self._positions is not None and len(self._positions) == len(self.data):
+            return
+        self._positions = {}
+        self._groups = defaultdict(list)
+        for i, p in enumerate(self.data):
+            self._positions[(p.group, p.name)] = i
+            self._groups[p.group].append(i)
+
+    def get(self, group: str, name: str) -> Optional[Parameter]:
+        self._index()
+        i = self._positions.get((group, name))
+        return None if i is None else self.data[i]
 
     def by_group(self, group: str) -> Iterable[Parameter]:
-        return (p for p in self.data if p.group == group)
+        self._index()
+        return (self.data[i] for i in self._groups.get(group, []))
 
     def data_by_group(self, group: str) -> dict:
         """Parses the `data` to extract the relevant subset of parameters."""
-        return {p.name: p.amount for p in self.data if p.group == group}
+        return {p.name: p.amount for p in self.by_group(group)}
 
     @staticmethod
     def static(data: dict, needed: set) -> dict:
@@ -171,7 +211,9 @@ class Parameters(UserList):
 
     def to_gsa(self) -> List[tuple]:
         """Formats all of the parameters in the list for handling in a GSA."""
-        return [p.as_gsa_tuple() for p in self.data]
+        return [
+            p.as_gsa_tuple(self.activity_keys.get((p.group, p.name))) for p in self.data
+        ]
 
 
 class Indices(UserList):
@@ -201,23 +243,47 @@ class StaticParameters(object):
 
     def __init__(self):
         self._project_params = ProjectParameter.load()
-        self._db_params = {
-            p.database: DatabaseParameter.load(p.database)
-            for p in DatabaseParameter.select(DatabaseParameter.database).distinct()
-        }
-        self._act_params = {
-            p.group: ActivityParameter.load(p.group)
-            for p in ActivityParameter.select(ActivityParameter.group).distinct()
-        }
-        self._distinct_act_params = [
-            p
-            for p in (
-                ActivityParameter.select(
-                    ActivityParameter.group, ActivityParameter.database
-                ).distinct()
-            )
-        ]
+        # Load all database and activity parameters at once, mirroring the
+        # `load` methods of these parameters per database or group.
+        self._db_params = defaultdict(dict)
+        for p in DatabaseParameter.select():
+            data = p.dict
+            self._db_params[p.database][data.pop("name")] = data
+        self._act_params = defaultdict(dict)
+        self._distinct_act_params = []
+        distinct = set()
+        for p in ActivityParameter.select():
+            if (p.group, p.database) not in distinct:
+                distinct.add((p.group, p.database))
+                self._distinct_act_params.append(p)
+            data = p.dict
+            self._act_params[p.group][data.pop("name")] = data
         self._exc_params = [p for p in ParameterizedExchange.select()]
+        self._exc_by_group = defaultdict(dict)
+        for p in self._exc_params:
+            self._exc_by_group[p.group][p.exchange] = p.formula
+        # Exchange metadata is only loaded when required, see `exchange`.
+        self._exchanges: Optional[Dict[int, Index]] = None
+
+    @classmethod
+    def load_exchanges(cls, ids: List[int]) -> Dict[int, Index]:
+        """Return the `Index` of the exchanges with the given ids, queried in
+        a few chunks instead of one query per exchange.
+        """
+        fields = (
+            ExchangeDataset.id,
+            ExchangeDataset.input_database,
+            ExchangeDataset.input_code,
+            ExchangeDataset.output_database,
+            ExchangeDataset.output_code,
+            ExchangeDataset.type,
+        )
+        exchanges = {}
+        for i in range(0, len(ids), QUERY_CHUNK):
+            chunk = ids[i : i + QUERY_CHUNK]
+            query = ExchangeDataset.select(*fields).where(ExchangeDataset.id.in_(chunk))
+            exchanges.update({exc.id: Index.build_from_exchange(exc) for exc in query})
+        return exchanges
 
     def project(self) -> dict:
         """Mirrors `ProjectParameter.load()`."""
@@ -246,7 +312,19 @@ class StaticParameters(object):
 
     def exc_by_group(self, group: str) -> dict:
         """Mirrors `ParameterizedExchange.load(group)`"""
-        return {p.exchange: p.formula for p in self._exc_params if p.group == group}
+        return dict(self._exc_by_group.get(group, {}))
+
+    def exchange(self, pk: int) -> Index:
+        """Return the `Index` of the parameterized exchange with the given id."""
+        if self._exchanges is None:
+            self._exchanges = self.load_exchanges(
+                [p.exchange for p in self._exc_params]
+            )
+        index = self._exchanges.get(pk)
+        if index is None:
+            index = Index.build_from_exchange(ExchangeDataset.get_by_id(pk))
+            self._exchanges[pk] = index
+        return index
 
     @staticmethod
     def prune_result_data(data: dict) -> dict:
@@ -3,12 +3,12 @@ import traceback
 
 from bw2calc.errors import BW2CalcError
 from PySide2.QtCore import Qt, Slot
-from PySide2.QtWidgets import QApplication, QMessageBox, QVBoxLayout
+from PySide2.QtWidgets import QMessageBox, QVBoxLayout
 
 from activity_browser import log, signals
 from activity_browser.mod import bw2data as bd
 
-from ...bwutils.errors import ABError
+from ...bwutils.errors import ABError, ReferenceFlowValueError
 from ..panels import ABTab
 from .LCA_results_tabs import LCAResultsSubTab
 
@@ -32,7 +32,15 @@ class LCAResultsTab(ABTab):
         signals.lca_calculation.connect(self.generate_setup)
         self.tabCloseRequested.connect(self.close_tab)
         bd.projects.current_changed.connect(self.close_all)
-        bd.parameters.parameters_changed.connect(self.close_all)
+        bd.parameters.parameters_changed.connect(self.close_outdated)
+
+    @Slot(name="closeOutdated")
+    def close_outdated(self):
+        """Close the results whose databases changed, e.g. because an edited
+        parameter changed some of their exchanges. Other results stay open.
+        """
+        for tab in [t for t in self.tabs.values() if t.is_outdated()]:
+            self.close_tab(self.indexOf(tab))
 
     @Slot(str, name="removeSetup")
     def remove_setup(self, name: str):
@@ -66,20 +74,38 @@ class LCAResultsTab(ABTab):
                 else None
             )
             new_tab.destroyed.connect(signals.hide_when_empty.emit)
+            new_tab.calculation_failed.connect(
+                lambda e, details: self.calculation_failed(new_tab, e, details)
+            )
 
             signals.show_tab.emit("LCA results")
-        except (BW2CalcError, ABError) as e:
-            initial, *other = e.args
+        except (BW2CalcError, ABError, ReferenceFlowValueError) as e:
             log.error(traceback.format_exc())
-            QApplication.restoreOverrideCursor()
-            msg = QMessageBox(
-                QMessageBox.Warning,
-                "Calculation problem",
-                str(initial),
-                QMessageBox.Ok,
-                self,
-            )
-            msg.setWindowModality(Qt.ApplicationModal)
-            if other:
-                msg.setDetailedText("\n".join(other))
-            msg.exec_()
+            self.show_calculation_error(e)
+
+    def calculation_failed(
+        self, tab: LCAResultsSubTab, error: Exception, details: str
+    ) -> None:
+        """Remove the tab of a failed calculation and show what went wrong."""
+        index = self.indexOf(tab)
+        if index != -1:
+            self.close_tab(index)
+        self.show_calculation_error(error, details)
+
+    def show_calculation_error(self, error: Exception, details: str = "") -> None:
+        if isinstance(error, (BW2CalcError, ABError, ReferenceFlowValueError)):
+            initial, *other = error.args or ("",)
+            details = "\n".join(str(o) for o in other)
+        else:
+            initial = f"{type(error).__name__}: {error}"
+        msg = QMessageBox(
+            QMessageBox.Warning,
+            "Calculation problem",
+            str(initial),
+            QMessageBox.Ok,
+            self,
+        )
+        msg.setWindowModality(Qt.ApplicationModal)
+        if details:
+            msg.setDetailedText(details)
+        msg.exec_()
@@ -4,13 +4,14 @@
 Each of these classes is either a parent for - or a sub-LCA results tab.
 """
 
+import os
 from collections import namedtuple
 from typing import List, Optional, Union
 
+import numpy as np
 import pandas as pd
 from PySide2 import QtCore, QtGui
 from PySide2.QtWidgets import (
-    QApplication,
     QButtonGroup,
     QCheckBox,
     QComboBox,
@@ -21,19 +22,20 @@ from PySide2.QtWidgets import (
     QLabel,
     QLineEdit,
     QMessageBox,
+    QProgressBar,
     QPushButton,
     QRadioButton,
     QScrollArea,
+    QSpinBox,
     QTableView,
     QTabWidget,
     QToolBar,
     QVBoxLayout,
     QWidget,
 )
-from stats_arrays.errors import InvalidParamsError
 
 from activity_browser import log, signals
-from activity_browser.mod.bw2data import calculation_setups
+from activity_browser.mod.bw2data import calculation_setups, databases
 
 from ...bwutils import (
     MLCA,
@@ -44,6 +46,9 @@ from ...bwutils import (
     calculations,
 )
 from ...bwutils import commontasks as bc
+from ...bwutils.errors import NoUncertainInputsError
+from ...bwutils.sampling import SAMPLERS
+from ...bwutils.taylor import FirstOrderUncertainty
 from ...ui.figures import (
     ContributionPlot,
     CorrelationPlot,
@@ -52,6 +57,7 @@ from ...ui.figures import (
     MonteCarloPlot,
 )
 from ...ui.icons import qicons
+from ...ui.jobs import Job, job_scheduler
 from ...ui.style import header, horizontal_line, vertical_line
 from ...ui.tables import ContributionTable, InventoryTable, LCAResultsTable
 from ...ui.web import SankeyNavigatorWidget
@@ -115,6 +121,7 @@ class LCAResultsSubTab(QTabWidget):
     """
 
     update_scenario_box_index = QtCore.Signal(int)
+    calculation_failed = QtCore.Signal(object, str)
 
     def __init__(self, data: dict, parent=None):
         super().__init__(parent)
@@ -125,16 +132,43 @@ class LCAResultsSubTab(QTabWidget):
         self.mlca: Optional[Union[MLCA, SuperstructureMLCA]] = None
         self.contributions: Optional[Contributions] = None
         self.mc: Optional[MonteCarloLCA] = None
+        self.database_state: Optional[dict] = None
         self.method_dict = dict()
         self.single_func_unit = False
         self.single_method = False
 
+        self.tabs = None
+
         self.setMovable(True)
         self.setVisible(False)
         self.visible = False
 
-        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        self.mlca, self.contributions, self.mc = calculations.do_LCA_calculations(data)
+        # The calculation runs in the background, the tabs are built once it is done.
+        self.job = Job(
+            f"LCA calculation '{self.cs_name}'",
+            calculations.do_LCA_calculations,
+            data,
+            progress=True,
+        )
+        self.job_progress = JobProgressWidget(self.job, self)
+        self.addTab(self.job_progress, "Calculating")
+        self.job.finished.connect(self.calculation_finished)
+        self.job.failed.connect(self.calculation_failed.emit)
+        self.job.cancelled.connect(self.deleteLater)
+        job_scheduler.submit(self.job)
+
+        calculation_setups.metadata_changed.connect(self.check_cs)
+        job = self.job
+        self.destroyed.connect(lambda: job_scheduler.cancel(job))
+
+    @QtCore.Slot(object, name="calculationFinished")
+    def calculation_finished(self, result: tuple) -> None:
+        """Build all result tabs from the finished calculation."""
+        self.mlca, self.contributions, self.mc = result
+        self.database_state = self.current_database_state()
+        self.removeTab(self.indexOf(self.job_progress))
+        self.job_progress.deleteLater()
+
         self.method_dict = bc.get_LCIA_method_name_dict(self.mlca.methods)
         self.single_func_unit = True if len(self.mlca.func_units) == 1 else False
         self.single_method = True if len(self.mlca.methods) == 1 else False
@@ -162,9 +196,6 @@ class LCAResultsSubTab(QTabWidget):
         self.setup_tabs()
         self.setCurrentWidget(self.tabs.results)
         self.currentChanged.connect(self.generate_content_on_click)
-        QApplication.restoreOverrideCursor()
-
-        calculation_setups.metadata_changed.connect(self.check_cs)
 
     def setup_tabs(self):
         """Have all of the tabs pull in their required data and add them."""
@@ -187,7 +218,7 @@ class LCAResultsSubTab(QTabWidget):
         """Will calculate which scenario array to use and update all child tabs."""
         if index == self.mlca.current:
             return
-        self.mlca.set_scenario(index)
+        self.mlca.apply_scenario(index)
         self._update_tabs()
         self.update_scenario_box_index.emit(index)
 
@@ -216,8 +247,74 @@ class LCAResultsSubTab(QTabWidget):
 
     def check_cs(self):
         if self.cs != calculation_setups.get(self.cs_name, None):
+            job_scheduler.cancel(self.job)
             self.deleteLater()
 
+    def current_database_state(self) -> dict:
+        return {
+            db: (databases[db].get("modified"), databases[db].get("dirty"))
+            for db in sorted(self.mlca.all_databases)
+            if db in databases
+        }
+
+    def is_outdated(self) -> bool:
+        """Whether any of the databases of the results changed since they were
+        calculated, a running calculation is always outdated.
+        """
+        if self.database_state is None:
+            return True
+        return self.current_database_state() != self.database_state
+
+
+class JobProgressWidget(QWidget):
+    """Shows the state of a queued or running job, with the option to cancel it."""
+
+    def __init__(self, job: Job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+        self.label = QLabel()
+        self.details = QLabel()
+        self.details.hide()
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.button_cancel = QPushButton("Cancel")
+        self.button_cancel.clicked.connect(lambda: job_scheduler.cancel(self.job))
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress)
+        layout.addWidget(self.details)
+        layout.addWidget(self.button_cancel, alignment=QtCore.Qt.AlignLeft)
+        layout.addStretch(1)
+        self.setLayout(layout)
+
+        self.update_state()
+        job_scheduler.queue_changed.connect(self.update_state)
+        job.started.connect(self.update_state)
+        job.progress_changed.connect(self.update_progress)
+
+    @QtCore.Slot(name="updateJobState")
+    def update_state(self) -> None:
+        if self.job.is_running:
+            self.label.setText(f"Running: {self.job.name}")
+            return
+        position = job_scheduler.position(self.job)
+        if position is not None:
+            self.label.setText(
+                f"Queued: {self.job.name} ({position} job(s) ahead in the queue)"
+            )
+
+    @QtCore.Slot(int, int, name="updateJobProgress")
+    def update_progress(self, current: int, total: int) -> None:
+        self.label.setText(f"Running: {self.job.name}")
+        self.progress.setRange(0, total)
+        self.progress.setValue(current)
+
+    def set_details(self, text: str) -> None:
+        self.details.setText(text)
+        self.details.show()
+
 
 class NewAnalysisTab(BaseRightTab):
     """Parent class around which all sub-tabs are built."""
@@ -1088,7 +1185,7 @@ class ElementaryFlowContributionTab(ContributionTab):
             **kwargs,
             limit=self.cutoff_menu.cutoff_value,
             limit_type=self.cutoff_menu.limit_type,
-            normalize=self.relative
+            normalize=self.relative,
         )
 
 
@@ -1142,7 +1239,7 @@ class ProcessContributionsTab(ContributionTab):
             **kwargs,
             limit=self.cutoff_menu.cutoff_value,
             limit_type=self.cutoff_menu.limit_type,
-            normalize=self.relative
+            normalize=self.relative,
         )
 
 
@@ -1216,6 +1313,19 @@ class MonteCarloTab(NewAnalysisTab):
 
         self.add_MC_ui_elements()
 
+        self.approximation: Optional[FirstOrderUncertainty] = None
+        self.approximation_label = QLabel(
+            "Approximate uncertainty (first-order Taylor series, normal 95% interval)"
+        )
+        self.approximation_table = LCAResultsTable()
+        self.approximation_table.table_name = (
+            "Approximate_uncertainty_" + self.parent.cs_name
+        )
+        self.approximation_label.hide()
+        self.approximation_table.hide()
+        self.layout.addWidget(self.approximation_label)
+        self.layout.addWidget(self.approximation_table)
+
         self.table = LCAResultsTable()
         self.table.table_name = "MonteCarlo_" + self.parent.cs_name
         self.plot = MonteCarloPlot(self.parent)
@@ -1239,13 +1349,12 @@ class MonteCarloTab(NewAnalysisTab):
         """
 
     def connect_signals(self):
-        self.button_run.clicked.connect(self.calculate_mc_lca)
+        self.button_run.clicked.connect(lambda: self.calculate_mc_lca())
+        self.button_resume.clicked.connect(lambda: self.calculate_mc_lca(resume=True))
+        self.button_approximate.clicked.connect(self.approximate_uncertainty)
         # signals.monte_carlo_ready.connect(self.update_mc)
         # self.combobox_fu.currentIndexChanged.connect(self.update_plot)
-        self.combobox_methods.currentIndexChanged.connect(
-            # ignore the index and send the cs_name instead
-            lambda x: self.update_mc(cs_name=self.parent.cs_name)
-        )
+        self.combobox_methods.currentIndexChanged.connect(self.update_method)
 
         # signals
         # self.radio_button_biosphere.clicked.connect(self.button_clicked)
@@ -1264,10 +1373,28 @@ class MonteCarloTab(NewAnalysisTab):
 
         # H-LAYOUT start simulation
         self.button_run = QPushButton("Run")
+        self.button_resume = QPushButton("Continue")
+        self.update_resume_button()
+        self.button_approximate = QPushButton("Approximate")
+        self.button_approximate.setToolTip(
+            "Estimate the uncertainty of the scores in seconds with first-order "
+            "(Taylor series) propagation of the technosphere, biosphere and "
+            "characterization factor uncertainties. Only accurate for small "
+            "uncertainties, parameters are not included."
+        )
         self.label_iterations = QLabel("Iterations:")
         self.iterations = QLineEdit("30")
         self.iterations.setFixedWidth(40)
-        self.iterations.setValidator(QtGui.QIntValidator(1, 1000))
+        self.iterations.setValidator(QtGui.QIntValidator(1, 100000))
+        self.label_tolerance = QLabel("Stop at CI width (%):")
+        self.label_tolerance.setToolTip(
+            "Stop the simulation once the 95% confidence interval of every mean "
+            "score is narrower than this percentage of the mean, the number of "
+            "iterations is then the maximum. Leave empty to run all iterations."
+        )
+        self.tolerance = QLineEdit("")
+        self.tolerance.setFixedWidth(40)
+        self.tolerance.setValidator(QtGui.QDoubleValidator(0.01, 100, 2))
         self.label_seed = QLabel("Random seed:")
         self.label_seed.setToolTip(
             "Seed value (integer) for the random number generator. "
@@ -1275,15 +1402,44 @@ class MonteCarloTab(NewAnalysisTab):
         )
         self.seed = QLineEdit("")
         self.seed.setFixedWidth(30)
+        self.label_workers = QLabel("Processes:")
+        self.label_workers.setToolTip(
+            "Number of processes that calculate iterations in parallel. "
+            "Results do not depend on the number of processes."
+        )
+        self.workers = QSpinBox()
+        self.workers.setRange(1, os.cpu_count() or 1)
+        self.iterative_solver = QCheckBox("Iterative solver")
+        self.iterative_solver.setToolTip(
+            "Solve the sampled matrices iteratively, starting from the "
+            "deterministic solution. Faster for large databases."
+        )
+        self.label_sampler = QLabel("Sampling:")
+        self.label_sampler.setToolTip(
+            "Latin hypercube and Sobol sampling cover the uncertainty "
+            "distributions more evenly than pseudo-random sampling, so fewer "
+            "iterations are needed for the same accuracy."
+        )
+        self.sampler = QComboBox()
+        self.sampler.addItems(list(SAMPLERS.values()))
 
         self.hlayout_run = QHBoxLayout()
         self.hlayout_run.addWidget(self.scenario_label)
         self.hlayout_run.addWidget(self.scenario_box)
         self.hlayout_run.addWidget(self.button_run)
+        self.hlayout_run.addWidget(self.button_resume)
+        self.hlayout_run.addWidget(self.button_approximate)
         self.hlayout_run.addWidget(self.label_iterations)
         self.hlayout_run.addWidget(self.iterations)
+        self.hlayout_run.addWidget(self.label_tolerance)
+        self.hlayout_run.addWidget(self.tolerance)
         self.hlayout_run.addWidget(self.label_seed)
         self.hlayout_run.addWidget(self.seed)
+        self.hlayout_run.addWidget(self.label_workers)
+        self.hlayout_run.addWidget(self.workers)
+        self.hlayout_run.addWidget(self.iterative_solver)
+        self.hlayout_run.addWidget(self.label_sampler)
+        self.hlayout_run.addWidget(self.sampler)
         self.hlayout_run.addWidget(self.include_box)
         self.hlayout_run.addStretch(1)
         layout_mc.addLayout(self.hlayout_run)
@@ -1340,13 +1496,30 @@ class MonteCarloTab(NewAnalysisTab):
         export_widget.hide()
         return export_widget
 
+    def update_resume_button(self) -> None:
+        """Enable continuing the last simulation if it has a checkpoint."""
+        info = self.parent.mc.checkpoint_info() if self.parent.mc else None
+        self.button_resume.setEnabled(info is not None)
+        if info is None:
+            self.button_resume.setToolTip("No earlier simulation to continue.")
+            return
+        completed, planned = info
+        self.button_resume.setToolTip(
+            f"Continue the last simulation ({completed} of {planned} iterations) "
+            "with its seed and uncertainty settings, up to the given number of "
+            "iterations. A finished simulation is extended with new iterations."
+        )
+
     @QtCore.Slot(name="calculateMcLca")
-    def calculate_mc_lca(self):
+    def calculate_mc_lca(self, resume: bool = False):
         self.method_selection_widget.hide()
         self.plot.hide()
         self.export_widget.hide()
 
         iterations = int(self.iterations.text())
+        tolerance = None
+        if self.tolerance.hasAcceptableInput():
+            tolerance = float(self.tolerance.text()) / 100
         seed = None
         if self.seed.text():
             log.info("SEED: ", self.seed.text())
@@ -1370,74 +1543,99 @@ class MonteCarloTab(NewAnalysisTab):
             "parameters": self.include_parameters.isChecked(),
         }
 
-        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        try:
-            self.parent.mc.calculate(iterations=iterations, seed=seed, **includes)
-            signals.monte_carlo_finished.emit()
-            self.update_mc()
-        except (
-            InvalidParamsError
-        ) as e:  # This can occur if uncertainty data is missing or otherwise broken
-            # print(e)
-            log.error(error=e)
-            QMessageBox.warning(
-                self, "Could not perform Monte Carlo simulation", str(e)
-            )
-        QApplication.restoreOverrideCursor()
-
-        # a threaded way for this - unfortunatley this crashes as:
-        # pypardsio_solver is used for the 'spsolve' and 'factorized' functions. Python crashes on windows if multiple
-        # instances of PyPardisoSolver make calls to the Pardiso library
-        # worker_thread = WorkerThread()
-        # print('Created local worker_thread')
-        # worker_thread.set_mc(self.parent.mc, iterations=iterations)
-        # print('Passed object to thread.')
-        # worker_thread.start()
-        # self.label_running.show()
+        job = Job(
+            f"Monte Carlo simulation '{self.parent.cs_name}'",
+            self.parent.mc.calculate,
+            iterations=iterations,
+            seed=seed,
+            workers=self.workers.value(),
+            solver="iterative" if self.iterative_solver.isChecked() else "direct",
+            sampler=list(SAMPLERS)[self.sampler.currentIndex()],
+            tolerance=tolerance,
+            resume=resume,
+            progress=True,
+            publish=True,
+            **includes,
+        )
+        job.published.connect(self.mc_published)
+        job.finished.connect(self.mc_finished)
+        job.failed.connect(self.mc_failed)
+        job.cancelled.connect(self.mc_cancelled)
+        self.button_run.setEnabled(False)
+        self.button_resume.setEnabled(False)
+        self.job_progress = JobProgressWidget(job, self)
+        self.layout.insertWidget(self.layout.indexOf(self.plot), self.job_progress)
+        for signal in (job.finished, job.failed, job.cancelled):
+            signal.connect(self.job_progress.deleteLater)
+        job_scheduler.submit(job)
+
+    @QtCore.Slot(object, name="mcPublished")
+    def mc_published(self, statistics):
+        """Show how far the running simulation has converged."""
+        width = np.nanmax(statistics.ci_width) if statistics.count > 1 else np.nan
+        text = f"{statistics.count} iterations"
+        if np.isfinite(width):
+            text += f", widest 95% confidence interval of the mean: ±{width * 50:.2f}%"
+        self.job_progress.set_details(text)
+
+    @QtCore.Slot(object, name="mcFinished")
+    def mc_finished(self, result=None):
+        self.button_run.setEnabled(True)
+        self.update_resume_button()
+        signals.monte_carlo_finished.emit()
+        self.update_mc()
+
+    @QtCore.Slot(name="approximateUncertainty")
+    def approximate_uncertainty(self):
+        approximation = FirstOrderUncertainty(self.parent.mlca)
+        job = Job(
+            f"Approximate uncertainty '{self.parent.cs_name}'",
+            approximation.calculate,
+        )
+        job.finished.connect(self.approximation_finished)
+        job.failed.connect(self.approximation_failed)
+        job.cancelled.connect(lambda: self.button_approximate.setEnabled(True))
+        self.button_approximate.setEnabled(False)
+        job_scheduler.submit(job)
+
+    @QtCore.Slot(object, name="approximationFinished")
+    def approximation_finished(self, approximation: FirstOrderUncertainty):
+        self.button_approximate.setEnabled(True)
+        self.approximation = approximation
+        self.method_selection_widget.show()
+        self.approximation_label.show()
+        self.approximation_table.show()
+        self.update_approximation()
 
-        #
+    @QtCore.Slot(object, str, name="approximationFailed")
+    def approximation_failed(self, error: Exception, details: str):
+        self.button_approximate.setEnabled(True)
+        QMessageBox.warning(self, "Could not approximate uncertainty", str(error))
 
-        # thread = NewCSMCThread() #self.parent.mc
-        # thread.calculation_finished.connect(
-        #     lambda x: print('Calculation finished.'))
-        # thread.start()
+    def update_approximation(self):
+        method_index = self.combobox_methods.currentIndex()
+        df = self.approximation.get_results_dataframe(method_index)
+        self.approximation_table.model.sync(df)
 
-        # # give us a thread and start it
-        # thread = QtCore.QThread()
-        # thread.start()
-        #
-        # # create a worker and move it to our extra thread
-        # worker = Worker()
-        # worker.moveToThread(thread)
-
-        # self.parent.mct.start()
-        # self.parent.mct.run(iterations=iterations)
-        # self.parent.mct.finished()
-
-        # objThread = QtCore.QThread()
-        # obj = QObjectMC()  # self.parent.cs_name
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # # objThread.finished.connect(app.exit)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # objThread = QtCore.QThread()
-        # obj = SomeObject()
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # self.method_selection_widget.show()
-        # self.plot.show()
-        # self.export_widget.show()
+    def update_method(self):
+        if self.approximation is not None:
+            self.update_approximation()
+        if len(self.parent.mc.results):
+            self.update_mc(cs_name=self.parent.cs_name)
+
+    @QtCore.Slot(name="mcCancelled")
+    def mc_cancelled(self):
+        self.button_run.setEnabled(True)
+        self.update_resume_button()
+
+    @QtCore.Slot(object, str, name="mcFailed")
+    def mc_failed(self, error: Exception, details: str):
+        # InvalidParamsError can occur if uncertainty data is missing or otherwise broken
+        self.button_run.setEnabled(True)
+        self.update_resume_button()
+        QMessageBox.warning(
+            self, "Could not perform Monte Carlo simulation", str(error)
+        )
 
     def configure_scenario(self):
         super().configure_scenario()
@@ -1541,6 +1739,7 @@ class GSATab(NewAnalysisTab):
 
     def connect_signals(self):
         self.button_run.clicked.connect(self.calculate_gsa)
+        self.button_run_all.clicked.connect(lambda: self.calculate_gsa(batch=True))
         signals.monte_carlo_finished.connect(self.monte_carlo_finished)
 
     def add_GSA_ui_elements(self):
@@ -1549,6 +1748,19 @@ class GSATab(NewAnalysisTab):
         # run button
         self.button_run = QPushButton("Run")
         self.button_run.setEnabled(False)
+        self.button_run_all = QPushButton("Run for all")
+        self.button_run_all.setToolTip(
+            "Perform the GSA for every reference flow and impact category of "
+            "the calculation setup."
+        )
+        self.button_run_all.setEnabled(False)
+        self.label_workers = QLabel("Processes:")
+        self.label_workers.setToolTip(
+            "Number of processes that perform the GSA of different reference "
+            "flows and impact categories in parallel."
+        )
+        self.workers = QSpinBox()
+        self.workers.setRange(1, os.cpu_count() or 1)
 
         # reference flow selection
         self.label_fu = QLabel("Reference Flow:")
@@ -1565,6 +1777,9 @@ class GSATab(NewAnalysisTab):
         self.hlayout_row1.addWidget(self.combobox_fu)
         self.hlayout_row1.addWidget(self.label_methods)
         self.hlayout_row1.addWidget(self.combobox_methods)
+        self.hlayout_row1.addWidget(self.button_run_all)
+        self.hlayout_row1.addWidget(self.label_workers)
+        self.hlayout_row1.addWidget(self.workers)
 
         # self.hlayout_row1.addWidget(self.fu_selection_widget)
         # self.hlayout_row1.addWidget(self.method_selection_widget)
@@ -1585,6 +1800,24 @@ class GSATab(NewAnalysisTab):
         self.cutoff_biosphere.setFixedWidth(40)
         self.cutoff_biosphere.setValidator(QtGui.QDoubleValidator(0.0, 1.0, 5))
 
+        # rank correlation screening of the inputs of the delta analysis
+        self.label_max_inputs = QLabel("Max. inputs:")
+        self.label_max_inputs.setToolTip(
+            "Only the inputs with the highest Spearman rank correlation with "
+            "the scores are included in the delta analysis."
+        )
+        self.max_inputs = QSpinBox()
+        self.max_inputs.setRange(0, 100000)
+        self.max_inputs.setSpecialValueText("All")
+        self.label_screening_threshold = QLabel("Min. rank correlation:")
+        self.label_screening_threshold.setToolTip(
+            "Only inputs with at least this absolute Spearman rank correlation "
+            "with the scores are included in the delta analysis."
+        )
+        self.screening_threshold = QLineEdit("0")
+        self.screening_threshold.setFixedWidth(40)
+        self.screening_threshold.setValidator(QtGui.QDoubleValidator(0.0, 1.0, 5))
+
         # export GSA input/output data automatically with run
         self.checkbox_export_data_automatically = QCheckBox(
             "Save input/output data to Excel after run"
@@ -1600,6 +1833,10 @@ class GSATab(NewAnalysisTab):
         self.hlayout_row2.addWidget(self.cutoff_technosphere)
         self.hlayout_row2.addWidget(self.label_cutoff_biosphere)
         self.hlayout_row2.addWidget(self.cutoff_biosphere)
+        self.hlayout_row2.addWidget(self.label_max_inputs)
+        self.hlayout_row2.addWidget(self.max_inputs)
+        self.hlayout_row2.addWidget(self.label_screening_threshold)
+        self.hlayout_row2.addWidget(self.screening_threshold)
         self.hlayout_row2.addWidget(self.checkbox_export_data_automatically)
         # self.hlayout_row2.addWidget(self.checkbox_pedigree)
         self.hlayout_row2.addStretch(1)
@@ -1633,45 +1870,76 @@ class GSATab(NewAnalysisTab):
 
     def monte_carlo_finished(self):
         self.button_run.setEnabled(True)
+        self.button_run_all.setEnabled(True)
         self.widget_settings.show()
         self.label_monte_carlo_first.hide()
 
-    def calculate_gsa(self):
+    def calculate_gsa(self, batch: bool = False):
         act_number = self.combobox_fu.currentIndex()
         method_number = self.combobox_methods.currentIndex()
         cutoff_technosphere = float(self.cutoff_technosphere.text())
         cutoff_biosphere = float(self.cutoff_biosphere.text())
+        screening = {
+            "max_inputs": self.max_inputs.value() or None,
+            "screening_threshold": float(self.screening_threshold.text() or 0),
+        }
         # print('Calculating GSA for: ', act_number, method_number, cutoff_technosphere, cutoff_biosphere)
 
-        try:
-            QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-            self.GSA.perform_GSA(
+        if batch:
+            job = Job(
+                f"Global Sensitivity Analysis '{self.parent.cs_name}' (all)",
+                self.GSA.perform_batch_GSA,
+                cutoff_technosphere=cutoff_technosphere,
+                cutoff_biosphere=cutoff_biosphere,
+                workers=self.workers.value(),
+                progress=True,
+                **screening,
+            )
+        else:
+            job = Job(
+                f"Global Sensitivity Analysis '{self.parent.cs_name}'",
+                self.GSA.perform_GSA,
                 act_number=act_number,
                 method_number=method_number,
                 cutoff_technosphere=cutoff_technosphere,
                 cutoff_biosphere=cutoff_biosphere,
+                **screening,
             )
-            # self.update_mc()
-        except Exception as e:  # Catch any error...
-            log.error(error=e)
-            message = str(e)
-            message_addition = ""
-            if message == "singular matrix":
-                message_addition = "\nIn order to avoid this happening, please increase the Monte Carlo iterations (e.g. to above 50)."
-            elif message == "`dataset` input should have multiple elements.":
-                message_addition = "\nIn order to avoid this happening, please increase the Monte Carlo iterations (e.g. to above 50)."
-            elif message == "No objects to concatenate":
-                message_addition = (
-                    "\nThe reason for this is likely that there are no uncertain exchanges. Please check "
-                    "the checkboxes in the Monte Carlo tab."
-                )
-            QMessageBox.warning(
-                self, "Could not perform GSA", str(message) + message_addition
-            )
-        QApplication.restoreOverrideCursor()
-
+        job.finished.connect(lambda result: self.gsa_done())
+        job.failed.connect(self.gsa_failed)
+        job.cancelled.connect(self.gsa_done)
+        self.button_run.setEnabled(False)
+        self.button_run_all.setEnabled(False)
+        self.job_progress = JobProgressWidget(job, self)
+        self.layout.insertWidget(self.layout.indexOf(self.table), self.job_progress)
+        for signal in (job.finished, job.failed, job.cancelled):
+            signal.connect(self.job_progress.deleteLater)
+        job_scheduler.submit(job)
+
+    @QtCore.Slot(name="gsaDone")
+    def gsa_done(self):
+        self.button_run.setEnabled(True)
+        self.button_run_all.setEnabled(True)
         self.update_gsa()
 
+    @QtCore.Slot(object, str, name="gsaFailed")
+    def gsa_failed(self, error: Exception, details: str):
+        message = str(error)
+        message_addition = ""
+        if message == "singular matrix":
+            message_addition = "\nIn order to avoid this happening, please increase the Monte Carlo iterations (e.g. to above 50)."
+        elif message == "`dataset` input should have multiple elements.":
+            message_addition = "\nIn order to avoid this happening, please increase the Monte Carlo iterations (e.g. to above 50)."
+        elif isinstance(error, NoUncertainInputsError):
+            message_addition = (
+                "\nInclude uncertain exchanges, characterization factors or parameters with "
+                "the checkboxes in the Monte Carlo tab."
+            )
+        QMessageBox.warning(
+            self, "Could not perform GSA", str(message) + message_addition
+        )
+        self.gsa_done()
+
     def update_gsa(self, cs_name=None):
         self.df = getattr(self.GSA, "df_final", None)
         if self.df is None:
@@ -1716,50 +1984,3 @@ class GSATab(NewAnalysisTab):
     #         optional.get("functional_unit"), self.unit
     #     )
     #     filename = '_'.join((str(x) for x in fields if x is not None))
-
-
-class MonteCarloWorkerThread(QtCore.QThread):
-    """A worker for Monte Carlo simulations.
-
-    Unfortunately, pyparadiso does not allow parallel calculations on Windows (crashes).
-    So this is for future reference in case this issue is solved..."""
-
-    def __init__(self):
-        pass
-
-    def set_mc(self, mc, iterations=20):
-        self.mc = mc
-        self.iterations = iterations
-
-    def run(self):
-        log.info("Starting new Worker Thread. Iterations:", self.iterations)
-        self.mc.calculate(iterations=self.iterations)
-        # res = bw.GraphTraversal().calculate(self.demand, self.method, self.cutoff, self.max_calc)
-        log.info("in thread {}".format(QtCore.QThread.currentThread()))
-        signals.monte_carlo_ready.emit(self.mc.cs_name)
-
-
-worker_thread = MonteCarloWorkerThread()
-
-# TODO review if can be removed
-
-# class Worker(QtCore.QObject):
-#
-#     def __init__(self):
-#         super().__init__()
-#
-#     def do_something(self, text):
-#         print('in thread {} message {}'.format(QtCore.QThread.currentThread(), text))
-#
-#
-# class SomeObject(QtCore.QObject):
-#
-#     finished = QtCore.pyqtSignal()
-#
-#     def long_running(self):
-#         count = 0
-#         while count < 5:
-#             time.sleep(1)
-#             print("B Increasing")
-#             count += 1
-#         self.finished.emit()
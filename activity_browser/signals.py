@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 from bw2data import Method, get_activity
 from bw2data.parameters import ParameterBase
-from PySide2.QtCore import QObject, Qt, QThread, Signal, SignalInstance
-
-from .application import application
+from PySide2.QtCore import (
+    QCoreApplication,
+    QObject,
+    Qt,
+    QThread,
+    Signal,
+    SignalInstance,
+)
 
 try:
     from bw2data.backends.peewee.proxies import Activity, Exchange
@@ -217,9 +222,14 @@ class QUpdater(QObject):
         # cache the emit for later
         self.cache[signal_name] = args
 
+        # without an application there is no event loop (e.g. in a calculation
+        # worker process), so emit right away
+        app = QCoreApplication.instance()
+        if app is None:
+            self.emit_cache()
         # if we're running in the main thread, emit cache when the event loop wakes
-        if QThread.currentThread() == application.thread():
-            application.thread().eventDispatcher().awake.connect(
+        elif QThread.currentThread() == app.thread():
+            app.thread().eventDispatcher().awake.connect(
                 self.emit_cache, Qt.UniqueConnection
             )
         # else, emit the cache when the thread has finished work
@@ -242,7 +252,8 @@ class QUpdater(QObject):
         self.cache.clear()
 
         # cleaning up the connections
-        if self.sender() == application.thread().eventDispatcher():
+        app = QCoreApplication.instance()
+        if app is not None and self.sender() == app.thread().eventDispatcher():
             self.sender().awake.disconnect(self.emit_cache)
         elif isinstance(self.sender(), QThread):
             self.sender().finished.disconnect(self.emit_cache)
@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import traceback
+from typing import Callable, Optional
+
+from PySide2.QtCore import QObject, Signal, Slot
+
+from activity_browser import log, signals
+
+from .threading import ABThread
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+    pass
+
+
+class Job(QObject):
+    """A long-running task which is executed by the `JobScheduler`.
+
+    The callable is run in a worker thread, its result (or exception) is
+    passed back to the main thread through the signals of the job. Jobs
+    with a higher priority are started before other queued jobs.
+
+    Callables that support it can report their progress through `report`,
+    which is passed as the `progress` keyword when `progress=True`. A
+    running job is cancelled the next time it reports progress. Intermediate
+    results can be passed to the main thread through `publish`, which is
+    passed as the `publish` keyword when `publish=True`.
+    """
+
+    started = Signal()
+    progress_changed = Signal(int, int)
+    published = Signal(object)
+    finished = Signal(object)
+    failed = Signal(object, str)
+    cancelled = Signal()
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        *args,
+        priority: int = 0,
+        progress: bool = False,
+        publish: bool = False,
+        **kwargs,
+    ):
+        super().__init__()
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.is_cancelled = False
+        self.is_running = False
+        if progress:
+            self.kwargs["progress"] = self.report
+        if publish:
+            self.kwargs["publish"] = self.publish
+
+    def report(self, current: int, total: int) -> None:
+        """Report progress from within the job, aborts the job if it was cancelled."""
+        if self.is_cancelled:
+            raise JobCancelled(self.name)
+        self.progress_changed.emit(current, total)
+
+    def publish(self, data) -> None:
+        """Pass intermediate results from within the job to the main thread."""
+        self.published.emit(data)
+
+    def cancel(self) -> None:
+        self.is_cancelled = True
+
+    def run(self) -> None:
+        self.is_running = True
+        self.started.emit()
+        try:
+            if self.is_cancelled:
+                raise JobCancelled(self.name)
+            result = self.func(*self.args, **self.kwargs)
+        except JobCancelled:
+            log.info(f"Cancelled job: {self.name}")
+            self.cancelled.emit()
+        except Exception as e:
+            details = traceback.format_exc()
+            log.error(details)
+            self.failed.emit(e, details)
+        else:
+            self.finished.emit(result)
+        finally:
+            self.is_running = False
+
+
+class JobThread(ABThread):
+    def __init__(self, job: Job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+    def run_safely(self):
+        self.job.run()
+
+
+class JobScheduler(QObject):
+    """Central queue for long-running calculations.
+
+    Submitted jobs are run in worker threads in order of priority. At most
+    `max_concurrent` jobs run at the same time: the sparse solvers that are
+    used (e.g. PyPardiso) cannot be called from several threads at once, so
+    by default calculations are run one after another.
+    """
+
+    queue_changed = Signal()
+
+    def __init__(self, max_concurrent: int = 1):
+        super().__init__()
+        self.max_concurrent = max_concurrent
+        self._queue = []
+        self._counter = itertools.count()
+        self._running = {}
+
+    def submit(self, job: Job) -> Job:
+        """Queue the job and start it as soon as a slot is available."""
+        heapq.heappush(self._queue, (-job.priority, next(self._counter), job))
+        signals.new_statusbar_message.emit(f"Queued: {job.name}")
+        self.queue_changed.emit()
+        self._start_next()
+        return job
+
+    def cancel(self, job: Job) -> None:
+        """Cancel a queued or running job."""
+        job.cancel()
+        queued = [entry for entry in self._queue if entry[2] is job]
+        if queued:
+            self._queue.remove(queued[0])
+            heapq.heapify(self._queue)
+            job.cancelled.emit()
+            self.queue_changed.emit()
+
+    def position(self, job: Job) -> Optional[int]:
+        """Return the position of the job in the queue, None if not queued."""
+        ordered = [entry[2] for entry in sorted(self._queue)]
+        return ordered.index(job) if job in ordered else None
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue) + len(self._running)
+
+    def _start_next(self) -> None:
+        while self._queue and len(self._running) < self.max_concurrent:
+            _, _, job = heapq.heappop(self._queue)
+            thread = JobThread(job)
+            self._running[job] = thread
+            thread.finished.connect(lambda job=job: self._job_done(job))
+            signals.new_statusbar_message.emit(f"Running: {job.name}")
+            thread.start()
+        self.queue_changed.emit()
+
+    @Slot(name="jobDone")
+    def _job_done(self, job: Job) -> None:
+        thread = self._running.pop(job, None)
+        if thread is not None:
+            thread.deleteLater()
+        if not self.pending:
+            signals.new_statusbar_message.emit(f"Finished: {job.name}")
+        self._start_next()
+
+
+job_scheduler = JobScheduler()
@@ -14,6 +14,7 @@ from activity_browser.mod import bw2data as bd
 from activity_browser.mod.bw2data.backends import ActivityDataset
 
 from ...bwutils.commontasks import identify_activity_type
+from ...bwutils.lca_pool import PooledGraphTraversal
 from ...bwutils.superstructure.graph_traversal_with_scenario import (
     GraphTraversalWithScenario,
 )
@@ -261,7 +262,7 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
                 )
             else:
                 try:
-                    data = GraphTraversal().calculate(
+                    data = PooledGraphTraversal().calculate(
                         demand, method, cutoff=cut_off, max_calc=max_calc
                     )
                 except:
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from activity_browser.bwutils.formulas import Formula, ParameterGroup
+
+
+def test_compiled_formula():
+    """Formulas with arithmetic and known functions are evaluated for all
+    samples at once, others fall back on asteval for every sample.
+    """
+    a = np.array([1.0, 4.0])
+    b = np.array([9.0, 16.0])
+
+    formula = Formula("a * 2 + sqrt(b) - max(a, b)")
+    assert formula.is_compiled
+    assert formula.symbols == {"a", "b"}
+    expected = a * 2 + np.sqrt(b) - np.maximum(a, b)
+    assert np.allclose(formula.evaluate({"a": a, "b": b}, 2), expected)
+
+    formula = Formula("a if a > 2 else b")
+    assert not formula.is_compiled
+    assert np.allclose(formula.evaluate({"a": a, "b": b}, 2), [9.0, 4.0])
+
+
+def test_formula_constant_names():
+    """Parameters override constants of the same name, which are used when
+    no parameter is given.
+    """
+    for formula in (Formula("e * 2"), Formula("e * 2 if True else 0")):
+        assert formula.symbols == {"e"}
+        assert np.allclose(formula.evaluate({}, 2), 2 * np.e)
+        assert np.allclose(formula.evaluate({"e": np.array([1.0, 2.0])}, 2), [2, 4])
+
+    group = ParameterGroup("project", {"x": {"formula": "e * 3"}, "e": {"amount": 2}})
+    assert group.order[0][0] == "x"
+    assert np.allclose(group.evaluate({}, {}, 1)["x"], 6)
+
+    group = ParameterGroup(
+        "project", {"x": {"formula": "e * 3"}, "e": {"formula": "max(1, 2)"}}
+    )
+    assert [name for name, _ in group.order] == ["e", "x"]
+    assert np.allclose(group.evaluate({}, {}, 1)["x"], 6)
+
+
+def test_formula_division_by_zero():
+    """Divisions by zero give NaN for compiled and interpreted formulas."""
+    a = np.array([1.0, 4.0])
+    b = np.array([0.0, 2.0])
+    for formula in (Formula("a / b"), Formula("a / b if a > 0 else 0")):
+        assert np.allclose(
+            formula.evaluate({"a": a, "b": b}, 2), [np.nan, 2], equal_nan=True
+        )
+    assert np.isnan(Formula("b ** -1").evaluate({"b": b}, 2)[0])
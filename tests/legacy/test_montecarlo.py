@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import montecarlo
+from activity_browser.bwutils.montecarlo import MonteCarloLCA, RunningStatistics
+from activity_browser.ui.jobs import JobCancelled
+
+
+@pytest.fixture()
+def mc_setup(bw2test):
+    """Calculation setup of a small system with uncertain exchanges and
+    characterization factors, and an exchange that depends on an uncertain
+    parameter.
+    """
+    bw.Database("bio").write(
+        {
+            ("bio", "co2"): {"name": "CO2", "unit": "kg", "type": "emission"},
+            ("bio", "ch4"): {"name": "CH4", "unit": "kg", "type": "emission"},
+        }
+    )
+    bw.Database("tech").write(
+        {
+            ("tech", "a"): {
+                "name": "a",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("tech", "a"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("tech", "b"),
+                        "amount": 0.5,
+                        "type": "technosphere",
+                        "uncertainty type": 2,
+                        "loc": np.log(0.5),
+                        "scale": 0.2,
+                    },
+                    {
+                        "input": ("bio", "co2"),
+                        "amount": 2,
+                        "type": "biosphere",
+                        "uncertainty type": 4,
+                        "minimum": 1,
+                        "maximum": 3,
+                    },
+                    {
+                        "input": ("bio", "ch4"),
+                        "amount": 0.1,
+                        "type": "biosphere",
+                        "formula": "w",
+                    },
+                ],
+            },
+            ("tech", "b"): {
+                "name": "b",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("tech", "b"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("bio", "ch4"),
+                        "amount": 0.1,
+                        "type": "biosphere",
+                        "uncertainty type": 3,
+                        "loc": 0.1,
+                        "scale": 0.01,
+                    },
+                ],
+            },
+        }
+    )
+    method = bw.Method(("test", "gwp"))
+    method.register()
+    method.write(
+        [
+            (("bio", "co2"), 1.0),
+            (
+                ("bio", "ch4"),
+                {"amount": 28, "uncertainty type": 4, "minimum": 25, "maximum": 31},
+            ),
+        ]
+    )
+    bw.parameters.new_project_parameters(
+        [{"name": "u", "amount": 0.5, "uncertainty type": 3, "loc": 0.5, "scale": 0.05}]
+    )
+    bw.parameters.new_activity_parameters(
+        [{"name": "w", "formula": "u / 5", "database": "tech", "code": "a"}], "mc"
+    )
+    bw.parameters.add_exchanges_to_group("mc", bw.get_activity(("tech", "a")))
+    bw.parameters.recalculate()
+    bw.calculation_setups["mc"] = {
+        "inv": [{("tech", "a"): 1}, {("tech", "b"): 1}],
+        "ia": [("test", "gwp")],
+    }
+    return "mc"
+
+
+def test_running_statistics():
+    """Statistics merged block by block equal those of all scores at once."""
+    scores = np.random.default_rng(1).normal(5, 1, (53, 2, 3))
+    statistics = RunningStatistics((2, 3))
+    for i in range(0, len(scores), 7):
+        statistics.update(scores[i : i + 7])
+
+    assert statistics.count == 53
+    assert np.allclose(statistics.mean, scores.mean(axis=0))
+    assert np.allclose(statistics.std, scores.std(axis=0, ddof=1))
+    assert statistics.converged(0.5)
+    assert not statistics.converged(0.01)
+
+
+def test_monte_carlo_parameters(mc_setup):
+    """The recalculated amounts of parameterized exchanges are inserted in
+    the sampled matrices.
+    """
+    mc = MonteCarloLCA(mc_setup)
+    mc.calculate(iterations=20, seed=3, checkpoint=False)
+
+    positions, _ = mc.bio_param_map
+    assert len(positions) == 1 and len(mc.tech_param_map[0]) == 0
+    assert mc.lca.bio_params[positions[0]]["amount"] == pytest.approx(0.1)
+    u = np.array([next(p[3] for p in row if p[0] == "u") for row in mc.parameters])
+    assert len(np.unique(u)) == 20
+    assert np.allclose(mc.biosphere_samples[:, positions[0]], u / 5)
+
+
+def test_monte_carlo_block_order(mc_setup):
+    """Every block draws the same samples, whichever block runs first."""
+    mc = MonteCarloLCA(mc_setup)
+    mc.prepare(42)
+    blocks = mc.blocks(60)
+    in_order = [mc.calculate_block(block, size) for block, _, size in blocks]
+    reverse = [mc.calculate_block(block, size) for block, _, size in blocks[::-1]]
+
+    for first, second in zip(in_order, reverse[::-1]):
+        assert np.array_equal(first["results"], second["results"])
+        assert np.array_equal(first["technosphere"], second["technosphere"])
+        assert np.array_equal(
+            first["cf"][("test", "gwp")], second["cf"][("test", "gwp")]
+        )
+
+
+def test_monte_carlo_workers(mc_setup):
+    """A seeded simulation gives identical results in 1 or 2 worker processes."""
+    serial = MonteCarloLCA(mc_setup)
+    serial.calculate(iterations=60, seed=42, workers=1, checkpoint=False)
+    parallel = MonteCarloLCA(mc_setup)
+    parallel.calculate(iterations=60, seed=42, workers=2, checkpoint=False)
+
+    assert parallel.results.shape == (60, 2, 1)
+    assert np.array_equal(serial.results, parallel.results)
+    assert np.array_equal(serial.technosphere_samples, parallel.technosphere_samples)
+    assert np.array_equal(serial.biosphere_samples, parallel.biosphere_samples)
+
+
+@pytest.mark.parametrize("converges", [True, False])
+def test_monte_carlo_iterative_solver(mc_setup, monkeypatch, converges):
+    """The iterative solver gives the results of the direct solver, also when
+    BiCGSTAB does not converge and the supply is solved directly.
+    """
+    direct = MonteCarloLCA(mc_setup)
+    direct.calculate(iterations=30, seed=5, solver="direct", checkpoint=False)
+
+    calls = []
+
+    def bicgstab(matrix, demand, x0, **kwargs):
+        calls.append(1)
+        return x0, 1  # Not converged within the maximum number of iterations
+
+    if not converges:
+        monkeypatch.setattr(montecarlo, "bicgstab", bicgstab)
+    iterative = MonteCarloLCA(mc_setup)
+    iterative.calculate(iterations=30, seed=5, solver="iterative", checkpoint=False)
+
+    assert np.allclose(iterative.results, direct.results)
+    assert len(calls) == (0 if converges else 30 * 2)
+
+
+def test_monte_carlo_checkpoint_data_changed(mc_setup):
+    """Checkpoints cannot be resumed once the data they were sampled from
+    changed.
+    """
+    MonteCarloLCA(mc_setup).calculate(iterations=30, seed=1)
+    assert MonteCarloLCA(mc_setup).checkpoint_info() == (30, 30)
+
+    exchange = next(iter(bw.get_activity(("tech", "b")).biosphere()))
+    exchange["amount"] = 0.2
+    exchange.save()
+    assert MonteCarloLCA(mc_setup).checkpoint_info() is None
+
+    MonteCarloLCA(mc_setup).calculate(iterations=30, seed=1)
+    assert MonteCarloLCA(mc_setup).checkpoint_info() == (30, 30)
+    bw.parameters.new_project_parameters([{"name": "p", "amount": 1}])
+    assert MonteCarloLCA(mc_setup).checkpoint_info() is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_monte_carlo_cancel_resume(mc_setup, workers):
+    """A cancelled simulation keeps its finished blocks, and resuming it
+    gives the results of an uninterrupted simulation.
+    """
+
+    def progress(current, total):
+        if current >= 50:
+            raise JobCancelled()
+
+    with pytest.raises(JobCancelled):
+        MonteCarloLCA(mc_setup).calculate(
+            iterations=100, seed=7, workers=workers, progress=progress
+        )
+    completed, planned = MonteCarloLCA(mc_setup).checkpoint_info()
+    assert planned == 100 and completed < 100
+    if workers == 1:
+        assert completed == 50
+
+    resumed = MonteCarloLCA(mc_setup)
+    resumed.calculate(iterations=100, workers=workers, resume=True)
+    uninterrupted = MonteCarloLCA(mc_setup)
+    uninterrupted.calculate(iterations=100, seed=7, checkpoint=False)
+    assert np.array_equal(resumed.results, uninterrupted.results)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import bw2calc as bc
+import brightway2 as bw
+import numpy as np
+from scipy import sparse
+
+from activity_browser.bwutils.multilca import (
+    MLCA,
+    Contributions,
+    ContributionStore,
+    LazyInventories,
+    ca,
+)
+
+
+def test_contribution_store():
+    """The store returns the same contributions as a dense array, without
+    keeping negligible entries but with exact totals.
+    """
+    rng = np.random.default_rng(42)
+    dense = rng.normal(size=(3, 4, 100))
+    dense[:, :, 0] = 1e-15  # Negligible contributions
+    store = ContributionStore((3, 4), 100, tolerance=1e-9)
+    for row in range(3):
+        store[row] = dense[row]
+
+    by_fu = store.take(1, axis=0)
+    assert by_fu.data.shape == (4, 100)
+    assert by_fu.data[:, 0].nnz == 0
+    assert np.allclose(by_fu.data.toarray()[:, 1:], dense[1, :, 1:])
+    assert np.allclose(by_fu.totals, dense[1].sum(axis=1))
+    assert np.allclose(by_fu.magnitudes, np.abs(dense[1]).sum(axis=1))
+
+    by_method = store.take(2, axis=1)
+    assert np.allclose(by_method.data.toarray()[:, 1:], dense[:, 2, 1:])
+    assert np.allclose(by_method.totals, dense[:, 2].sum(axis=1))
+    assert np.allclose(by_method.magnitudes, np.abs(dense[:, 2]).sum(axis=1))
+
+
+def test_contribution_percent_cutoff():
+    """Percent cutoffs are relative to the complete rows, including the
+    entries that were not stored.
+    """
+    dense = np.zeros((1, 200))
+    dense[0, :3] = [5.0, -2.0, 1.0]
+    dense[0, 3:] = 1e-3  # Dropped by the store, 0.197 in total
+    store = ContributionStore((1,), 200, tolerance=1e-3)
+    store[:] = dense
+    assert store[:].data.nnz == 3
+
+    contributions = Contributions.__new__(Contributions)
+    rev_dict = {i: i for i in range(200)}
+    for limit in (0.1, 0.125, 0.2):
+        top = contributions._build_dict(store[:], {"fu": 0}, rev_dict, limit, "percent")
+        expected = ca.sort_array(dense[0], limit=limit, limit_type="percent")
+        assert list(top["fu"])[2:] == [int(i) for i in expected[:, 1]]
+        assert np.isclose(top["fu"][("Total", "")], dense.sum())
+
+
+def test_lazy_inventories_keys():
+    """The available keys are collected once until the mapping is cleared."""
+    results = {"a": 1.0}
+    calls = []
+
+    def keys():
+        calls.append(1)
+        return results.keys()
+
+    inventories = LazyInventories(
+        lambda key: sparse.csr_matrix([[results[key]]]), keys, max_bytes=10**6
+    )
+    assert "a" in inventories and "b" not in inventories
+    assert inventories["a"].toarray()[0, 0] == 1.0
+    assert len(inventories) == 1 and list(inventories) == ["a"]
+    assert len(calls) == 1
+
+    results["b"] = 2.0
+    assert "b" not in inventories
+    inventories.clear()
+    assert "b" in inventories
+    assert inventories["b"].toarray()[0, 0] == 2.0
+    assert len(calls) == 2
+
+
+def test_mlca_batch_solve(bw2test):
+    """Solving all reference flows at once and applying all impact categories
+    together gives the results of separate LCA calculations.
+    """
+    bw.Database("bio").write(
+        {
+            ("bio", "co2"): {"name": "CO2", "type": "emission"},
+            ("bio", "ch4"): {"name": "CH4", "type": "emission"},
+        }
+    )
+    process = {"reference product": "product", "location": "GLO", "unit": "kg"}
+    bw.Database("tech").write(
+        {
+            ("tech", "a"): dict(
+                process,
+                name="a",
+                exchanges=[
+                    {"input": ("tech", "a"), "amount": 2, "type": "production"},
+                    {"input": ("tech", "b"), "amount": 0.5, "type": "technosphere"},
+                    {"input": ("bio", "co2"), "amount": 3, "type": "biosphere"},
+                ],
+            ),
+            ("tech", "b"): dict(
+                process,
+                name="b",
+                exchanges=[
+                    {"input": ("tech", "b"), "amount": 1, "type": "production"},
+                    {"input": ("tech", "a"), "amount": 0.1, "type": "technosphere"},
+                    {"input": ("bio", "ch4"), "amount": 0.2, "type": "biosphere"},
+                ],
+            ),
+        }
+    )
+    methods = [("test", "gwp"), ("test", "ch4")]
+    for method, cfs in zip(methods, [[1.0, 28.0], [0.0, 1.0]]):
+        bw.Method(method).register()
+        bw.Method(method).write(list(zip([("bio", "co2"), ("bio", "ch4")], cfs)))
+    func_units = [{("tech", "a"): 2.5}, {("tech", "b"): -4.0}]
+    bw.calculation_setups["batch"] = {"inv": func_units, "ia": methods}
+
+    mlca = MLCA("batch")
+    mlca.calculate()
+    for row, func_unit in enumerate(func_units):
+        for col, method in enumerate(methods):
+            lca = bc.LCA(func_unit, method)
+            lca.lci()
+            lca.lcia()
+            assert np.isclose(mlca.lca_scores[row, col], lca.score)
+            assert np.allclose(mlca.scaling_factors[str(func_unit)], lca.supply_array)
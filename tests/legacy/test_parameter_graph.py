@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import pytest
+from bw2data.backends.peewee import ExchangeDataset
+from bw2data.parameters import (
+    ActivityParameter,
+    DatabaseParameter,
+    Group,
+    ProjectParameter,
+)
+
+from activity_browser.bwutils.parameter_graph import IncrementalRecalculation
+
+
+@pytest.fixture()
+def parameter_setup(bw2test):
+    """Project, database and activity parameters, where group "g2" depends on
+    group "g1", and parameterized exchanges in both groups.
+    """
+    bw.Database("db").write(
+        {
+            ("db", "x"): {
+                "name": "x",
+                "exchanges": [
+                    {"input": ("db", "x"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("db", "y"),
+                        "amount": 1,
+                        "type": "technosphere",
+                        "formula": "d * 2",
+                    },
+                ],
+            },
+            ("db", "y"): {
+                "name": "y",
+                "exchanges": [
+                    {"input": ("db", "y"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("db", "x"),
+                        "amount": 1,
+                        "type": "technosphere",
+                        "formula": "e / 10",
+                    },
+                ],
+            },
+        }
+    )
+    bw.parameters.new_project_parameters(
+        [{"name": "a", "amount": 2}, {"name": "b", "formula": "a * 3"}]
+    )
+    bw.parameters.new_database_parameters([{"name": "c", "formula": "b + 1"}], "db")
+    Group.create(name="g1", fresh=False)
+    Group.create(name="g2", order=["g1"], fresh=False)
+    ActivityParameter.create(
+        group="g1", database="db", code="x", name="d", formula="c * 2", amount=0
+    )
+    ActivityParameter.create(
+        group="g2", database="db", code="y", name="e", formula="d + a", amount=0
+    )
+    bw.parameters.add_exchanges_to_group("g1", bw.get_activity(("db", "x")))
+    bw.parameters.add_exchanges_to_group("g2", bw.get_activity(("db", "y")))
+    bw.parameters.recalculate()
+
+
+def stored_amounts() -> tuple:
+    parameters = {
+        p.key: p.amount
+        for model in (ProjectParameter, DatabaseParameter, ActivityParameter)
+        for p in model.select()
+    }
+    exchanges = {e.id: e.data["amount"] for e in ExchangeDataset.select()}
+    return parameters, exchanges
+
+
+def full_recalculation() -> tuple:
+    Group.update(fresh=False).execute()
+    bw.parameters.recalculate()
+    return stored_amounts()
+
+
+def test_incremental_recalculation(parameter_setup):
+    """Recalculating downstream of an edited parameter stores the same
+    amounts as a complete recalculation.
+    """
+    recalculation = IncrementalRecalculation()
+    param = ProjectParameter.get(name="a")
+    param.amount = 5
+    param.save()
+    assert recalculation.recalculate(param)
+
+    parameters, exchanges = stored_amounts()
+    assert parameters[("g2", "e")] == pytest.approx(2 * (5 * 3 + 1) + 5)
+    expected_parameters, expected_exchanges = full_recalculation()
+    assert parameters == pytest.approx(expected_parameters)
+    assert exchanges == pytest.approx(expected_exchanges)
+
+    # A second edit uses the same graph.
+    graph = recalculation.graph()
+    param = DatabaseParameter.get(name="c")
+    param.amount = 4
+    param.formula = None
+    param.save()
+    assert recalculation.recalculate(param)
+    assert recalculation.graph() is not graph  # The formula was removed
+    param = ProjectParameter.get(name="a")
+    param.amount = 1
+    param.save()
+    graph = recalculation.graph()
+    assert recalculation.recalculate(param)
+    assert recalculation.graph() is graph
+
+    parameters, exchanges = stored_amounts()
+    expected_parameters, expected_exchanges = full_recalculation()
+    assert parameters == pytest.approx(expected_parameters)
+    assert exchanges == pytest.approx(expected_exchanges)
+
+
+def test_incremental_recalculation_formula_override(parameter_setup):
+    """An amount entered for a parameter with a formula is replaced by the
+    formula result, also when that result did not change.
+    """
+    recalculation = IncrementalRecalculation()
+    param = ProjectParameter.get(name="b")
+    param.amount = 100
+    param.save()
+    assert recalculation.recalculate(param)
+
+    parameters, exchanges = stored_amounts()
+    assert parameters[("project", "b")] == 6
+    assert recalculation.graph().amounts[("project", "b")] == 6
+    expected_parameters, expected_exchanges = full_recalculation()
+    assert parameters == pytest.approx(expected_parameters)
+    assert exchanges == pytest.approx(expected_exchanges)
+
+
+@pytest.mark.parametrize(
+    "formulas, edited, amount",
+    [
+        ({"p1": "p2 + 1", "p2": "p1 + 1"}, "p1", 3),  # Circular reference
+        ({"p1": "1 / p2", "p2": None}, "p2", 0),  # Division by zero
+    ],
+)
+def test_incremental_recalculation_fallback(
+    parameter_setup, monkeypatch, formulas, edited, amount
+):
+    """Edits that cannot be recalculated incrementally fall back on a complete
+    recalculation, which reports the problem.
+    """
+    for name, formula in formulas.items():
+        ProjectParameter.create(name=name, amount=1, formula=formula)
+    param = ProjectParameter.get(name=edited)
+    param.amount = amount
+    param.save()
+
+    recalculation = IncrementalRecalculation()
+    with pytest.raises(ValueError):
+        recalculation.recalculate(param)
+
+    calls = []
+    monkeypatch.setattr(bw.parameters, "recalculate", lambda: calls.append(1))
+    recalculation(param)
+    assert calls == [1]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from activity_browser.bwutils import result_cache
+from activity_browser.bwutils.result_cache import ResultCache
+
+
+def test_result_cache_round_trip(tmp_path):
+    """Stored arrays are returned unchanged, unknown keys return None."""
+    cache = ResultCache(directory=str(tmp_path))
+    arrays = {"lca_scores": np.arange(6.0).reshape(2, 3), "indptr": np.arange(4)}
+    cache.put("key", arrays)
+
+    loaded = cache.get("key")
+    assert set(loaded) == set(arrays)
+    for name, array in arrays.items():
+        assert np.array_equal(loaded[name], array)
+    assert cache.get("other") is None
+
+
+def test_result_cache_eviction(tmp_path):
+    """The least recently used results are removed once the cache is full."""
+    array = {"data": np.zeros(1000)}
+    cache = ResultCache(directory=str(tmp_path))
+    cache.put("a", array)
+    size = ResultCache._size(os.path.join(str(tmp_path), "a"))
+    cache.max_size = int(2.5 * size)
+    cache.put("b", array)
+    # Make both entries old, then use "a" again.
+    for i, key in enumerate(("a", "b")):
+        os.utime(os.path.join(str(tmp_path), key), (1000 + i, 1000 + i))
+    assert cache.get("a") is not None
+
+    cache.put("c", array)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_result_cache_corrupt_entry(tmp_path):
+    """Unreadable results are removed and reported as missing."""
+    cache = ResultCache(directory=str(tmp_path))
+    cache.put("key", {"data": np.ones(3)})
+    with open(os.path.join(str(tmp_path), "key", "data.npy"), "wb") as f:
+        f.write(b"not an array")
+
+    assert cache.get("key") is None
+    assert not os.path.exists(os.path.join(str(tmp_path), "key"))
+
+
+def test_result_cache_incomplete_entry(tmp_path):
+    """Entries without their marker or with missing arrays are not used."""
+    cache = ResultCache(directory=str(tmp_path))
+    arrays = {"lca_scores": np.ones(3), "scaling_factors": np.ones(2)}
+    cache.put("partial", arrays)
+    os.remove(os.path.join(str(tmp_path), "partial", "scaling_factors.npy"))
+    assert cache.get("partial") is None
+
+    cache.put("unmarked", arrays)
+    os.remove(os.path.join(str(tmp_path), "unmarked", ResultCache.MARKER))
+    assert cache.get("unmarked") is None
+    assert not os.path.exists(os.path.join(str(tmp_path), "unmarked"))
+
+
+def test_result_cache_key(monkeypatch):
+    """The key changes with the setup, the databases and the methods."""
+    databases = {"db": {"modified": "2024-01-01", "processed": "2024-01-01"}}
+    methods = {("m",): "a"}
+    monkeypatch.setattr(result_cache, "bd", SimpleNamespace(databases=databases))
+    monkeypatch.setattr(result_cache, "method_state", lambda m: methods[m])
+    mlca = SimpleNamespace(
+        func_units=[{("db", "x"): 1.0}],
+        methods=[("m",)],
+        contribution_tolerance=1e-9,
+        all_databases={"db"},
+    )
+
+    key = ResultCache.key(mlca)
+    assert ResultCache.key(mlca) == key
+
+    databases["db"]["modified"] = "2024-01-02"
+    modified = ResultCache.key(mlca)
+    assert modified != key
+
+    methods[("m",)] = "b"
+    assert ResultCache.key(mlca) not in (key, modified)
+
+    mlca.func_units = [{("db", "x"): 2.0}]
+    assert ResultCache.key(mlca) not in (key, modified)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from stats_arrays import UncertaintyBase
+
+from activity_browser.bwutils.sampling import InverseCDF, UniformSampler
+
+
+def test_latin_hypercube_strata():
+    """Every block is a Latin hypercube: one point in each stratum."""
+    points = UniformSampler("lhs", 3, seed=1).sample(block=0, first=0, size=20)
+    for column in points.T:
+        assert sorted((column * 20).astype(int)) == list(range(20))
+
+
+def test_sobol_blocks():
+    """Blocks are taken from the same sequence, in any order."""
+    sampler = UniformSampler("sobol", 2, seed=1)
+    later, earlier = sampler.sample(2, 20, 10), sampler.sample(0, 0, 10)
+    assert np.array_equal(later, UniformSampler("sobol", 2, seed=1).sample(2, 20, 10))
+    assert not np.array_equal(later, earlier)
+
+
+def test_inverse_cdf():
+    params = UncertaintyBase.from_dicts(
+        {"loc": 2, "uncertainty_type": 0},
+        {"loc": 1, "scale": 0.5, "uncertainty_type": 3, "minimum": 0.5},
+    )
+    inverse_cdf = InverseCDF(params)
+    assert inverse_cdf.dimensions == 1
+
+    values = inverse_cdf(np.array([[0.001], [0.5], [0.999]]))
+    assert np.allclose(values[:, 0], 2)
+    assert values[0, 1] >= 0.5
+    assert values[1, 1] < values[2, 1]
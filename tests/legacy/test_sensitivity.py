@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+from scipy.stats import spearmanr
+
+from activity_browser.bwutils.sensitivity_analysis import (
+    rank_screening,
+    run_delta_analyses,
+    screen_exchanges,
+    select_inputs,
+    sensitivity_coefficients,
+)
+
+
+def small_lca(technosphere, biosphere, cfs):
+    """The attributes of a calculated LCA for a three-process system."""
+    technosphere = sparse.csr_matrix(technosphere)
+    biosphere = sparse.csr_matrix(biosphere)
+    characterization = sparse.diags(cfs)
+    supply = spsolve(technosphere.tocsc(), np.array([1.0, 0, 0]))
+    characterized = characterization @ biosphere @ sparse.diags(supply)
+    return SimpleNamespace(
+        technosphere_matrix=technosphere,
+        biosphere_matrix=biosphere,
+        characterization_matrix=characterization,
+        supply_array=supply,
+        characterized_inventory=sparse.csr_matrix(characterized),
+        score=characterized.sum(),
+    )
+
+
+def test_sensitivity_coefficients():
+    """Coefficients match the relative change of the score after a small
+    relative change of every exchange."""
+    A = np.array([[1.0, -0.5, 0], [-0.2, 1.0, -0.3], [0, -0.1, 1.0]])
+    B = np.array([[1.0, 2.0, 0.5], [0, 0.3, 4.0]])
+    cfs = np.array([2.0, 0.5])
+    lca = small_lca(A, B, cfs)
+    technosphere, biosphere = sensitivity_coefficients(lca)
+
+    for matrix, coefficients, technosphere_exchange in (
+        (A, technosphere, True),
+        (B, biosphere, False),
+    ):
+        for row, col in zip(*np.nonzero(matrix)):
+            changed = matrix.copy()
+            changed[row, col] *= 1.0001
+            args = (changed, B) if technosphere_exchange else (A, changed)
+            delta = small_lca(*args, cfs).score / lca.score - 1
+            assert np.isclose(coefficients[row, col], delta / 1e-4, rtol=1e-3)
+
+
+def test_screen_exchanges():
+    A = np.array([[1.0, -0.5, 0], [-0.2, 1.0, -0.3], [0, -0.001, 1.0]])
+    B = np.array([[1.0, 2.0, 0.5], [0, 0.3, 4.0]])
+    lca = small_lca(A, B, np.array([2.0, 0.5]))
+    t_indices, b_indices = screen_exchanges(lca, 0.01, 0.01)
+    assert (2, 1) not in t_indices
+    assert (0, 1) in t_indices
+    assert (1, 2) not in b_indices
+    assert (0, 0) in b_indices
+
+
+def test_run_delta_analyses():
+    """Every analysis combines the shared inputs with its own inputs."""
+    random = np.random.default_rng(1)
+    X = random.random((500, 2))
+    extra = random.random((500, 1))
+    tasks = {
+        "first": (["a", "b", "c"], extra, X[:, 0] + 0.01 * extra[:, 0]),
+        "extra": (["a", "b", "c"], extra, extra[:, 0] + 0.01 * X[:, 1]),
+    }
+    results = dict(run_delta_analyses(X, tasks, workers=1))
+    assert set(results) == set(tasks)
+    assert np.argmax(results["first"]["delta"]) == 0
+    assert np.argmax(results["extra"]["delta"]) == 2
+
+
+def test_run_delta_analyses_workers():
+    """Analyses in worker processes give the same results as in-process,
+    the spawned workers only import the calculation code.
+    """
+    random = np.random.default_rng(3)
+    X = random.random((300, 2))
+    tasks = {
+        i: (["a", "b", "c"], extra, X[:, 0] + 0.1 * extra[:, 0])
+        for i, extra in enumerate(random.random((3, 300, 1)))
+    }
+    serial = dict(run_delta_analyses(X, tasks, workers=1))
+    parallel = dict(run_delta_analyses(X, tasks, workers=2))
+    assert set(parallel) == set(tasks)
+    for key in tasks:
+        # The confidence intervals of the delta indices are bootstrapped.
+        for name in ("S1", "Spearman", "SRRC"):
+            assert np.allclose(parallel[key][name], serial[key][name])
+        assert np.argmax(parallel[key]["delta"]) == np.argmax(serial[key]["delta"])
+
+
+def test_rank_screening():
+    random = np.random.default_rng(2)
+    X = random.random((300, 4))
+    X[:, 3] = 1
+    Y = 3 * X[:, 0] + X[:, 1] ** 3 - 0.5 * X[:, 2]
+    spearman, srrc = rank_screening(X, Y)
+    for i in range(3):
+        assert np.isclose(spearman[i], spearmanr(X[:, i], Y)[0])
+    assert spearman[3] == srrc[3] == 0
+    assert np.argmax(np.abs(srrc)) == 0
+
+    assert list(select_inputs(spearman, max_inputs=2)) == [0, 1]
+    assert list(select_inputs(spearman, threshold=0.5)) == [0]
+    assert list(select_inputs(spearman)) == [0, 1, 2, 3]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.sparse.linalg import factorized, spsolve
+
+from activity_browser.bwutils.lca_pool import LCAPool
+from activity_browser.bwutils.superstructure.mlca import (
+    LowRankSolver,
+    SuperstructureMLCA,
+    data_positions,
+)
+from activity_browser.bwutils.utils import Index
+
+
+def scenario_mlca() -> SuperstructureMLCA:
+    """Scenarios for the matrices of a three-process system, absent values
+    (NaN) fall back on the values in the matrices."""
+    mlca = SuperstructureMLCA.__new__(SuperstructureMLCA)
+    mlca.lca = SimpleNamespace(
+        technosphere_matrix=sparse.csr_matrix(
+            np.array([[1.0, 0, 0], [-0.5, 1, 0], [0, 0, 1]])
+        ),
+        biosphere_matrix=sparse.csr_matrix(np.array([[1.0, 0, 2]])),
+    )
+    kinds = ("technosphere", "technosphere", "production", "biosphere")
+    mlca.indices = [Index(("db", "x"), ("db", "y"), kind) for kind in kinds]
+    mlca.matrix_indices = np.array(
+        [(1, 0, 1), (2, 1, 1), (0, 0, 0), (0, 1, 0)],
+        dtype=[("row", np.uint32), ("col", np.uint32), ("type", np.uint8)],
+    )
+    mlca.values = np.array(
+        [
+            [0.5, 0.7, np.nan, 0.2],
+            [0.1, np.nan, 0.3, 0.0],
+            [1.0, 2.0, np.nan, 1.0],
+            [3.0, 4.0, 5.0, np.nan],
+        ]
+    )
+    mlca.total = 4
+    mlca._current_index = 0
+    mlca._applied_index = None
+    mlca.prepare_scenario_slots()
+    return mlca
+
+
+def scenario_matrices(mlca: SuperstructureMLCA) -> list:
+    return [mlca.lca.technosphere_matrix.toarray(), mlca.lca.biosphere_matrix.toarray()]
+
+
+def test_data_positions():
+    """Positions point at the entries in the data array, absent entries are
+    added as explicit zeros."""
+    matrix = sparse.csr_matrix(np.array([[1.0, 0, 2], [0, 3, 0], [4, 0, 5]]))
+    rows, cols = np.array([2, 0, 1, 0]), np.array([0, 2, 1, 1])
+    result, positions = data_positions(matrix, rows, cols)
+    assert result.nnz == matrix.nnz + 1
+    assert np.array_equal(result.data[positions], [4, 2, 3, 0])
+
+    result.data[positions] = [10, 20, 30, 40]
+    expected = np.array([[1.0, 40, 20], [0, 30, 0], [10, 0, 5]])
+    assert np.array_equal(result.toarray(), expected)
+
+    same, _ = data_positions(result, rows, cols)
+    assert same is result
+
+    # The pooled factorization of the matrix is used for the slotted matrix.
+    slotted, _ = data_positions(matrix.copy(), rows, cols)
+    assert LCAPool._unchanged(slotted, matrix)
+    slotted.data[0] = 7
+    assert not LCAPool._unchanged(slotted, matrix)
+
+
+def test_low_rank_solver():
+    """Solving with the updated base factorization equals solving the changed
+    matrix directly."""
+    base = sparse.random(20, 20, density=0.2, random_state=1, format="csc")
+    base = sparse.eye(20, format="csc") - 0.5 * base
+    difference = sparse.lil_matrix((20, 20))
+    difference[3, 4], difference[10, 4], difference[7, 15] = 0.3, -0.2, 0.1
+    columns = np.array([4, 15])
+    solver = LowRankSolver(factorized(base), difference.tocsc(), columns)
+
+    matrix = (base + difference).tocsc()
+    demand = np.random.default_rng(0).random((20, 3))
+    assert np.allclose(solver(demand), spsolve(matrix, demand))
+    assert np.allclose(solver(demand[:, 0]), spsolve(matrix, demand[:, 0]))
+
+
+def test_apply_scenario():
+    """Applying a scenario directly, also repeatedly or going back to an
+    earlier scenario, equals stepping through the scenarios up to it."""
+    mlca = scenario_mlca()
+    for index in (3, 1, 1, 0, 2, 2, 3):
+        solver = mlca.lca.solver = object()
+        applied = mlca._applied_index
+        mlca.apply_scenario(index)
+        assert mlca.current == index
+
+        sequential = scenario_mlca()
+        for _ in range(index + 1):
+            sequential.next_scenario()
+        for matrix, expected in zip(
+            scenario_matrices(mlca), scenario_matrices(sequential)
+        ):
+            assert np.array_equal(matrix, expected)
+        # Applying the scenario that is in the matrices keeps the solver.
+        assert (getattr(mlca.lca, "solver", None) is solver) == (applied == index)
+
+    mlca.apply_scenario(2)
+    technosphere, biosphere = scenario_matrices(mlca)
+    assert technosphere[1, 0] == -0.5 and technosphere[2, 1] == -0.3
+    assert technosphere[0, 0] == 1 and biosphere[0, 1] == 5
+    with pytest.raises(ValueError):
+        mlca.apply_scenario(4)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import numpy as np
+from stats_arrays import MCRandomNumberGenerator, UncertaintyBase
+
+from activity_browser.bwutils.multilca import MLCA
+from activity_browser.bwutils.taylor import FirstOrderUncertainty, distribution_variance
+
+
+def test_distribution_variance():
+    """Closed-form and estimated variances match the sampled variance."""
+    params = UncertaintyBase.from_dicts(
+        {"loc": 2, "uncertainty_type": 0},
+        {"loc": np.log(3), "scale": 0.2, "uncertainty_type": 2},
+        {"loc": 1, "scale": 0.5, "uncertainty_type": 3},
+        {"minimum": 1, "maximum": 4, "uncertainty_type": 4},
+        {"loc": 2, "minimum": 1, "maximum": 4, "uncertainty_type": 5},
+        {"loc": 1, "scale": 2, "shape": 1.5, "uncertainty_type": 9},
+    )
+    variance = distribution_variance(params)
+    assert variance[0] == 0
+
+    samples = MCRandomNumberGenerator(params, seed=1).generate(20000)
+    assert np.allclose(variance, samples.var(axis=1), rtol=0.1)
+
+
+def test_first_order_uncertainty_copy(bw2test):
+    """The approximation uses the matrices of the MLCA at the time it was
+    created, and leaves the shared LCA object alone.
+    """
+    bw.Database("bio").write({("bio", "co2"): {"name": "CO2", "type": "emission"}})
+    bw.Database("tech").write(
+        {
+            ("tech", "a"): {
+                "name": "a",
+                "reference product": "a",
+                "location": "GLO",
+                "exchanges": [
+                    {"input": ("tech", "a"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("bio", "co2"),
+                        "amount": 2,
+                        "type": "biosphere",
+                        "uncertainty type": 3,
+                        "loc": 2,
+                        "scale": 0.1,
+                    },
+                ],
+            },
+        }
+    )
+    for name in ("gwp", "other"):
+        bw.Method(("test", name)).register()
+        bw.Method(("test", name)).write([(("bio", "co2"), 1.0)])
+    bw.calculation_setups["taylor"] = {
+        "inv": [{("tech", "a"): 1}],
+        "ia": [("test", "gwp"), ("test", "other")],
+    }
+    mlca = MLCA("taylor")
+    mlca.calculate()
+    scores = mlca.lca_scores.copy()
+    approximation = FirstOrderUncertainty(mlca)
+
+    # Change the shared LCA object, as switching scenarios would.
+    mlca.lca.technosphere_matrix.data *= 2
+    mlca.lca.__dict__.pop("solver", None)
+    method = mlca.lca.method
+    approximation.calculate()
+
+    assert np.allclose(approximation.scores, scores)
+    assert np.allclose(approximation.std, 0.1)
+    assert mlca.lca.method == method
+    assert not hasattr(mlca.lca, "solver")